@@ -0,0 +1,271 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""End-to-end throughput benchmark of fastensource.
+
+Runs the python, java and c commands in modes 1-3 against local stand-ins
+of their upstreams (see benchmarks/upstreams.py) and a SQLite stand-in of
+UDD, and saves artifacts/sec, requests per artifact, peak RSS and wall
+time of each run as JSON.
+
+Usage:
+    python -m benchmarks.e2e -s 50 -o results.json
+    python -m benchmarks.e2e -l python -m 1 2 -s 200
+    python -m benchmarks.e2e -l python -x '--resolver metadata'
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import shlex
+import argparse
+import platform
+import tempfile
+import subprocess
+from fastensource.utils.runner import exit_code_of
+from benchmarks.upstreams import Universe, FakeUpstreams, SUITE, udd_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+# Tools that each language needs, besides fastensource.
+TOOLS = {
+    'python': ('pip',),
+    'java': ('mvn',),
+    'c': ('apt-get', 'dpkg-source'),
+}
+ECOSYSTEMS = {'python': 'python', 'java': 'java', 'c': 'debian'}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL
+        ).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def setup_apt(directory, proxy):
+    """Write an apt configuration that only knows the fake source repo.
+
+    Returns:
+        env (dict): environment variables for apt-get
+
+    """
+    for d in ('lists/partial', 'cache/archives/partial', 'sources.list.d'):
+        os.makedirs(os.path.join(directory, d), exist_ok=True)
+    with open(os.path.join(directory, 'sources.list'), 'w') as f:
+        f.write('deb-src [trusted=yes] http://fastensource.invalid/debian '
+                '{} main\n'.format(SUITE))
+    config = os.path.join(directory, 'apt.conf')
+    with open(config, 'w') as f:
+        f.write('Dir::Etc::SourceList "{0}/sources.list";\n'
+                'Dir::Etc::SourceParts "{0}/sources.list.d";\n'
+                'Dir::State::Lists "{0}/lists";\n'
+                'Dir::Cache "{0}/cache";\n'
+                'Acquire::http::Proxy "{1}";\n'
+                'Acquire::Languages "none";\n'
+                'APT::Sandbox::User "root";\n'.format(directory, proxy))
+    env = {'APT_CONFIG': config}
+    subprocess.check_call(['apt-get', 'update', '-qq'],
+                          env=dict(os.environ, **env),
+                          stdout=subprocess.DEVNULL)
+    return env
+
+
+def setup_maven(directory, mirror):
+    """Write a Maven settings.xml that mirrors everything to the fake repo.
+
+    Returns:
+        env (dict): environment variables for mvn
+
+    """
+    m2 = os.path.join(directory, '.m2')
+    os.makedirs(m2, exist_ok=True)
+    with open(os.path.join(m2, 'settings.xml'), 'w') as f:
+        f.write('<settings><mirrors><mirror><id>bench</id>'
+                '<mirrorOf>*</mirrorOf><url>{}</url></mirror></mirrors>'
+                '</settings>\n'.format(mirror))
+    return {'HOME': directory}
+
+
+def setup_udd(directory, universe):
+    """Create the SQLite stand-in of UDD.
+
+    Returns:
+        env (dict): environment variables for the fake psycopg2
+
+    """
+    sys.path.insert(0, os.path.join(HERE, 'fakeudd'))
+    try:
+        from psycopg2 import create_database
+    finally:
+        sys.path.pop(0)
+    path = os.path.join(directory, 'udd.sqlite')
+    create_database(path, *udd_rows(universe))
+    return {
+        'FASTENSOURCE_FAKE_UDD': path,
+        'PYTHONPATH': os.pathsep.join([os.path.join(HERE, 'fakeudd'), ROOT]),
+    }
+
+
+def count_artifacts(path):
+    if not os.path.isfile(path):
+        return 0
+    with open(path) as f:
+        return sum(len(v) for v in json.load(f)['packages'].values())
+
+
+def run(language, mode, universe, server, directory, env, extra=()):
+    """Run one fastensource command and measure it.
+
+    Returns:
+        result (dict)
+
+    """
+    ecosystem = ECOSYSTEMS[language]
+    workdir = os.path.join(directory, '{}-{}'.format(language, mode))
+    os.makedirs(workdir)
+    projects = os.path.join(workdir, 'projects.csv')
+    with open(projects, 'w') as f:
+        f.write('\n'.join(universe.projects(ecosystem, mode)) + '\n')
+    cmd = [sys.executable, '-m', 'fastensource', language, str(mode),
+           '-p', projects, '-o', 'out', '-d', '0', '-D', '0',
+           '--proxy', server.url,
+           '--metrics', os.path.join(workdir, 'metrics.json')] + list(extra)
+    log = open(os.path.join(workdir, 'log.txt'), 'wb')
+    requests_before = server.requests
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log,
+                               stderr=subprocess.STDOUT)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    log.close()
+    process.returncode = exit_code_of(status)
+    artifacts = count_artifacts(os.path.join(workdir, 'out', 'versions.json'))
+    requests = server.requests - requests_before
+    metrics = None
+    if os.path.isfile(os.path.join(workdir, 'metrics.json')):
+        with open(os.path.join(workdir, 'metrics.json')) as f:
+            metrics = json.load(f)
+    # ru_maxrss is in kilobytes on Linux, and in bytes on Mac OSX
+    rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {
+        'language': language,
+        'mode': mode,
+        'exit_code': process.returncode,
+        'artifacts': artifacts,
+        'wall_time': wall,
+        'artifacts_per_sec': artifacts / wall if wall else 0.0,
+        'requests': requests,
+        'requests_per_artifact': requests / artifacts if artifacts else None,
+        'peak_rss_bytes': rss,
+        'metrics': metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(
+                                     'End-to-end throughput benchmark of '
+                                     'fastensource with local upstreams.'))
+    parser.add_argument('-l', '--languages', nargs='+',
+                        default=['python', 'java', 'c'],
+                        choices=['python', 'java', 'c'])
+    parser.add_argument('-m', '--modes', nargs='+', type=int,
+                        default=[1, 2, 3], choices=[1, 2, 3])
+    parser.add_argument('-s', '--size', type=int, default=50,
+                        help='Number of packages in the synthetic graph')
+    parser.add_argument('-V', '--versions', type=int, default=2,
+                        help='Number of versions of each package')
+    parser.add_argument('-e', '--max-deps', type=int, default=3,
+                        help='Maximum dependencies of each package')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='bench_results.json',
+                        help='JSON file to save the results')
+    parser.add_argument('-x', '--extra', default='',
+                        help='More fastensource arguments, e.g. '
+                             '"--resolver metadata"')
+    parser.add_argument('-k', '--keep', action='store_true',
+                        help='Keep the working directory')
+    args = parser.parse_args()
+
+    universe = Universe(args.size, args.versions, args.max_deps, args.seed)
+    server = FakeUpstreams(universe).start()
+    directory = tempfile.mkdtemp(prefix='fastensource-bench-')
+    results = list()
+    try:
+        env = dict(os.environ,
+                   FASTENSOURCE_PYPI_URL=server.url + '/',
+                   FASTENSOURCE_LIBIO_URL=server.url + '/',
+                   FASTENSOURCE_MVNREPOSITORY_URL=server.url + '/',
+                   PIP_CACHE_DIR=os.path.join(directory, 'pip-cache'),
+                   PIP_NO_BUILD_ISOLATION='0',
+                   PIP_CONFIG_FILE=os.devnull,
+                   PIP_DISABLE_PIP_VERSION_CHECK='1')
+        env.update(setup_udd(directory, universe))
+        for language in args.languages:
+            missing = [t for t in TOOLS[language] if not shutil.which(t)]
+            if missing:
+                print('Skip {}: {} not found'.format(language,
+                                                      ', '.join(missing)))
+                continue
+            language_env = dict(env)
+            if language == 'c':
+                language_env.update(setup_apt(
+                    os.path.join(directory, 'apt'), server.url))
+            elif language == 'java':
+                language_env.update(setup_maven(
+                    os.path.join(directory, 'maven'), server.url + '/maven2/'
+                ))
+            for mode in args.modes:
+                result = run(language, mode, universe, server, directory,
+                             language_env, shlex.split(args.extra))
+                results.append(result)
+                print('{language} mode {mode}: {artifacts} artifacts in '
+                      '{wall_time:.1f}s ({artifacts_per_sec:.2f}/s), '
+                      'exit code {exit_code}'.format(**result))
+    finally:
+        server.shutdown()
+        if args.keep:
+            print('Working directory: {}'.format(directory))
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'size': args.size,
+        'versions': args.versions,
+        'max_deps': args.max_deps,
+        'seed': args.seed,
+        'extra': args.extra,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
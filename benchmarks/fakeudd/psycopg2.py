@@ -0,0 +1,72 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Stand-in for psycopg2 that runs the UDD queries of fastensource on a
+SQLite database (see benchmarks/e2e.py).
+
+The database path is read from FASTENSOURCE_FAKE_UDD.
+"""
+import os
+import sqlite3
+
+
+class Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace('%s', '?'), params)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+
+class Connection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path,
+                                     detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def cursor(self):
+        return Cursor(self._conn.cursor())
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(dbname=None, user=None, password=None, **kwargs):
+    return Connection(os.environ['FASTENSOURCE_FAKE_UDD'])
+
+
+def create_database(path, sources, uploads, packages):
+    """Create the UDD tables used by fastensource."""
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute('CREATE TABLE sources (source TEXT, version TEXT)')
+    conn.execute('CREATE TABLE upload_history '
+                 '(source TEXT, version TEXT, date TIMESTAMP)')
+    conn.execute('CREATE TABLE all_packages '
+                 '(source TEXT, source_version TEXT, depends TEXT)')
+    conn.executemany('INSERT INTO sources VALUES (?, ?)', sources)
+    conn.executemany('INSERT INTO upload_history VALUES (?, ?, ?)', uploads)
+    conn.executemany('INSERT INTO all_packages VALUES (?, ?, ?)', packages)
+    conn.commit()
+    conn.close()
@@ -0,0 +1,136 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Startup time benchmark of the fastensource CLI.
+
+Measures the wall time of `fastensource <command> --help' and of building
+the parser for a command, and the modules imported while doing so, in fresh
+interpreters. Exits with status 1 if the best time of a case exceeds
+--max-ms, or if any of the heavy modules is imported, so it can be used as
+a regression guard.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time -n 20 --max-ms 150 -o startup.json
+"""
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Modules that must only be imported when a command actually runs.
+HEAVY_MODULES = ('lxml', 'pydot', 'psycopg2', 'requests', 'pkg_resources',
+                 'cProfile')
+CASES = {
+    'help': ['-m', 'fastensource', '--help'],
+    'python-help': ['-m', 'fastensource', 'python', '--help'],
+    'parse': ['-c', (
+        'import sys\n'
+        'from fastensource.cli import get_parser\n'
+        'get_parser().parse_args(["java", "1"])\n'
+        'print(",".join(m for m in {} if m in sys.modules))\n'
+    ).format(repr(HEAVY_MODULES))],
+}
+
+
+def measure(argv, runs):
+    """Run the interpreter with argv `runs' times.
+
+    Returns:
+        times (list): wall time in seconds of each run
+        output (str): the standard output of the last run
+
+    """
+    times = list()
+    output = ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable] + argv, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True
+        ).stdout.decode('utf-8')
+        times.append(time.perf_counter() - start)
+    return times, output
+
+
+def slowest_imports(count=10):
+    """Return the modules with the largest cumulative import time when
+    the parser is built, from `python -X importtime'.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'from fastensource.cli import get_parser; get_parser()'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+    )
+    imports = list()
+    for line in result.stderr.decode('utf-8').splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        imports.append((int(parts[1]), parts[2].strip()))
+    imports.sort(reverse=True)
+    return [{'module': m, 'us': us} for us, m in imports[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(
+                                     'Startup time benchmark of the '
+                                     'fastensource CLI.'))
+    parser.add_argument('-n', '--runs', type=int, default=10,
+                        help='Number of runs of each case')
+    parser.add_argument('--max-ms', type=float,
+                        help='Fail if the best time of a case exceeds it')
+    parser.add_argument('-o', '--output',
+                        help='JSON file to save the results')
+    args = parser.parse_args()
+
+    baseline, _ = measure(['-c', 'pass'], args.runs)
+    results = {'interpreter': min(baseline) * 1000, 'cases': {}}
+    failed = False
+    print('{:<12} {:>9} {:>9}'.format('case', 'best ms', 'median ms'))
+    print('{:<12} {:>9.1f}'.format('interpreter', results['interpreter']))
+    for name, argv in CASES.items():
+        times, output = measure(argv, args.runs)
+        times.sort()
+        best, median = times[0] * 1000, times[len(times) // 2] * 1000
+        results['cases'][name] = {'best': best, 'median': median}
+        print('{:<12} {:>9.1f} {:>9.1f}'.format(name, best, median))
+        if args.max_ms is not None and best > args.max_ms:
+            print('{}: {:.1f} ms exceeds {:.1f} ms'.format(name, best,
+                                                           args.max_ms))
+            failed = True
+        if name == 'parse' and output.strip():
+            print('Heavy modules imported at startup: {}'.format(
+                output.strip()))
+            results['heavy'] = output.strip().split(',')
+            failed = True
+    results['slowest'] = slowest_imports()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
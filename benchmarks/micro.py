@@ -0,0 +1,395 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Microbenchmarks of the parsing and resolution helpers.
+
+Times the pure-Python helpers that run for every artifact (page parsers,
+name and version parsers, Debian dependency resolution, DOT parsing,
+de-duplication) on large inputs: a PyPI history with hundreds of
+releases, a long Depends field, a big dependency tree, and so on.
+
+The inputs are generated with a fixed seed, in the shape of the real
+pages and files. A file with the name of a fixture in benchmarks/fixtures/
+(e.g. a saved pypi.org history page as pypi_history.html) is used
+instead of the generated one.
+
+Each timing of a benchmark is paired with a timing of a fixed pure-Python
+workload right before it, and the median ratio of the pairs is compared,
+so that baselines that were saved on another machine stay comparable and
+a busy machine does not fail the run. Exits with status 1 if a benchmark
+is slower than its baseline (benchmarks/baselines/micro.json) by more
+than --threshold; baselines saved with another version of a fixture are
+not compared.
+
+Usage:
+    python -m benchmarks.micro
+    python -m benchmarks.micro -k parser -t 0.3 -o micro.json
+    python -m benchmarks.micro --save
+"""
+import gc
+import os
+import sys
+import json
+import random
+import timeit
+import statistics
+import hashlib
+import argparse
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(DIRECTORY, 'fixtures')
+BASELINES = os.path.join(DIRECTORY, 'baselines', 'micro.json')
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 9
+DEFAULT_MIN_TIME = 0.25
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+          'Oct', 'Nov', 'Dec')
+
+
+def _timestamp(rng):
+    return '{} {:02d}, {}'.format(rng.choice(MONTHS), rng.randint(1, 28),
+                                  rng.randint(2005, 2020))
+
+
+def _versions(rng, count):
+    versions = list()
+    for i in range(count):
+        version = '{}.{}.{}'.format(i // 100, (i // 10) % 10, i % 10)
+        if rng.random() < 0.1:
+            version += rng.choice(('a1', 'b2', 'rc1', '.post1', '.dev0'))
+        versions.append(version)
+    return versions
+
+
+def pypi_history(rng):
+    """pypi.org/project/<name>/#history with 800 releases."""
+    releases = list()
+    for version in reversed(_versions(rng, 800)):
+        releases.append(
+            '<div class="release">\n'
+            '  <a class="card release__card" href="/project/bigproject/{0}/">'
+            '\n    <p class="release__version">\n      {0}\n    </p>\n'
+            '    <p class="release__version-date"><time datetime="" '
+            'data-controller="localized-time">\n{1}\n</time></p>\n'
+            '  </a>\n</div>\n'.format(version, _timestamp(rng)))
+    nav = ''.join('<li><a href="/help/#{0}">{0}</a></li>'.format(i)
+                  for i in range(200))
+    return ('<html><head><title>bigproject</title></head><body>'
+            '<nav><ul>{}</ul></nav><div class="release-timeline">{}</div>'
+            '</body></html>'.format(nav, ''.join(releases))).encode('utf-8')
+
+
+def libio_versions(rng):
+    """libraries.io/<platform>/<name>/versions with 500 rows."""
+    rows = list()
+    for version in reversed(_versions(rng, 500)):
+        rows.append(
+            '<tr><td>\n<a href="/pypi/bigproject/{0}">{0}</a>\n</td>'
+            '<td>\n{1}\n</td><td><a href="#">Browse source on GitHub</a>'
+            '</td><td><a href="#">View diff between {0} and prev</a></td>'
+            '</tr>\n'.format(version, _timestamp(rng)))
+    return ('<html><body><table class="table">{}</table></body></html>'
+            .format(''.join(rows))).encode('utf-8')
+
+
+def mvnrepository_version(rng):
+    """mvnrepository.com/artifact/<group>/<artifact>/<version>."""
+    grid = ''.join('<tr><th>{}</th><td>{}</td></tr>'.format(k, v) for k, v in
+                   (('License', 'Apache 2.0'), ('Categories', 'Logging'),
+                    ('Tags', 'logging api'), ('HomePage', 'http://x'),
+                    ('Date', '({})'.format(_timestamp(rng))),
+                    ('Files', 'jar (41 KB)'), ('Repositories', 'Central'),
+                    ('Used By', '62,713 artifacts')))
+    usages = ''.join(
+        '<tr><td><a href="/artifact/org.g{0}/a{0}">org.g{0} » a{0}</a>'
+        '</td><td>{1}</td></tr>'.format(i, rng.randint(1, 9))
+        for i in range(1000))
+    return ('<html><body><table class="grid">{}</table>'
+            '<table class="grid versions">{}</table></body></html>'
+            .format(grid, usages)).encode('utf-8')
+
+
+def debian_depends(rng):
+    """The Depends field of a metapackage with 400 dependencies."""
+    dependencies = list()
+    for i in range(400):
+        name = 'lib{}-{}'.format(rng.choice(('gtk', 'qt', 'x11', 'ssl')), i)
+        kind = rng.random()
+        if kind < 0.4:
+            dependencies.append('{} (>= {}.{})'.format(name, i % 7, i % 11))
+        elif kind < 0.6:
+            dependencies.append('{} (= {}.{}-{}+deb9u1)'.format(
+                name, i % 7, i % 11, i % 3))
+        elif kind < 0.8:
+            dependencies.append('{0} | {0}-alt (>= 1.0)'.format(name))
+        else:
+            dependencies.append(name)
+    return ', '.join(dependencies)
+
+
+def dependency_tree(rng):
+    """mvn dependency:tree -DoutputType=dot with 300 edges."""
+    root = '"org.big:project:jar:1.0"'
+    edges = list()
+    nodes = [root]
+    for i in range(300):
+        node = '"org.dep{0}:artifact{0}:jar:{1}.{2}:{3}"'.format(
+            i, i % 9, i % 13, rng.choice(('compile', 'test', 'runtime')))
+        edges.append('\t{} -> {} ; \n'.format(rng.choice(nodes), node))
+        nodes.append(node)
+    return 'digraph {} {{ \n{} }} \n'.format(root, ''.join(edges))
+
+
+def sdists(rng):
+    """10000 sdist filenames, one per line."""
+    names = list()
+    for i in range(10000):
+        name = rng.choice(('Django', 'zope.interface', 'python-dateutil',
+                           'backports.ssl_match_hostname', 'six')) + str(i)
+        version = _versions(rng, 1 + i % 50)[-1]
+        names.append('{}-{}{}'.format(name, version,
+                                      rng.choice(('.tar.gz', '.zip'))))
+    return '\n'.join(names)
+
+
+def debian_sources(rng):
+    """10000 source directories of apt-get source, one per line."""
+    return '\n'.join('{}-{}.{}.{}'.format(
+        rng.choice(('glibc', 'gcc-6', 'linux', 'openssl', 'dpkg')) + str(i),
+        i % 5, i % 30, i % 7) for i in range(10000))
+
+
+GENERATORS = {
+    'pypi_history.html': pypi_history,
+    'libio_versions.html': libio_versions,
+    'mvnrepository_version.html': mvnrepository_version,
+    'debian_depends.txt': debian_depends,
+    'dependency_tree.dot': dependency_tree,
+    'sdists.txt': sdists,
+    'debian_sources.txt': debian_sources,
+}
+
+
+def load_fixture(name):
+    """Return a saved fixture, or generate it.
+
+    Returns:
+        content (bytes or str): bytes for the html pages
+        digest (str): to check that baselines used the same fixture
+
+    """
+    binary = name.endswith('.html')
+    path = os.path.join(FIXTURES, name)
+    if os.path.isfile(path):
+        with open(path, 'rb' if binary else 'r') as f:
+            content = f.read()
+    else:
+        content = GENERATORS[name](random.Random(name))
+    data = content if binary else content.encode('utf-8')
+    return content, hashlib.sha1(data).hexdigest()[:12]
+
+
+def benchmarks():
+    """Return the benchmarks: name to (fixture, setup), where setup takes
+    the fixture and returns the function to time.
+    """
+    from fastensource.utils import scrappers, maven, udd, helpers
+    from fastensource.utils.versions import VersionStore
+
+    def names_versions(content):
+        pairs = [helpers.find_name_version_pypi(p)
+                 for p in content.splitlines()]
+        names, versions = [p[0] for p in pairs], [p[1] for p in pairs]
+        store = VersionStore()
+        for name, version in pairs[::2]:
+            store.add(name, version, 'Sep 25, 2018')
+        return lambda: helpers.remove_duplicates(names, versions, store)
+
+    def youngest(content):
+        module = _load_update_script()
+        versions = dict(scrappers.pypi_parser(content))
+        versions[next(iter(versions))] = ''
+        return lambda: module.find_youngest_version(versions)
+
+    return {
+        'pypi_parser': ('pypi_history.html',
+                        lambda c: lambda: scrappers.pypi_parser(c)),
+        'libio_parser': ('libio_versions.html',
+                         lambda c: lambda: scrappers.libio_parser(c)),
+        'mvnrepository_parser': (
+            'mvnrepository_version.html',
+            lambda c: lambda: scrappers.mvnrepository_parser(c)),
+        'find_name_version_pypi': (
+            'sdists.txt',
+            lambda c: lambda: [helpers.find_name_version_pypi(p)
+                               for p in c.splitlines()]),
+        'find_name_version_debian': (
+            'debian_sources.txt',
+            lambda c: lambda: [helpers.find_name_version_debian(p)
+                               for p in c.splitlines()]),
+        'resolve_dependencies': (
+            'debian_depends.txt',
+            lambda c: lambda: udd.resolve_dependencies(c)),
+        'parse_dependency_tree': (
+            'dependency_tree.dot',
+            lambda c: lambda: maven.parse_dependency_tree(c)),
+        'remove_duplicates': ('sdists.txt', names_versions),
+        'find_youngest_version': ('pypi_history.html', youngest),
+    }
+
+
+def _load_update_script():
+    """Import update_script/find_new_versions.py (not a package)."""
+    import importlib.util
+    path = os.path.join(DIRECTORY, os.pardir, 'update_script',
+                        'find_new_versions.py')
+    spec = importlib.util.spec_from_file_location('find_new_versions', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def calibration():
+    """A fixed pure-Python workload, to normalize the times."""
+    words = [str(i * 7919 % 10007) for i in range(5000)]
+    counts = dict()
+    for word in sorted(words):
+        counts[word[:2]] = counts.get(word[:2], 0) + len(word.split('1'))
+    return counts
+
+
+def _loops(timer, min_time):
+    """Return the calls of a timing that lasts at least min_time."""
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= min_time:
+            return loops
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+
+
+def measure(func, repeat, min_time):
+    """Time func and the calibration workload back to back, repeat times.
+
+    Timing them in pairs cancels the changes of the speed of the machine
+    (frequency scaling, other processes) between the timings, and the
+    median ignores the pairs that were disturbed anyway.
+
+    Returns:
+        seconds (float): median time of a call of func
+        relative (float): median ratio of the time of func to the time of
+            the calibration workload
+
+    """
+    timer = timeit.Timer(func)
+    reference = timeit.Timer(calibration)
+    loops = _loops(timer, min_time)
+    reference_loops = _loops(reference, min_time)
+    seconds = list()
+    ratios = list()
+    for _ in range(repeat):
+        gc.collect()
+        unit = reference.timeit(reference_loops) / reference_loops
+        gc.collect()
+        elapsed = timer.timeit(loops) / loops
+        seconds.append(elapsed)
+        ratios.append(elapsed / unit)
+    return statistics.median(seconds), statistics.median(ratios)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(
+                                     'Microbenchmarks of the parsing and '
+                                     'resolution helpers of fastensource.'))
+    parser.add_argument('-k', '--keyword',
+                        help='Run only the benchmarks whose name has it')
+    parser.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='Timings of each benchmark (the median is '
+                             'kept)')
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help='Seconds of each timing')
+    parser.add_argument('-t', '--threshold', type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help='Fail if a benchmark is slower than its '
+                             'baseline by more than this fraction')
+    parser.add_argument('-b', '--baselines', default=BASELINES,
+                        help='JSON file of the baselines')
+    parser.add_argument('--save', action='store_true',
+                        help='Save the results as the new baselines')
+    parser.add_argument('-o', '--output',
+                        help='JSON file to save the results')
+    args = parser.parse_args()
+
+    baselines = dict()
+    if os.path.isfile(args.baselines):
+        with open(args.baselines, 'r') as f:
+            baselines = json.load(f)['benchmarks']
+    results = {'benchmarks': {}}
+    failed = list()
+    print('{:<24} {:>10} {:>10} {:>10} {:>8}'.format(
+        'benchmark', 'ms', 'relative', 'baseline', 'change'))
+    for name, (fixture, setup) in benchmarks().items():
+        if args.keyword and args.keyword not in name:
+            continue
+        content, digest = load_fixture(fixture)
+        seconds, relative = measure(setup(content), args.repeat,
+                                    args.min_time)
+        result = {'seconds': seconds, 'relative': relative,
+                  'fixture': digest}
+        baseline = baselines.get(name)
+        line = '{:<24} {:>10.3f} {:>10.2f}'.format(name, seconds * 1000,
+                                                   relative)
+        if baseline is not None and baseline['fixture'] == digest:
+            change = relative / baseline['relative'] - 1
+            result['change'] = change
+            line += ' {:>10.2f} {:>+7.0%}'.format(baseline['relative'],
+                                                  change)
+            if change > args.threshold:
+                failed.append(name)
+                line += ' REGRESSION'
+        elif baseline is not None:
+            line += '  (baseline of another fixture)'
+        print(line)
+        results['benchmarks'][name] = result
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save:
+        for name, result in results['benchmarks'].items():
+            baselines[name] = {'relative': round(result['relative'], 3),
+                               'fixture': result['fixture']}
+        os.makedirs(os.path.dirname(os.path.abspath(args.baselines)),
+                    exist_ok=True)
+        with open(args.baselines, 'w') as f:
+            json.dump({'benchmarks': baselines}, f, indent=2,
+                      sort_keys=True)
+            f.write('\n')
+        print('Saved the baselines to {}'.format(args.baselines))
+    elif failed:
+        print('Slower than the baselines by more than {:.0%}: {}'.format(
+            args.threshold, ', '.join(failed)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
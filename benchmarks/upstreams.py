@@ -0,0 +1,422 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Local stand-ins for the upstreams of fastensource.
+
+A single HTTP server answers for all upstreams, with the url layout that
+fastensource uses when it runs with --proxy and the FASTENSOURCE_*_URL
+environment variables:
+
+    /maven2/...                    Maven repository (poms and jars)
+    /artifact/<group>/<artifact>   mvnrepository.com pages
+    /project/<name>/               pypi.org project pages
+    /simple/<name>/, /packages/    PyPI simple index and sdists
+    /<platform>/<name>/versions    libraries.io pages
+    http://<any>/debian/...        apt source repository (as HTTP proxy)
+
+All of them serve the same synthetic dependency graph (see Universe).
+"""
+import io
+import gzip
+import random
+import hashlib
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+SUITE = 'bench'
+TIMESTAMPS = ('Apr 05, 2019', 'Sep 25, 2019')
+
+
+class Universe:
+    """Synthetic ecosystem of `size` packages with `versions` versions each.
+
+    Package i depends on up to `max_deps` packages with greater index, so
+    the graph is acyclic, and package 0 reaches most of the graph.
+    """
+    def __init__(self, size, versions=2, max_deps=3, seed=0):
+        rng = random.Random(seed)
+        self.size = size
+        self.versions = ['1.{}'.format(v) for v in range(versions)]
+        self.deps = list()
+        for i in range(size):
+            candidates = range(i + 1, size)
+            count = min(len(candidates), rng.randint(0, max_deps))
+            self.deps.append(sorted(rng.sample(candidates, count)))
+
+    def timestamp(self, version):
+        return TIMESTAMPS[self.versions.index(version) % len(TIMESTAMPS)]
+
+    def latest(self):
+        return self.versions[-1]
+
+    @staticmethod
+    def python(i):
+        return 'benchpkg{}'.format(i)
+
+    @staticmethod
+    def java(i):
+        return 'org.bench:artifact{}'.format(i)
+
+    @staticmethod
+    def debian(i):
+        return 'benchsrc{}'.format(i)
+
+    def index(self, name):
+        """Return the index of a package name of any ecosystem."""
+        digits = name.rstrip('/').split(':')[-1]
+        digits = digits[len(digits.rstrip('0123456789')):]
+        if not digits or int(digits) >= self.size:
+            return None
+        return int(digits)
+
+    def projects(self, ecosystem, mode):
+        """Return the rows of a projects file for mode 1, 2 or 3."""
+        name = getattr(self, ecosystem)
+        roots = range(0, self.size, max(1, self.size // 4))
+        if mode == 1:
+            return [name(i) for i in roots]
+        if mode == 2:
+            return ['{};{}'.format(name(i), self.versions[0]) for i in roots]
+        rows = list()
+        for i in roots:
+            for j in self.deps[i]:
+                for version in self.versions:
+                    rows.append('{},{};{},{}'.format(
+                        name(i), self.versions[0], name(j), version))
+        return rows
+
+
+def _tarball(files):
+    """Return a tar.gz with the given path: content files."""
+    out = io.BytesIO()
+    # mtime=0 makes the tarball, and thus its checksums, reproducible
+    with gzip.GzipFile(fileobj=out, mode='wb', mtime=0) as gz:
+        with tarfile.open(fileobj=gz, mode='w') as tar:
+            for path, content in files:
+                info = tarfile.TarInfo(path)
+                info.size = len(content)
+                info.mtime = 1554422400
+                tar.addfile(info, io.BytesIO(content))
+    return out.getvalue()
+
+
+class Artifacts:
+    """Build (and memoize) the files that the fake upstreams serve."""
+    def __init__(self, universe):
+        self.u = universe
+        self._cache = dict()
+        # Building a file may need other files (e.g. Release needs Sources)
+        self._lock = threading.RLock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = build()
+            return self._cache[key]
+
+    # Maven
+    def pom(self, i, version):
+        deps = ''.join(
+            '<dependency><groupId>org.bench</groupId>'
+            '<artifactId>artifact{}</artifactId><version>{}</version>'
+            '</dependency>'.format(j, self.u.latest())
+            for j in self.u.deps[i]
+        )
+        return ('<project><modelVersion>4.0.0</modelVersion>'
+                '<groupId>org.bench</groupId>'
+                '<artifactId>artifact{}</artifactId><version>{}</version>'
+                '<packaging>jar</packaging>'
+                '<dependencies>{}</dependencies></project>'.format(
+                    i, version, deps)).encode('utf-8')
+
+    def jar(self, i, version):
+        return b'PK\x05\x06' + b'\0' * 18 + b'artifact%d' % i
+
+    def mvnrepository(self, i, version=None):
+        if version is None:
+            body = '<a class="vbtn release">{}</a>'.format(self.u.latest())
+        else:
+            body = ('<table class="grid"><tr><th>Date</th>'
+                    '<td>({})</td></tr></table>'.format(
+                        self.u.timestamp(version)))
+        return '<html><body>{}</body></html>'.format(body).encode('utf-8')
+
+    # PyPI
+    def pypi_page(self, i):
+        releases = ''.join(
+            '<p class="release__version">\n{}\n</p>'
+            '<p class="release__version-date">{}</p>'.format(
+                v, self.u.timestamp(v))
+            for v in reversed(self.u.versions)
+        )
+        return '<html><body>{}</body></html>'.format(releases).encode('utf-8')
+
+    def simple(self, i, base):
+        name = self.u.python(i)
+        links = ''.join(
+            '<a href="{0}/packages/{1}-{2}.tar.gz">{1}-{2}.tar.gz</a><br/>'
+            .format(base, name, v) for v in self.u.versions
+        )
+        return '<html><body>{}</body></html>'.format(links).encode('utf-8')
+
+    def sdist(self, i, version):
+        name = self.u.python(i)
+        requires = ', '.join(repr(self.u.python(j)) for j in self.u.deps[i])
+        root = '{}-{}/'.format(name, version)
+        pkg_info = ('Metadata-Version: 2.1\nName: {}\nVersion: {}\n'
+                    .format(name, version))
+        setup = ('from setuptools import setup\n'
+                 'setup(name={!r}, version={!r}, py_modules=[],\n'
+                 '      install_requires=[{}])\n'.format(name, version,
+                                                       requires))
+        # Like setuptools, include the requirements in the egg-info
+        egg_info = root + name + '.egg-info/'
+        requires_txt = ''.join(self.u.python(j) + '\n'
+                               for j in self.u.deps[i])
+        return _tarball([(root + 'PKG-INFO', pkg_info.encode('utf-8')),
+                         (root + 'setup.py', setup.encode('utf-8')),
+                         (egg_info + 'PKG-INFO', pkg_info.encode('utf-8')),
+                         (egg_info + 'requires.txt',
+                          requires_txt.encode('utf-8'))])
+
+    def libio(self, i):
+        rows = ''.join('<tr><td>{}</td><td>{}</td></tr>'.format(
+            v, self.u.timestamp(v)) for v in reversed(self.u.versions))
+        return ('<html><body><table class="table">{}</table></body></html>'
+                .format(rows)).encode('utf-8')
+
+    # Debian
+    def debian_tarball(self, i, version):
+        name = self.u.debian(i)
+        root = '{}-{}/'.format(name, version)
+        return _tarball([
+            (root + 'debian/source/format', b'3.0 (native)\n'),
+            (root + 'debian/rules', b'#!/usr/bin/make -f\n'),
+            (root + 'README', b'synthetic source package\n'),
+        ])
+
+    def dsc(self, i, version):
+        name = self.u.debian(i)
+        tarball = self.get(('debtar', i, version),
+                           lambda: self.debian_tarball(i, version))
+        filename = '{}_{}.tar.gz'.format(name, version)
+        return ('Format: 3.0 (native)\nSource: {0}\nBinary: {0}\n'
+                'Architecture: all\nVersion: {1}\n'
+                'Maintainer: Bench <bench@example.com>\n'
+                'Checksums-Sha256:\n {2} {3} {4}\n'
+                'Files:\n {5} {3} {4}\n'.format(
+                    name, version, hashlib.sha256(tarball).hexdigest(),
+                    len(tarball), filename,
+                    hashlib.md5(tarball).hexdigest())).encode('utf-8')
+
+    def sources(self):
+        stanzas = list()
+        for i in range(self.u.size):
+            name = self.u.debian(i)
+            for version in self.u.versions:
+                files = list()
+                for suffix, content in (
+                    ('.dsc', self.get(('dsc', i, version),
+                                      lambda: self.dsc(i, version))),
+                    ('.tar.gz', self.get(('debtar', i, version),
+                                         lambda: self.debian_tarball(
+                                             i, version))),
+                ):
+                    files.append((hashlib.md5(content).hexdigest(),
+                                  hashlib.sha256(content).hexdigest(),
+                                  len(content),
+                                  '{}_{}{}'.format(name, version, suffix)))
+                stanzas.append(
+                    'Package: {0}\nBinary: {0}\nVersion: {1}\n'
+                    'Maintainer: Bench <bench@example.com>\n'
+                    'Architecture: all\nFormat: 3.0 (native)\n'
+                    'Directory: pool/main/{0}\n'
+                    'Files:\n{2}\nChecksums-Sha256:\n{3}\n'.format(
+                        name, version,
+                        '\n'.join(' {0} {2} {3}'.format(*f) for f in files),
+                        '\n'.join(' {1} {2} {3}'.format(*f) for f in files)))
+        return '\n'.join(stanzas).encode('utf-8')
+
+    def release(self):
+        sources = self.get('sources', self.sources)
+        return ('Origin: {0}\nLabel: {0}\nSuite: {0}\nCodename: {0}\n'
+                'Date: Thu, 01 Jan 2020 00:00:00 UTC\n'
+                'Architectures: all\nComponents: main\n'
+                'SHA256:\n {1} {2} main/source/Sources\n'.format(
+                    SUITE, hashlib.sha256(sources).hexdigest(),
+                    len(sources))).encode('utf-8')
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    artifacts = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _version(self, version):
+        if version in self.artifacts.u.versions:
+            return version
+        return None
+
+    def route(self, path):
+        """Return the content of path or None."""
+        a = self.artifacts
+        u = a.u
+        parts = [p for p in path.split('/') if p]
+        if not parts:
+            return None
+        head = parts[0]
+        if head == 'maven2' and len(parts) == 6:
+            i, version = u.index(parts[3]), self._version(parts[4])
+            if i is None or version is None:
+                return None
+            if parts[5].endswith('.pom'):
+                return a.get(('pom', i, version), lambda: a.pom(i, version))
+            if parts[5].endswith('.jar'):
+                return a.jar(i, version)
+            return None
+        if head == 'artifact' and len(parts) in (3, 4):
+            i = u.index(parts[2])
+            version = parts[3] if len(parts) == 4 else None
+            if i is None or (version and not self._version(version)):
+                return None
+            return a.mvnrepository(i, version)
+        if head == 'project' and len(parts) == 2:
+            i = u.index(parts[1])
+            return None if i is None else a.pypi_page(i)
+        if head == 'simple' and len(parts) == 2:
+            i = u.index(parts[1])
+            base = 'http://' + self.headers.get('Host')
+            return None if i is None else a.simple(i, base)
+        if head == 'packages' and len(parts) == 2:
+            name, version = parts[1][:-len('.tar.gz')].rsplit('-', 1)
+            i = u.index(name)
+            if i is None or not self._version(version):
+                return None
+            return a.get(('sdist', i, version), lambda: a.sdist(i, version))
+        if len(parts) == 3 and parts[2] == 'versions':
+            i = u.index(parts[1])
+            return None if i is None else a.libio(i)
+        if head == 'debian':
+            rest = '/'.join(parts[1:])
+            if rest == 'dists/{}/Release'.format(SUITE):
+                return a.get('release', a.release)
+            if rest == 'dists/{}/main/source/Sources'.format(SUITE):
+                return a.get('sources', a.sources)
+            if parts[1] == 'pool' and len(parts) == 5:
+                name, rest = parts[4].split('_', 1)
+                i = u.index(name)
+                for suffix, kind, build in (
+                    ('.dsc', 'dsc', a.dsc),
+                    ('.tar.gz', 'debtar', a.debian_tarball),
+                ):
+                    if rest.endswith(suffix):
+                        version = self._version(rest[:-len(suffix)])
+                        if i is None or version is None:
+                            return None
+                        return a.get((kind, i, version),
+                                     lambda: build(i, version))
+        return None
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def respond(self, body):
+        self.server.count()
+        path = self.path
+        if path.startswith('http://'):
+            path = urlsplit(path).path
+        content = self.route(path.split('?')[0].split('#')[0])
+        if content is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        if content.startswith(b'<'):
+            self.send_header('Content-Type', 'text/html')
+        else:
+            self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+
+class FakeUpstreams(ThreadingHTTPServer):
+    """HTTP server of all fake upstreams, counting the requests.
+
+    Args:
+        universe (Universe)
+        host (str)
+        port (int): 0 to pick a free port
+
+    """
+    daemon_threads = True
+
+    def __init__(self, universe, host='127.0.0.1', port=0):
+        handler = type('Handler', (FakeUpstreamHandler,),
+                       {'artifacts': Artifacts(universe)})
+        super().__init__((host, port), handler)
+        self.universe = universe
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def udd_rows(universe):
+    """Return the rows of the fake UDD tables.
+
+    Returns:
+        sources (list): of (source, version)
+        upload_history (list): of (source, version, date)
+        all_packages (list): of (source, source_version, depends)
+
+    """
+    from datetime import datetime
+    sources, uploads, packages = list(), list(), list()
+    for i in range(universe.size):
+        name = universe.debian(i)
+        depends = ', '.join('{} (>= 1.0)'.format(universe.debian(j))
+                            for j in universe.deps[i]) or None
+        for version in universe.versions:
+            date = datetime.strptime(universe.timestamp(version), '%b %d, %Y')
+            sources.append((name, version))
+            uploads.append((name, version, date))
+            packages.append((name, version, depends))
+    return sources, uploads, packages
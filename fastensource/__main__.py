@@ -32,11 +32,21 @@ from fastensource.cli import get_parser
 def main():
     parser = get_parser()
     args = parser.parse_args()
-    #  try:
-    # execute the appropriate command
-    args.func(args)
-    #  except AttributeError:
-        #  parser.print_help(sys.stdout)
+    from fastensource.utils.helpers import Error, ConnectionError
+    try:
+        # execute the appropriate command
+        if getattr(args, 'profile', None):
+            from fastensource.utils.profiling import Profiler
+            with Profiler(args.profile, args.profiler, args.profile_stage):
+                args.func(args)
+        else:
+            args.func(args)
+    except ConnectionError as e:
+        print(e)
+        sys.exit(1)
+    except Error as e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        sys.exit(1)
 
 
 if __name__ == '__main__':
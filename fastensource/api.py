@@ -0,0 +1,117 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Library API of the download engine.
+
+The CLI is a thin layer over it; other programs can crawl without
+building command lines:
+
+    from fastensource import api
+
+    config = api.Config('python', 2, projects='projects.csv',
+                        output='/data/pypi', jobs=8)
+    result = api.crawl(config)
+    for name, version, timestamp in result.artifacts:
+        ...
+
+Crawls never change the working directory and report errors with
+exceptions instead of exiting, so they can run in threads or one after
+the other in a long-lived process. The adaptive throttle and the metrics
+are shared by all the crawls of a process.
+"""
+import argparse
+import importlib
+from fastensource.commands.command import CrawlResult
+from fastensource.utils.helpers import Error, ConnectionError,\
+        ConfigurationError, ToolNotFoundError
+
+__all__ = ['Config', 'crawl', 'CrawlResult', 'Error', 'ConnectionError',
+           'ConfigurationError', 'ToolNotFoundError']
+
+# CLI subcommand to the module and the class of its command
+COMMANDS = {
+    'python': ('fastensource.commands.pypi', 'Pypi'),
+    'java': ('fastensource.commands.maven', 'Maven'),
+    'c': ('fastensource.commands.debian', 'Debian'),
+}
+ALIASES = {'pypi': 'python', 'maven': 'java', 'debian': 'c'}
+
+
+class Config(argparse.Namespace):
+    """The options of a crawl, with the defaults of the CLI.
+
+    The options have the names of the long CLI options, with underscores
+    (e.g. requests_delay for --requests-delay).
+
+    Args:
+        language (str): python, java, or c (or pypi, maven, debian)
+        mode (int): 1, 2, or 3 (see the README)
+        **options: options to override
+
+    Raises:
+        ConfigurationError: If the language or an option is unknown.
+
+    """
+    def __init__(self, language, mode=1, **options):
+        from fastensource.cli import get_parser
+        language = ALIASES.get(language, language)
+        if language not in COMMANDS:
+            raise ConfigurationError('Unknown language {} (Valid languages: '
+                                     '{})'.format(language,
+                                                  ', '.join(COMMANDS)))
+        defaults = vars(get_parser().parse_args([language, str(mode)]))
+        del defaults['func']
+        unknown = sorted(set(options) - set(defaults))
+        if unknown:
+            raise ConfigurationError('Unknown options for {}: {}'.format(
+                language, ', '.join(unknown)))
+        defaults.update(options)
+        super(Config, self).__init__(**defaults)
+        self.language = language
+
+
+def crawl(config, messages=None, errors=None, versions_cache=None):
+    """Run a crawl.
+
+    Args:
+        config (Config): the options
+        messages (file): where to log messages (default: sys.stdout)
+        errors (file): where to log errors (default: sys.stderr)
+        versions_cache (VersionsCache): keep the versions file in memory
+            for the next crawls
+
+    Raises:
+        ToolNotFoundError: If the package manager is not installed.
+        ConfigurationError: If an option is invalid.
+        ConnectionError: If a repository cannot be reached.
+
+    Returns:
+        result (CrawlResult): the artifacts that were added to the
+            versions file, and the plan that was saved or executed
+
+    """
+    module, name = COMMANDS[config.language]
+    command = getattr(importlib.import_module(module), name)(
+        config, messages, errors)
+    command.versions_cache = versions_cache
+    return command.run()
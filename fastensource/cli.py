@@ -26,6 +26,32 @@
 import argparse
 import importlib
 import sys
+from fastensource.utils.profiling import PROFILERS, STAGES, STAGE_GROUPS
+from fastensource.utils.progress import MODES
+from fastensource.utils.plan import ORDERS
+from fastensource.utils.layout import LAYOUTS
+
+
+def lazy_command(module, name):
+    """Return a function that imports and runs a command only when called.
+
+    Importing a command pulls in its heavy dependencies (lxml, pydot,
+    requests, psycopg2, ...), so it is deferred until the subcommand is
+    actually executed and `--help' or argument errors stay fast.
+
+    Args:
+        module (str): the module of the command (e.g.
+            fastensource.commands.pypi)
+        name (str): the class of the command in the module
+
+    Returns:
+        func (function): takes the parsed args, runs the command, and
+            returns its result
+    """
+    def func(args):
+        return getattr(importlib.import_module(module), name)(args).run()
+    func.__qualname__ = func.__name__ = name
+    return func
 
 
 def get_parser():
@@ -100,23 +126,279 @@ def get_parser():
                          'File to save timestamps.'
                         )
         )
-        requests_delay = 15 if subcommand[1] == 'Maven' else 0
+        locals()[subcommand[0]].add_argument('--layout',
+                        choices=LAYOUTS,
+                        default='flat',
+                        help=(
+                         'Save the artifacts directly in the output '
+                         'directory, or in <shard>/<name>/<version>/ '
+                         'with an index (for large outputs).'
+                        )
+        )
         commands_delay = 10 if subcommand[1] == 'Maven' else 0
         locals()[subcommand[0]].add_argument('-d', '--requests-delay',
-                        default=requests_delay,
+                        type=float,
+                        default=0,
                         help=(
-                         'Delay for each request.'
+                         'Fixed delay for each request, on top of the '
+                         'adaptive per-host throttle.'
                         )
         )
         locals()[subcommand[0]].add_argument('-D', '--commands-delay',
+                        type=float,
                         default=commands_delay,
                         help=(
                          'Delay for each command.'
                         )
         )
-        module = importlib.import_module(
-            'fastensource.commands.' + subcommand[1].lower()
+        locals()[subcommand[0]].add_argument('-t', '--command-timeout',
+                        type=float,
+                        default=3600,
+                        help=(
+                         'Seconds before a pip, mvn or apt-get command is '
+                         'killed.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--max-per-host',
+                        type=int,
+                        default=16,
+                        help=(
+                         'Upper bound of the adaptive concurrent requests '
+                         'to each host.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--max-retries',
+                        type=int,
+                        default=3,
+                        help=(
+                         'Retries of throttled (429, 503) and failed '
+                         'requests.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--proxy',
+                        help=(
+                         'Url of a fastensource serve proxy to download '
+                         'through (e.g. http://127.0.0.1:3142).'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--frontier-memory',
+                        type=int,
+                        default=100000,
+                        help=(
+                         'Projects to download that are kept in memory; '
+                         'the rest are spilled to disk.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--spill-dir',
+                        help=(
+                         'Directory for the spilled projects (default: the '
+                         'temporary directory).'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--extract',
+                        metavar='DIR',
+                        help=(
+                         'Also extract the downloaded artifacts into '
+                         'DIR/<ecosystem>/<name>/<version>/, in parallel.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--extract-jobs',
+                        type=int,
+                        help=(
+                         'Extraction processes (default: the number of '
+                         'CPUs).'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--dedup',
+                        action='store_true',
+                        help=(
+                         'Store each unique extracted file once in '
+                         'DIR/.blobs, with a manifest per version, and '
+                         'hard link the files of the versions to it.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--membership',
+                        metavar='FILE',
+                        help=(
+                         'Membership file of the downloaded artifacts '
+                         '(see update_script/build_membership.py) to map '
+                         'instead of indexing the versions file.'
+                        )
+        )
+        plan = locals()[subcommand[0]].add_mutually_exclusive_group()
+        plan.add_argument('--plan',
+                        metavar='FILE',
+                        help=(
+                         'Resolve the closure of the projects from metadata '
+                         'only and save it with estimated sizes to FILE, '
+                         'without downloading anything (dry run).'
+                        )
+        )
+        plan.add_argument('--execute-plan',
+                        metavar='FILE',
+                        help=(
+                         'Download the artifacts of a plan saved with '
+                         '--plan, in parallel.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('-j', '--jobs',
+                        type=int,
+                        default=4,
+                        help=(
+                         'Parallel downloads of --execute-plan (and of '
+                         '--resolver metadata).'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--order',
+                        choices=ORDERS,
+                        default='size',
+                        help=(
+                         'Download order of --execute-plan: largest first, '
+                         'dependencies first, or as resolved.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--bandwidth',
+                        type=float,
+                        help=(
+                         'MB/s to assume in the time estimate of plans '
+                         '(default: 10).'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--metrics',
+                        help=(
+                         'JSON file to save counters and latency '
+                         'histograms per host and per stage.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--prometheus',
+                        help=(
+                         'Prometheus textfile to save the metrics.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--metrics-interval',
+                        type=float,
+                        default=60,
+                        help=(
+                         'Seconds between metrics exports during a run.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--progress',
+                        choices=MODES,
+                        default='auto',
+                        help=(
+                         'Report progress as a TTY line, as JSON lines, '
+                         'or not at all (auto: TTY line on terminals).'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--progress-interval',
+                        type=float,
+                        default=2,
+                        help=(
+                         'Seconds between progress reports.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--profile',
+                        metavar='DIR',
+                        help=(
+                         'Profile the run and save the profiles '
+                         '(.prof, .collapsed) to DIR.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--profiler',
+                        choices=PROFILERS,
+                        default='both',
+                        help=(
+                         'cProfile, a sampling profiler for flamegraphs, '
+                         'or both.'
+                        )
+        )
+        locals()[subcommand[0]].add_argument('--profile-stage',
+                        action='append',
+                        choices=sorted(STAGES + tuple(STAGE_GROUPS)),
+                        help=(
+                         'Profile only this stage (can be repeated).'
+                        )
+        )
+        _func = lazy_command(
+            'fastensource.commands.' + subcommand[1].lower(),
+            subcommand[1].capitalize()
         )
-        _func = getattr(module, subcommand[1].capitalize())
         locals()[subcommand[0]].set_defaults(func=_func)
+    java.add_argument('-i', '--maven-index',
+                      help=(
+                       'Local Maven index to find versions and timestamps '
+                       'without network requests (see '
+                       'update_script/import_maven_index.py).'
+                      )
+    )
+    for subcommand in (java, python):
+        subcommand.add_argument('--mirror',
+                        action='append',
+                        help=(
+                         'Base url of a mirror of the repository (Maven) '
+                         'or index (PyPI); can be repeated. Requests go '
+                         'to the fastest mirror and fail over to the '
+                         'others.'
+                        )
+        )
+    python.add_argument('--resolver',
+                        choices=['pip', 'metadata', 'metadata-only'],
+                        default='pip',
+                        help=(
+                         'Resolve dependencies with pip, or from the index '
+                         'metadata and download the sdists concurrently, '
+                         'falling back to pip for dynamic metadata '
+                         '(metadata) or not (metadata-only).'
+                        )
+    )
+    java.add_argument('--hedge',
+                      action='store_true',
+                      help=(
+                       'Also send requests that are slower than usual '
+                       'to the second best mirror.'
+                      )
+    )
+    for subcommand in (java, c):
+        subcommand.add_argument('--dependency-cache',
+                        metavar='FILE',
+                        help=(
+                         'SQLite file to cache resolved dependencies '
+                         'across runs.'
+                        )
+        )
+    daemon = subparsers.add_parser('daemon',
+                                   description=(
+                                    'Stay resident and run crawl jobs '
+                                    'from a spool directory or a Unix '
+                                    'socket, with warm connections and '
+                                    'caches.'
+                                   )
+    )
+    daemon.add_argument('--spool', metavar='DIR',
+                        help=('Run the jobs saved to DIR/new/; their '
+                              'results are saved to DIR/done/.'))
+    daemon.add_argument('--socket', metavar='PATH',
+                        help=('Unix socket to accept jobs on, one JSON '
+                              'object per line.'))
+    daemon.add_argument('--poll', type=float, default=1,
+                        help='Seconds between scans of the spool.')
+    daemon.set_defaults(func=lazy_command('fastensource.commands.daemon',
+                                          'Daemon'))
+    serve = subparsers.add_parser('serve',
+                                   description=(
+                                    'Run a local caching proxy for Maven, '
+                                    'PyPI and apt, to share downloaded '
+                                    'artifacts between runs.'
+                                   )
+    )
+    serve.add_argument('-H', '--host', default='127.0.0.1',
+                       help='Address to listen on.')
+    serve.add_argument('-P', '--port', type=int, default=3142,
+                       help='Port to listen on.')
+    serve.add_argument('-c', '--cache', default='cache',
+                       help='Directory to save the cached artifacts.')
+    serve.add_argument('--index-ttl', type=int, default=600,
+                       help='Seconds before index files are fetched again.')
+    serve.set_defaults(func=lazy_command('fastensource.commands.serve',
+                                         'Serve'))
     return parser
@@ -25,49 +25,183 @@
 #
 import sys
 import os
-import csv
-import json
-from pkg_resources import resource_filename
 from abc import ABC, abstractmethod
-from fastensource.utils.helpers import is_program
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fastensource.utils.helpers import is_program, get_throttle,\
+        ConfigurationError, ToolNotFoundError
+from fastensource.utils.metrics import metrics, timed, MetricsWriter
+from fastensource.utils.progress import ProgressReporter
+from fastensource.utils.plan import Plan, PlanError, DEFAULT_BANDWIDTH
+from fastensource.utils.depcache import DependencyCache
+from fastensource.utils.projects import HashedSet, read_projects, take
+from fastensource.utils.frontier import Frontier, DEFAULT_CAPACITY
+from fastensource.utils.extract import Extractor
+from fastensource.utils.layout import open_layout
+from fastensource.utils.membership import MembershipFile, MembershipSet
+from fastensource.utils.versions import VersionStore, read_versions,\
+        write_versions
+
+# Rows of the projects file that are read at a time, when the frontier of
+# projects to download is empty.
+CHUNK_SIZE = 1000
+
+
+class CrawlResult:
+    """What a command did.
+
+    Args:
+        ecosystem (str): e.g. pypi, maven, debian
+        output (str): absolute path of the output directory
+        artifacts (list): of (name, version, timestamp) tuples, for the
+            artifacts that were added to the versions file
+        versions (VersionStore): the whole versions file
+        plan (Plan): the plan that was saved or executed, if any
+
+    """
+    def __init__(self, ecosystem, output, artifacts, versions, plan=None):
+        self.ecosystem = ecosystem
+        self.output = output
+        self.artifacts = artifacts
+        self.versions = versions
+        self.plan = plan
+
+    def __repr__(self):
+        return '<CrawlResult {} {} artifacts in {}>'.format(
+            self.ecosystem, len(self.artifacts), self.output)
 
 
 class Command(ABC):
-    def __init__(self, args):
+    """A crawl of an ecosystem.
+
+    The constructor only checks the package manager and the arguments;
+    run does the work and then releases the resources of the command
+    (call close if run is not called). Commands never change the working
+    directory: relative paths of the arguments are made absolute once, so
+    commands can run in threads, or one after the other in the same
+    process.
+
+    Args:
+        args: the options of the CLI (argparse.Namespace or api.Config)
+        messages (file): where to log messages
+        errors (file): where to log errors
+
+    Raises:
+        ToolNotFoundError: If the package manager is not installed.
+        ConfigurationError: If an argument is invalid.
+
+    """
+    def __init__(self, args, messages=None, errors=None):
         self.package_manager = ''
         # Logs
-        self.errors = sys.stderr
-        self.messages = sys.stdout
+        self.errors = errors or sys.stderr
+        self.messages = messages or sys.stdout
         # User arguments
         self.mode = ''
         self.versions_filename = ''
         self.requests_delay = 0
         self.commands_delay = 0
+        self.command_timeout = None
         self.projects_file = ''
         self.output = ''
-        # Projects to download
-        self.projects = list()
+        # Where the artifacts are saved in output (--layout)
+        self.layout = None
+        self.proxy = None
+        self.dependency_cache = None
+        # Extraction of the downloaded artifacts (--extract)
+        self.extractor = None
+        # Plans
+        self.plan_path = None
+        self.execute_plan_path = None
+        self.jobs = 4
+        self.order = 'size'
+        self.bandwidth = DEFAULT_BANDWIDTH
+        # Metrics exports
+        self.metrics_writer = None
+        self.progress = None
+        # Projects to download: the frontier of projects and dependencies,
+        # which is refilled in chunks from the projects file.
+        self.projects = Frontier()
+        self.pending = iter(())
         # Versions file
-        self.versions = dict()
-        self.p_names = dict()
+        self.versions = VersionStore()
+        self.p_names = VersionStore()
         # Set of tuples that contain pairs of project, version that we already
         # tried to download. If unspecified provided as a version,
         # then the package manager handles which version to download.
-        self.d_projects = set()
-        # Execution
+        self.d_projects = HashedSet()
+        # Shared membership file to use as d_projects (--membership)
+        self.membership_path = None
+        self.membership = None
+        # Artifacts added to the versions file by this run
+        self.artifacts = list()
+        self.plan = None
+        # Versions files kept in memory between commands (VersionsCache)
+        self.versions_cache = None
         self._set_package_manager()
         if not is_program(self.package_manager):
-            self.err('Error: cannot find {}'.format(self.package_manager))
-            sys.exit(1)
-        self._parse_args(args)
-        self.read_versions_file()
-        self._initialize_d_projects()
-        self._execute()
+            raise ToolNotFoundError('cannot find {}'.format(
+                self.package_manager))
+        try:
+            self._parse_args(args)
+        except BaseException:
+            # Release what the valid arguments opened
+            self.close()
+            raise
+
+    def run(self):
+        """Download the projects, or save or execute a plan.
+
+        A command runs once; its resources are closed at the end.
+
+        Returns:
+            result (CrawlResult)
+
+        """
+        try:
+            self.read_versions_file()
+            self._initialize_d_projects()
+            if self.metrics_writer is not None:
+                self.metrics_writer.start()
+            if self.plan_path is not None:
+                self._plan()
+            elif self.execute_plan_path is not None:
+                self._execute_plan()
+            else:
+                self._execute()
+        finally:
+            self.close()
+        return CrawlResult(type(self).__name__.lower(), self.output,
+                           self.artifacts, self.versions, self.plan)
+
+    def close(self):
+        """Wait for the extractions, export the metrics, and release the
+        caches and the spill files.
+        """
+        if self.extractor is not None:
+            self.extractor.close()
+        if self.metrics_writer is not None:
+            self.metrics_writer.stop()
+        if self.dependency_cache is not None:
+            self.dependency_cache.close()
+        if self.layout is not None:
+            self.layout.close()
+        self.projects.close()
+        if self.membership is not None:
+            self.membership.close()
 
     @abstractmethod
     def _set_package_manager(self):
         """Make sure that the package manager is declared."""
 
+    def stage(self, stage):
+        """Context manager that measures a stage of the download process.
+
+        Args:
+            stage (str): e.g. download, timestamp, resolve
+
+        """
+        return timed(stage, ecosystem=type(self).__name__.lower())
+
     def err(self, error):
         """Method to log erros.
 
@@ -94,74 +228,137 @@ class Command(ABC):
         In PyPI, and Java projects ignore the self.p_names.
 
         """
-        path = os.getcwd() + '/' + self.output + '/' + self.versions_filename
-        if os.path.isfile(path):
-            with open(path, 'r') as f:
-                data = json.load(f)
-                self.versions = data['packages']
-                self.p_names = data['p_names']
+        path = os.path.join(self.output, self.versions_filename)
+        if self.versions_cache is not None:
+            self.versions, self.p_names = self.versions_cache.get(path)
+        elif os.path.isfile(path):
+            self.versions, self.p_names = read_versions(path)
 
     def write_versions_file(self):
         """Write the versions file.
 
         """
-        path = os.getcwd() + '/' + self.versions_filename
-        data = {'packages': self.versions, 'p_names': self.p_names}
-        with open(path, 'w') as f:
-            json.dump(data, f)
+        path = os.path.join(self.output, self.versions_filename)
+        with self.stage('versions'):
+            write_versions(path, self.versions, self.p_names)
+        if self.versions_cache is not None:
+            self.versions_cache.put(path, self.versions, self.p_names)
 
     def _initialize_d_projects(self):
         """Initialize d_projects set with the projects and versions from
-        versions file.
+        versions file, or map the membership file instead.
 
         """
-        for project, versions in self.versions.items():
-            for version, _ in versions.items():
-                self.d_projects.add(tuple([project, version]))
+        if self.membership_path is not None:
+            try:
+                self.membership = MembershipFile(self.membership_path)
+            except (OSError, ValueError) as e:
+                raise ConfigurationError(str(e))
+            self.d_projects = MembershipSet(self.membership,
+                                            type(self).__name__.lower())
+            return
+        for project in self._downloaded_pairs():
+            self.d_projects.add(project)
+
+    def _downloaded_pairs(self):
+        """Return the (project, version) pairs of d_projects."""
+        return self.versions.pairs()
 
     def _parse_args(self, args):
         """Parse user's arguments.
 
         """
-        self.mode = args.mode
+        self.mode = str(args.mode)
         if self.mode not in ('1', '2', '3'):
-            self.err('Error: Invalid mode (Valid modes: 1, 2, 3)')
-            sys.exit(1)
+            raise ConfigurationError('Invalid mode (Valid modes: 1, 2, 3)')
         self.mode = int(self.mode)
         self.projects_file = args.projects
         self.versions_filename = args.versions
-        self.output = args.output
+        self.output = os.path.abspath(args.output)
+        self.layout = open_layout(self.output,
+                                  getattr(args, 'layout', 'flat'))
         self.requests_delay = args.requests_delay
         self.commands_delay = args.commands_delay
+        self.command_timeout = getattr(args, 'command_timeout', None)
+        # The throttle is shared by the commands of the process, so what it
+        # learned of each host outlives this command.
+        get_throttle().configure(
+            max_concurrency=getattr(args, 'max_per_host', 16),
+            retries=getattr(args, 'max_retries', 3)
+        )
+        if getattr(args, 'proxy', None):
+            self.proxy = args.proxy.rstrip('/')
+        if getattr(args, 'plan', None):
+            self.plan_path = os.path.abspath(args.plan)
+        if getattr(args, 'execute_plan', None):
+            self.execute_plan_path = os.path.abspath(args.execute_plan)
+        if getattr(args, 'membership', None):
+            self.membership_path = os.path.abspath(args.membership)
+        if getattr(args, 'dependency_cache', None):
+            self.dependency_cache = DependencyCache(args.dependency_cache)
+        if getattr(args, 'extract', None):
+            self.extractor = Extractor(os.path.abspath(args.extract),
+                                       getattr(args, 'extract_jobs', None),
+                                       self.errors,
+                                       getattr(args, 'dedup', False))
+        self.projects = Frontier(
+            getattr(args, 'frontier_memory', DEFAULT_CAPACITY),
+            getattr(args, 'spill_dir', None) and
+            os.path.abspath(args.spill_dir)
+        )
+        self.jobs = getattr(args, 'jobs', self.jobs)
+        self.order = getattr(args, 'order', self.order)
+        if getattr(args, 'bandwidth', None):
+            self.bandwidth = args.bandwidth * 1024 * 1024
+        json_path = getattr(args, 'metrics', None)
+        prometheus_path = getattr(args, 'prometheus', None)
+        self.progress = ProgressReporter(type(self).__name__.lower(),
+                                         getattr(args, 'progress', 'none'),
+                                         getattr(args, 'progress_interval', 2))
+        if json_path or prometheus_path:
+            self.metrics_writer = MetricsWriter(
+                json_path and os.path.abspath(json_path),
+                prometheus_path and os.path.abspath(prometheus_path),
+                getattr(args, 'metrics_interval', 60)
+            )
         self._get_projects()
 
     def _get_projects(self):
-        """Parse the projects to download from projects_file.
+        """Prepare a lazy reader of the projects to download from
+        projects_file.
 
-        We parse the projects based on the specified mode.
+        We parse the projects based on the specified mode. Each project
+        is read once, even if it exists in many rows.
 
         """
         # Default projects
         if self.projects_file.endswith('.dat'):
+            from pkg_resources import resource_filename
             path = resource_filename('fastensource',
                                      'data/' + self.projects_file)
         else:
-            path = self.projects_file
-        with open(path, 'r') as f:
-            if self.mode == 1:
-                self.projects = [tuple([row[0], 'Unspecified'])
-                                 for row in csv.reader(f, delimiter=';')]
-            elif self.mode == 2:
-                self.projects = [tuple([row[0], row[1]])
-                                 for row in csv.reader(f, delimiter=';')]
-            elif self.mode == 3:
-                for row in csv.reader(f, delimiter=';'):
-                   self.projects.append(
-                       tuple([row[0].split(',')[0], row[0].split(',')[1]])
-                   )
-                   self.projects.append(
-                       tuple([row[1].split(',')[0], row[1].split(',')[1]])
-                   )
+            path = os.path.abspath(self.projects_file)
+        self.pending = read_projects(path, self.mode)
+
+    def _next_projects(self):
+        """Move the next chunk of the projects file to self.projects.
+
+        Returns:
+            chunk (list): the projects, empty at the end of the file
+
+        """
+        chunk = take(self.pending, CHUNK_SIZE)
+        # pop() takes them in the order of the file
+        self.projects.extend(reversed(chunk))
+        return chunk
+
+    def _count_pending(self):
+        """Return the projects left for the progress reports: the frontier,
+        and the rows of the projects file that were not read yet.
+        """
+        if self.progress.mode == 'none':
+            return len(self.projects)
+        return len(self.projects) + self.pending.unread_rows()
 
     def _find_name_version(self, project):
         """Find project name and version from a string that contains both of
@@ -192,14 +389,17 @@ class Command(ABC):
 
         """
 
-    def _find_downloaded_projects(self):
-        """Find the downloaded projects in the current directory.
+    def _find_downloaded_projects(self, directory=None):
+        """Find the downloaded projects in the output directory.
+
+        Args:
+            directory (str): another directory to look in
 
         Returns:
             projects (str): downloaded projects (e.g. Django-11.1)
 
         """
-        projects = os.listdir('.')
+        projects = os.listdir(directory or self.output)
         if self.versions_filename in projects:
             projects.remove(self.versions_filename)
         return projects
@@ -243,17 +443,29 @@ class Command(ABC):
             timestamps (list): List of projects versions release timestamps
 
         """
+        ecosystem = type(self).__name__.lower()
         for entry in zip(names, versions, timestamps):
-            # Check if project already exists
-            if entry[0] not in self.versions.keys():
-                self.versions[entry[0]] = {
-                    entry[1]: entry[2]
-                }
-            # Check if version already exists
-            elif entry[1] not in self.versions[entry[0]].keys():
-                self.versions[entry[0]][entry[1]] = entry[2]
+            # Skip versions that already exist
+            if self.versions.add(entry[0], entry[1], entry[2]):
+                metrics.incr('artifacts_total', ecosystem=ecosystem)
+                self.artifacts.append(entry)
         self.write_versions_file()
 
+    def _extract(self, name, version, path):
+        """Extract a downloaded artifact in the background, if --extract
+        was given.
+
+        Args:
+            name (str): project name
+            version (str): project version
+            path (str): archive or unpacked tree, relative to the output
+                directory
+
+        """
+        if self.extractor is not None:
+            self.extractor.submit(type(self).__name__.lower(), name, version,
+                                  os.path.join(self.output, path))
+
     @abstractmethod
     def _download(self, project, version):
         """Download project and handle its dependencies.
@@ -264,22 +476,150 @@ class Command(ABC):
 
         """
 
+    def _resolve(self, project, version):
+        """Resolve a project to the artifacts to download, from metadata
+        only (see --plan).
+
+        Args:
+            project (str): Project name
+            version (str): Project version or Unspecified
+
+        Returns:
+            nodes (list): of dicts with the arguments of Plan.add; their
+                depends are resolved next
+
+        """
+        raise NotImplementedError
+
+    def _fetch(self, node):
+        """Download the artifact of a plan node (see --execute-plan).
+
+        It runs in a worker thread, so it must not change the versions.
+
+        Args:
+            node (dict): a node of the plan
+
+        Returns:
+            result: anything that _record needs
+
+        """
+        raise NotImplementedError
+
+    def _record(self, node, result):
+        """Record a downloaded plan node in the versions file.
+
+        Args:
+            node (dict): a node of the plan
+            result: the return value of _fetch
+
+        """
+        with self.stage('timestamp'):
+            timestamp = self._find_version_timestamp(
+                node['project'], node['version'], delay=self.requests_delay
+            )
+        self._update_versions([node['project']], [node['version']],
+                              [timestamp])
+
+    def _plan(self):
+        """Resolve the closure of the chosen projects into a plan file.
+
+        Projects that already exist in the versions file are not planned.
+        Nothing is downloaded, so the summary of the plan can be used as a
+        dry run.
+
+        """
+        plan = Plan(type(self).__name__.lower())
+        seen = self.d_projects.copy()
+        processed = 0
+        while True:
+            if len(self.projects) == 0:
+                chunk = self._next_projects()
+                if len(chunk) == 0:
+                    break
+                plan.roots.extend(chunk)
+            project = self.projects.pop()
+            if project not in seen:
+                seen.add(project)
+                with self.stage('resolve'):
+                    nodes = self._resolve(project[0], project[1])
+                for node in nodes:
+                    key = (node['project'], node['version'])
+                    seen.add(key)
+                    if key in plan:
+                        continue
+                    node = plan.add(**node)
+                    self.mes('Plan {} {}'.format(*key))
+                    for dep in node['depends']:
+                        if dep not in seen:
+                            self.projects.append(dep)
+            processed += 1
+            self.progress.update(processed, self._count_pending())
+        self.progress.finish()
+        self.plan = plan
+        plan.save(self.plan_path)
+        self.mes('Saved plan to {}: {}'.format(
+            self.plan_path, plan.summary(self.jobs, self.bandwidth)))
+
+    def _execute_plan(self):
+        """Download the artifacts of a plan file in parallel.
+
+        The artifacts are downloaded by self.jobs threads in the chosen
+        order, and recorded in the versions file as they complete.
+
+        """
+        try:
+            plan = Plan.load(self.execute_plan_path)
+        except PlanError as e:
+            raise ConfigurationError(str(e))
+        ecosystem = type(self).__name__.lower()
+        if plan.ecosystem != ecosystem:
+            raise ConfigurationError('{} is a {} plan'.format(
+                self.execute_plan_path, plan.ecosystem))
+        self.plan = plan
+        self.mes('Plan: {}'.format(plan.summary(self.jobs, self.bandwidth)))
+        if not os.path.exists(self.output):
+            os.makedirs(self.output)
+        nodes = [node for node in plan.order(self.order)
+                 if (node['project'], node['version']) not in self.d_projects]
+        processed = 0
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {executor.submit(self._fetch, node): node
+                       for node in nodes}
+            for future in as_completed(futures):
+                node = futures[future]
+                key = (node['project'], node['version'])
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.err('Cannot download {} {}: {!r}'.format(*key, e))
+                    result = None
+                if result is not None:
+                    self._record(node, result)
+                    self.d_projects.add(key)
+                    self.mes('Successfully downloaded {} {}'.format(*key))
+                processed += 1
+                self.progress.update(processed, len(nodes) - processed)
+        self.progress.finish()
+
     def _execute(self):
         """Download the chosen projects.
 
         This will:
             - Create a dir to save the projects if does not exists.
-            - Change working directory to that directory.
             - Before trying to download a project check if already exists.
-            - The self.projects list will be updated by _download method.
+            - The self.projects list will be updated by _download method,
+              and refilled from the projects file when it is empty.
 
         """
         if not os.path.exists(self.output):
             os.makedirs(self.output)
-        os.chdir(self.output)
-        while len(self.projects) > 0:
+        processed = 0
+        while len(self.projects) > 0 or len(self._next_projects()) > 0:
             project = self.projects.pop()
             if project not in self.d_projects:
                 self._download(project[0], project[1])
                 self.d_projects.add(project)
                 self.mes('')
+            processed += 1
+            self.progress.update(processed, self._count_pending())
+        self.progress.finish()
@@ -0,0 +1,289 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Long-running worker that runs the crawls submitted by other programs.
+
+A job is a JSON object with the language, the mode, and the options of a
+crawl (see api.Config), e.g.
+
+    {"id": "django", "language": "python", "mode": 2,
+     "projects": "/data/jobs/django.csv", "output": "/data/pypi"}
+
+Relative paths are relative to the working directory of the daemon. Jobs
+are submitted:
+    - to a spool directory: write the job to <spool>/tmp/<name>.json, and
+      rename it to <spool>/new/<name>.json; the result is saved to
+      <spool>/done/<name>.json,
+    - or to a Unix socket: send one job per line, and read one result per
+      line.
+
+The jobs run one after the other in the same process, so the imported
+modules, the HTTP connections, the adaptive throttle (a job only changes
+its bounds), the release histories and poms (see helpers.memoize), and
+the versions files (see VersionsCache) stay warm between them. The run
+metrics are reset before each job, except the gauges (e.g. of the
+throttle), so the metrics exports and the progress of a job count only
+that job.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import socket
+import threading
+import traceback
+import socketserver
+from functools import partial
+from concurrent.futures import Future
+from fastensource.api import Config, crawl
+from fastensource.utils.helpers import Error, ConfigurationError
+from fastensource.utils.metrics import metrics
+from fastensource.utils.versions import VersionsCache
+
+SPOOL_DIRS = ('tmp', 'new', 'cur', 'done')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Runs the jobs of a connection, one per line, in order."""
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line.decode())
+            except ValueError as e:
+                result = dict(id=None, status='error',
+                              error='Invalid job: {}'.format(e))
+            else:
+                result = self.server.worker.submit(job).result()
+            self.wfile.write((json.dumps(result) + '\n').encode())
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemon:
+    """Run the jobs of a spool directory or a Unix socket until stopped.
+
+    Args:
+        args: spool, socket, and poll options of the CLI
+        messages (file): where to log messages
+        errors (file): where to log errors
+
+    Raises:
+        ConfigurationError: If there is neither a spool nor a socket, or
+            another daemon listens on the socket.
+
+    """
+    def __init__(self, args, messages=None, errors=None):
+        self.messages = messages or sys.stdout
+        self.errors = errors or sys.stderr
+        self.spool = args.spool and os.path.abspath(args.spool)
+        self.socket_path = args.socket and os.path.abspath(args.socket)
+        if not self.spool and not self.socket_path:
+            raise ConfigurationError('daemon needs --spool or --socket')
+        self.poll = args.poll
+        self.versions_cache = VersionsCache()
+        self.completed = 0
+        # Jobs of each status (the counters of metrics are reset by jobs)
+        self.jobs = dict()
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._server = None
+        if self.socket_path:
+            self._bind()
+
+    def mes(self, message):
+        self.messages.write(message + '\n')
+        self.messages.flush()
+
+    def _bind(self):
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                # Left by a daemon that was killed
+                os.remove(self.socket_path)
+            else:
+                raise ConfigurationError('Another daemon listens on {}'
+                                         .format(self.socket_path))
+            finally:
+                probe.close()
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.worker = self
+        os.chmod(self.socket_path, 0o600)
+
+    def submit(self, job):
+        """Queue a job.
+
+        Returns:
+            future (Future): its result
+        """
+        future = Future()
+        self._queue.put((job, future.set_result))
+        return future
+
+    def run_job(self, job):
+        """Run a job and return its result.
+
+        Returns:
+            result (dict): id, status (ok or error), error, output,
+                artifacts (name, version, timestamp lists), and seconds
+
+        """
+        metrics.reset(keep_gauges=True)
+        start = time.monotonic()
+        result = dict(id=job.get('id') if isinstance(job, dict) else None)
+        try:
+            if not isinstance(job, dict):
+                raise ConfigurationError('A job must be a JSON object')
+            options = dict(job)
+            options.pop('id', None)
+            language = options.pop('language', None)
+            mode = options.pop('mode', 1)
+            options.setdefault('progress', 'none')
+            crawled = crawl(Config(language, mode, **options), self.messages,
+                            self.errors, self.versions_cache)
+            result.update(status='ok', output=crawled.output,
+                          artifacts=[list(a) for a in crawled.artifacts])
+        except Exception as e:
+            if not isinstance(e, Error):
+                traceback.print_exc(file=self.errors)
+            # The versions in memory may not have been saved.
+            self.versions_cache.clear()
+            result.update(status='error', error=str(e) or type(e).__name__)
+        result['seconds'] = round(time.monotonic() - start, 3)
+        self.jobs[result['status']] = self.jobs.get(result['status'], 0) + 1
+        metrics.set('daemon_jobs', self.jobs[result['status']],
+                    status=result['status'])
+        self.completed += 1
+        self.mes('Job {}: {} in {}s'.format(result['id'], result['status'],
+                                            result['seconds']))
+        return result
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job, done = item
+            done(self.run_job(job))
+
+    def _spool_path(self, directory, name):
+        return os.path.join(self.spool, directory, name)
+
+    def _scan(self):
+        """Claim the new jobs of the spool, oldest first."""
+        new = os.path.join(self.spool, 'new')
+        names = list()
+        for entry in os.scandir(new):
+            if entry.name.endswith('.json'):
+                try:
+                    names.append((entry.stat().st_mtime, entry.name))
+                except FileNotFoundError:
+                    continue
+        for _, name in sorted(names):
+            cur = self._spool_path('cur', name)
+            try:
+                os.rename(os.path.join(new, name), cur)
+            except FileNotFoundError:
+                # Claimed by another daemon
+                continue
+            try:
+                with open(cur, 'r') as f:
+                    job = json.load(f)
+            except ValueError as e:
+                self._spool_done(name, dict(id=name[:-len('.json')],
+                                            status='error',
+                                            error='Invalid job: {}'.format(e)))
+                continue
+            if isinstance(job, dict):
+                job.setdefault('id', name[:-len('.json')])
+            self._queue.put((job, partial(self._spool_done, name)))
+
+    def _spool_done(self, name, result):
+        if result.get('status') == 'cancelled':
+            os.rename(self._spool_path('cur', name),
+                      self._spool_path('new', name))
+            return
+        tmp = self._spool_path('tmp', '.' + name)
+        with open(tmp, 'w') as f:
+            json.dump(result, f)
+        os.rename(tmp, self._spool_path('done', name))
+        os.remove(self._spool_path('cur', name))
+
+    def run(self):
+        """Run the jobs until interrupted, or stopped with SIGTERM."""
+        if self.spool:
+            for directory in SPOOL_DIRS:
+                os.makedirs(os.path.join(self.spool, directory),
+                            exist_ok=True)
+            # Jobs that were running when a daemon died
+            for name in os.listdir(os.path.join(self.spool, 'cur')):
+                os.rename(self._spool_path('cur', name),
+                          self._spool_path('new', name))
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        worker = threading.Thread(target=self._work,
+                                  name='fastensource-daemon')
+        worker.start()
+        if self._server is not None:
+            threading.Thread(target=self._server.serve_forever,
+                             daemon=True).start()
+        self.mes('Waiting for jobs in {}'.format(
+            ' and '.join(p for p in (self.spool, self.socket_path) if p)))
+        try:
+            while not self._stopping.is_set():
+                if self.spool:
+                    self._scan()
+                self._stopping.wait(self.poll)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._shutdown(worker)
+
+    def stop(self):
+        """Stop after the running job; the queued jobs are cancelled."""
+        self._stopping.set()
+
+    def _shutdown(self, worker):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            os.remove(self.socket_path)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job, done = item
+            done(dict(id=job.get('id') if isinstance(job, dict) else None,
+                      status='cancelled'))
+        self._queue.put(None)
+        worker.join()
+        self.mes('Stopped after {} jobs'.format(self.completed))
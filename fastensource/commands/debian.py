@@ -21,6 +21,7 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import io
 import os
 import tempfile
 import shutil
@@ -37,35 +38,35 @@ class Debian(Command):
        the sources of a package, apt will detect the sources that produce
        this package, and it will download the sources. For instance,
        in the case of libc6 it will download the glibc source. Thus,
-       we need to override the _initialize_d_projects method.
+       we need to override the _downloaded_pairs method.
     """
-    def __init__(self, args):
-        self.cmd = 'apt-get source '
-        super(Debian, self).__init__(args)
+    def __init__(self, args, messages=None, errors=None):
+        self.cmd = ['apt-get', 'source']
+        super(Debian, self).__init__(args, messages, errors)
 
     def _set_package_manager(self):
         self.package_manager = 'apt-get'
 
-    def _initialize_d_projects(self):
+    def _parse_args(self, args):
+        super(Debian, self)._parse_args(args)
+        if self.proxy:
+            # apt uses the proxy for the http:// sources of sources.list
+            self.cmd += ['-o', 'Acquire::http::Proxy=' + self.proxy]
+
+    def _downloaded_pairs(self):
         """In d_projects set we need the values from p_names and not
         from versions dict because in the versions are the downloaded sources
         info and not the info of the projects.
 
         """
-        for project, versions in self.p_names.items():
-            for version in versions:
-                self.d_projects.add(tuple([project, version]))
+        return self.p_names.pairs()
 
     def _update_p_names(self, project, version):
         """Update the p_names in versions file.
 
         """
-        if project in self.p_names.keys() and \
-           version not in self.p_names[project]:
-            self.p_names[project].append(version)
+        if self.p_names.add(project, version):
             self.write_versions_file()
-        elif project not in self.p_names.keys():
-            self.p_names[project] = [version]
 
     def _find_name_version(self, project):
         return find_name_version_debian(project)
@@ -90,40 +91,130 @@ class Debian(Command):
 
         """
         if version == 'Unspecified':
-            cmd = self.cmd + ' ' + project
+            cmd = self.cmd + [project]
         else:
-            cmd = self.cmd + ' ' + project + '=' + version
+            cmd = self.cmd + [project + '=' + version]
             # Update the p_names only if a specific version is given.
             self._update_p_names(project, version)
-        prevdir = os.getcwd()
         with tempfile.TemporaryDirectory() as dirpath:
-            os.chdir(dirpath)
             # Step 1
-            exit_code = execute_command(cmd, self.messages, self.errors)
+            with self.stage('download'):
+                exit_code = execute_command(cmd, self.messages, self.errors,
+                                            timeout=self.command_timeout,
+                                            cwd=dirpath)
             if exit_code == 0:
-                project_dir_name = next(os.walk('.'))[1][0]
-                # Step 2
-                name, version = self._find_name_version(project_dir_name)
-                # Check if project-version already exists
-                if name not in self.versions.keys() or\
-                   version not in self.versions[name].keys():
-                    timestamp = self._find_version_timestamp(name, version,
-                                                            delay=0)
-                    # Step 3
-                    os.chdir(prevdir)
-                    self._update_versions([name], [version], [timestamp])
-                    os.chdir(dirpath)
-                # Move to parent directory
-                project_dir_new_path = prevdir + '/' + project_dir_name
-                if not os.path.isdir(project_dir_new_path):
-                    os.makedirs(project_dir_new_path)
-                    files = os.listdir('.')
-                    for f in files:
-                        shutil.move(f, project_dir_new_path)
+                # Steps 2, 3
+                name, version = self._store_source(dirpath)
                 # Step 4
-                dependencies = find_dependencies(name, version)
+                with self.stage('resolve'):
+                    dependencies = find_dependencies(
+                        name, version, cache=self.dependency_cache
+                    )
                 # Add dependencies to projects
                 for dep in dependencies:
                     if dep not in self.d_projects:
                         self.projects.append(dep)
-        os.chdir(prevdir)
+
+    def _store_source(self, dirpath):
+        """Record the source that apt-get downloaded in dirpath in the
+        versions file, move it to the output directory, and extract
+        its unpacked tree (see --extract).
+
+        Args:
+            dirpath (str): the directory where apt-get source was run
+
+        Returns:
+            name (str): source name (e.g. glibc)
+            version (str): source version (e.g. 2.24)
+
+        """
+        project_dir_name = next(os.walk(dirpath))[1][0]
+        name, version = self._find_name_version(project_dir_name)
+        # Check if project-version already exists
+        if name not in self.versions.keys() or\
+           version not in self.versions[name].keys():
+            with self.stage('timestamp'):
+                timestamp = self._find_version_timestamp(name, version,
+                                                         delay=0)
+            self._update_versions([name], [version], [timestamp])
+        # Move to the output directory
+        project_dir_new_path = os.path.join(
+            self.layout.directory(name, version), project_dir_name)
+        if not os.path.isdir(project_dir_new_path):
+            with self.stage('move'):
+                os.makedirs(project_dir_new_path)
+                for f in os.listdir(dirpath):
+                    shutil.move(os.path.join(dirpath, f),
+                                project_dir_new_path)
+        self.layout.add(name, version, project_dir_new_path)
+        self._extract(name, version,
+                      os.path.join(project_dir_new_path, project_dir_name))
+        return name, version
+
+    def _resolve(self, project, version):
+        """Resolve a package to its source files with `apt-get source
+        --print-uris', and its dependencies with UDD.
+        """
+        if version == 'Unspecified':
+            spec = project
+        else:
+            spec = project + '=' + version
+        uris = io.StringIO()
+        exit_code = execute_command(self.cmd + ['--print-uris', spec], uris,
+                                    self.errors,
+                                    timeout=self.command_timeout)
+        files = parse_print_uris(uris.getvalue())
+        dsc = [f for f in files if f[1].endswith('.dsc')]
+        if exit_code != 0 or len(dsc) == 0:
+            self.err('Cannot resolve {}'.format(spec))
+            return []
+        # e.g. glibc_2.24-11+deb9u4.dsc
+        source, source_version = dsc[0][1][:-len('.dsc')].split('_', 1)
+        dependencies = find_dependencies(source, source_version,
+                                         cache=self.dependency_cache)
+        return [dict(project=source, version=source_version,
+                     size=sum(f[2] for f in files),
+                     urls=[f[0] for f in files], depends=dependencies,
+                     package=project, spec=spec)]
+
+    def _fetch(self, node):
+        dirpath = tempfile.mkdtemp(prefix='fastensource-')
+        with self.stage('download'):
+            exit_code = execute_command(self.cmd + [node['spec']],
+                                        self.messages, self.errors,
+                                        timeout=self.command_timeout,
+                                        cwd=dirpath)
+        if exit_code != 0:
+            shutil.rmtree(dirpath, ignore_errors=True)
+            return None
+        return dirpath
+
+    def _record(self, node, result):
+        try:
+            self._store_source(result)
+        finally:
+            shutil.rmtree(result, ignore_errors=True)
+        if '=' in node['spec']:
+            self._update_p_names(node['package'], node['spec'].split('=')[1])
+
+
+def parse_print_uris(output):
+    """Parse the output of `apt-get source --print-uris'.
+
+    Args:
+        output (str): e.g. 'http://deb.debian.org/.../glibc_2.24-11.dsc'
+            glibc_2.24-11.dsc 9144 SHA256:...
+
+    Returns:
+        files (list): of tuples with url, filename, size
+
+    """
+    files = list()
+    for line in output.splitlines():
+        if not line.startswith("'"):
+            continue
+        parts = line.split()
+        if len(parts) < 3 or not parts[2].isdigit():
+            continue
+        files.append((parts[0].strip("'"), parts[1], int(parts[2])))
+    return files
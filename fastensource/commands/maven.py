@@ -21,25 +21,72 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import os
 from fastensource.commands.command import Command
-from fastensource.utils.scrappers import find_version_timestamp_maven
-from fastensource.utils.maven import find_last_version, find_dependencies,\
-        download_maven_jar, get_pom_xml
+from fastensource.utils.scrappers import find_version_timestamp_maven,\
+        MVNREPOSITORY_URL
+from fastensource.utils.maven import find_last_version,\
+        find_project_dependencies, download_maven_jar, get_url
+from fastensource.utils.helpers import content_length
+from fastensource.utils.mavenindex import MavenIndex
+from fastensource.utils.mirrors import MirrorSet, MAVEN_MIRRORS
 
 class Maven(Command):
-    def __init__(self, args):
-        # url to download projects
-        self.url = 'http://central.maven.org/maven2/'
+    def __init__(self, args, messages=None, errors=None):
+        # mirrors to download projects (see _parse_args)
+        self.url = None
         # url to find versions
-        self.url_v = 'https://mvnrepository.com/artifact/'
-        super(Maven, self).__init__(args)
+        self.url_v = MVNREPOSITORY_URL + 'artifact/'
+        # Local index of versions and timestamps
+        self.index = None
+        super(Maven, self).__init__(args, messages, errors)
 
     def _set_package_manager(self):
         self.package_manager = 'mvn'
 
+    def _parse_args(self, args):
+        if getattr(args, 'maven_index', None):
+            self.index = MavenIndex(args.maven_index)
+        super(Maven, self)._parse_args(args)
+        urls = getattr(args, 'mirror', None) or MAVEN_MIRRORS
+        if self.proxy:
+            urls = [self.proxy + '/maven2/']
+        self.url = MirrorSet(urls, hedge=getattr(args, 'hedge', False))
+
+    def close(self):
+        super(Maven, self).close()
+        if self.url is not None:
+            self.url.close()
+        if self.index is not None:
+            self.index.close()
+
+    def _find_last_version(self, project):
+        """Find the last version of a project.
+
+        Use the local index if there is one, and make a request only for
+        projects that are not in the index.
+        """
+        if self.index is not None:
+            version = self.index.last_version(project)
+            if version:
+                return version
+        return find_last_version(self.url_v, project,
+                                 delay=self.requests_delay)
+
     def _find_version_timestamp(self, project, version, delay):
+        if self.index is not None:
+            timestamp = self.index.version_timestamp(project, version)
+            if timestamp:
+                return timestamp
         return find_version_timestamp_maven(project, version, delay)
 
+    def _find_dependencies(self, project, version):
+        return find_project_dependencies(self.url, project, version,
+                                         self.requests_delay,
+                                         timeout=self.command_timeout,
+                                         cache=self.dependency_cache,
+                                         commands_delay=self.commands_delay)
+
     def _download(self, project, version):
         """Download project and add its dependencies to self.projects.
 
@@ -56,23 +103,30 @@ class Maven(Command):
         """
         # Step 1
         if version == 'Unspecified':
-            version = find_last_version(self.url_v, project,
-                                        delay=self.requests_delay)
+            with self.stage('version'):
+                version = self._find_last_version(project)
             if version == 'Not Found':
                 self.err('No version found for {}'.format(project))
                 return
         if tuple([project, version]) in self.d_projects:
             return
         # Step 2
-        download_maven_jar(self.url, project, version,
-                           delay=self.requests_delay)
+        directory = self.layout.directory(project, version)
+        with self.stage('download'):
+            filename = download_maven_jar(self.url, project, version,
+                                          delay=self.requests_delay,
+                                          directory=directory)
+        path = self.layout.add(project, version,
+                               os.path.join(directory, filename))
+        self._extract(project, version, path)
         # Step 3
-        timestamp = self._find_version_timestamp(project, version,
-                                                 delay=self.requests_delay)
+        with self.stage('timestamp'):
+            timestamp = self._find_version_timestamp(
+                project, version, delay=self.requests_delay
+            )
         # Step 4
-        pom = get_pom_xml(self.url, project, version,
-                          delay=self.requests_delay)
-        dependencies = find_dependencies(pom, self.commands_delay)
+        with self.stage('resolve'):
+            dependencies = self._find_dependencies(project, version)
         # Step 5
         for dep in dependencies:
             if dep not in self.d_projects:
@@ -81,3 +135,33 @@ class Maven(Command):
         # Step 6
         self._update_versions([project], [version], [timestamp])
         self.mes('Successfully downloaded {} {}'.format(project, version))
+
+    def _resolve(self, project, version):
+        """Resolve a project to its jar and its dependencies from its pom,
+        without downloading the jar.
+        """
+        if version == 'Unspecified':
+            with self.stage('version'):
+                version = self._find_last_version(project)
+            if version in ('Not Found', 'Error'):
+                self.err('No version found for {}'.format(project))
+                return []
+        dependencies = self._find_dependencies(project, version)
+        url = self.url.url(get_url(project, version, 'jar'))
+        return [dict(project=project, version=version,
+                     size=content_length(url), urls=[url],
+                     depends=dependencies)]
+
+    def _fetch(self, node):
+        directory = self.layout.directory(node['project'], node['version'])
+        with self.stage('download'):
+            filename = download_maven_jar(self.url, node['project'],
+                                          node['version'],
+                                          delay=self.requests_delay,
+                                          directory=directory)
+        return os.path.join(directory, filename)
+
+    def _record(self, node, result):
+        path = self.layout.add(node['project'], node['version'], result)
+        super(Maven, self)._record(node, result)
+        self._extract(node['project'], node['version'], path)
@@ -21,20 +21,100 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import os
+import re
+import json
+import shutil
+import tempfile
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 from fastensource.commands.command import Command
 from fastensource.utils.scrappers import find_version_timestamp_pypi
 from fastensource.utils.helpers import execute_command,\
-        find_name_version_pypi, remove_duplicates
+        find_name_version_pypi, remove_duplicates, content_length,\
+        download_file, ConnectionError, ConfigurationError
+from fastensource.utils.feeds import normalize_pypi_name
+from fastensource.utils.metrics import metrics
+from fastensource.utils.mirrors import MirrorSet
 
 
 class Pypi(Command):
-    def __init__(self, args):
-        self.cmd = 'pip download --no-binary=:all: '
-        super(Pypi, self).__init__(args)
+    def __init__(self, args, messages=None, errors=None):
+        self.cmd = ['pip', 'download', '--no-binary=:all:']
+        # Indexes to download from; pip's configuration if None
+        self.indexes = None
+        # pip, metadata (with pip as fallback), or metadata-only
+        self.resolver_mode = 'pip'
+        self.resolver = None
+        super(Pypi, self).__init__(args, messages, errors)
 
     def _set_package_manager(self):
         self.package_manager = 'pip'
 
+    def _parse_args(self, args):
+        super(Pypi, self)._parse_args(args)
+        urls = getattr(args, 'mirror', None)
+        if self.proxy:
+            urls = [self.proxy + '/simple/']
+        if urls:
+            self.indexes = MirrorSet(urls)
+            if len(urls) > 1:
+                # Measure the indexes with a small project page.
+                self.indexes.probe('pip/')
+        self.resolver_mode = getattr(args, 'resolver', 'pip')
+        if self.resolver_mode != 'pip':
+            try:
+                from fastensource.utils.pypiresolver import MetadataResolver,\
+                        DEFAULT_INDEX
+            except ImportError:
+                raise ConfigurationError(
+                    '--resolver {} needs the packaging library'
+                    .format(self.resolver_mode)
+                )
+            if self.indexes is not None:
+                index = self.indexes.ranked()[0]
+            else:
+                index = os.environ.get('PIP_INDEX_URL', DEFAULT_INDEX)
+            self.resolver = MetadataResolver(index, jobs=self.jobs)
+
+    def close(self):
+        super(Pypi, self).close()
+        if self.resolver is not None:
+            self.resolver.close()
+        if self.indexes is not None:
+            self.indexes.close()
+
+    def _index_args(self, index):
+        args = ['--index-url', index]
+        if index.startswith('http://'):
+            args += ['--trusted-host', urlsplit(index).hostname]
+        return args
+
+    def _pip(self, cmd, messages=None, cwd=None):
+        """Run a pip command with the best index, and fail over to the
+        next indexes if it fails.
+
+        Returns:
+            exit_code (int)
+
+        """
+        messages = messages or self.messages
+        if self.indexes is None:
+            return execute_command(cmd, messages, self.errors,
+                                   timeout=self.command_timeout, cwd=cwd)
+        exit_code = 1
+        for i, index in enumerate(self.indexes.ranked()):
+            if i > 0:
+                metrics.incr('mirror_failovers_total')
+            exit_code = execute_command(cmd + self._index_args(index),
+                                        messages, self.errors,
+                                        timeout=self.command_timeout,
+                                        cwd=cwd)
+            self.indexes.record(index, failed=exit_code != 0)
+            if exit_code == 0:
+                break
+        return exit_code
+
     def _find_name_version(self, project):
         return find_name_version_pypi(project)
 
@@ -54,25 +134,169 @@ class Pypi(Command):
         - PyPI handles the dependencies
         - PyPI automatically checks if a project has already been downloaded.
 
+        With --resolver metadata, the dependencies are resolved from the
+        index metadata and the sdists are downloaded concurrently; pip is
+        used only if that fails.
+
         Args:
             project (str): Project name
             version (str): Project version
 
         """
         # Step 1
+        if self.resolver is not None:
+            distributions = self._resolve_metadata(project, version)
+            if distributions is not None:
+                with self.stage('download'):
+                    try:
+                        filenames = self.resolver.fetch(
+                            distributions, self._sdist_directory)
+                    except ConnectionError:
+                        self.err('Cannot download {}'.format(project))
+                        return
+                self._record_downloads([
+                    os.path.join(self._sdist_directory(f), f)
+                    for f in filenames
+                ])
+                return
+            if self.resolver_mode == 'metadata-only':
+                return
+            metrics.incr('pypi_pip_fallbacks_total')
         if version == 'Unspecified':
-            cmd = self.cmd + ' ' + project
+            cmd = self.cmd + [project]
         else:
-            cmd = self.cmd + ' ' + project + '==' + version
-        execute_command(cmd, self.messages, self.errors)
-        # Step 2
-        projects = self._find_downloaded_projects()
+            cmd = self.cmd + [project + '==' + version]
+        # pip skips the sdists that are in its directory already. In the
+        # sharded layout they are not, so it downloads to a staging
+        # directory, and only the new sdists are kept.
+        directory = self.output
+        if self.layout.name == 'sharded':
+            directory = tempfile.mkdtemp(prefix='.staging-', dir=self.output)
+        try:
+            with self.stage('download'):
+                self._pip(cmd, cwd=directory)
+            # Step 2
+            self._record_downloads([
+                os.path.join(directory, f)
+                for f in self._find_downloaded_projects(directory)
+            ])
+        finally:
+            if directory != self.output:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _sdist_directory(self, filename):
+        """Return the directory of an sdist in the layout."""
+        return self.layout.directory(*find_name_version_pypi(filename))
+
+    def _resolve_metadata(self, project, version):
+        """Resolve a project with the metadata resolver.
+
+        Returns:
+            distributions (list): or None if it cannot be resolved
+
+        """
+        from fastensource.utils.pypiresolver import ResolutionError
+        with self.stage('resolve'):
+            try:
+                return self.resolver.resolve(
+                    project, None if version == 'Unspecified' else version
+                )
+            except (ResolutionError, ConnectionError) as e:
+                self.err('Cannot resolve {} from metadata: {}'.format(
+                    project, e))
+                return None
+
+    def _record_downloads(self, paths):
+        """Record the new sdists in the versions file, move them to the
+        layout, and extract them.
+
+        Args:
+            paths (list): absolute paths of the downloaded sdists
+
+        """
         # Checks if any projects has downloaded.
-        if len(projects) == 0:
+        if len(paths) == 0:
             return
-        names, versions = self._find_projects_names_versions(projects)
+        names, versions = self._find_projects_names_versions(
+            [os.path.basename(path) for path in paths])
+        files = dict(zip(zip(names, versions), paths))
         # Remove the versions of projects that already exists in versions file.
         names, versions = remove_duplicates(names, versions, self.versions)
-        timestamps = self._find_timestamps(names, versions)
+        with self.stage('timestamp'):
+            timestamps = self._find_timestamps(names, versions)
+        for name, version in zip(names, versions):
+            files[(name, version)] = self.layout.add(name, version,
+                                                     files[(name, version)])
         # Step 3
         self._update_versions(names, versions, timestamps)
+        for name, version in zip(names, versions):
+            self._extract(name, version, files[(name, version)])
+
+    def _resolve(self, project, version):
+        """Resolve a project and its dependencies with pip's resolver,
+        or the metadata resolver.
+
+        `pip install --dry-run --report' returns the whole closure, so all
+        the nodes come from the first call and their dependencies are
+        already in the plan.
+        """
+        if self.resolver is not None:
+            distributions = self._resolve_metadata(project, version)
+            if distributions is not None:
+                urls = [d.url for d in distributions]
+                with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                    sizes = list(executor.map(content_length, urls))
+                return [dict(project=d.name, version=d.version, size=size,
+                             urls=[d.url], depends=d.depends)
+                        for d, size in zip(distributions, sizes)]
+            if self.resolver_mode == 'metadata-only':
+                return []
+            metrics.incr('pypi_pip_fallbacks_total')
+        if version == 'Unspecified':
+            spec = project
+        else:
+            spec = project + '==' + version
+        with tempfile.TemporaryDirectory(prefix='fastensource-') as temp:
+            report = os.path.join(temp, 'report.json')
+            cmd = ['pip', 'install', '--dry-run', '--ignore-installed',
+                   '--quiet', '--report', report] + self.cmd[2:] + [spec]
+            exit_code = self._pip(cmd, cwd=temp)
+            if exit_code != 0 or not os.path.isfile(report):
+                self.err('Cannot resolve {}'.format(spec))
+                return []
+            with open(report, 'r') as f:
+                items = json.load(f).get('install', [])
+        resolved = {normalize_pypi_name(item['metadata']['name']):
+                    (item['metadata']['name'], item['metadata']['version'])
+                    for item in items}
+        urls = [item['download_info']['url'] for item in items]
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            sizes = list(executor.map(content_length, urls))
+        nodes = list()
+        for item, url, size in zip(items, urls, sizes):
+            depends = list()
+            for requirement in item['metadata'].get('requires_dist', []):
+                name = re.match(r'[A-Za-z0-9._-]*', requirement).group()
+                dep = resolved.get(normalize_pypi_name(name))
+                if dep is not None and dep not in depends:
+                    depends.append(dep)
+            name, version = resolved[normalize_pypi_name(
+                item['metadata']['name'])]
+            nodes.append(dict(project=name, version=version, size=size,
+                              urls=[url], depends=depends))
+        return nodes
+
+    def _fetch(self, node):
+        url = node['urls'][0]
+        path = os.path.join(
+            self.layout.directory(node['project'], node['version']),
+            os.path.basename(urlsplit(url).path)
+        )
+        with self.stage('download'):
+            download_file(url, path)
+        return path
+
+    def _record(self, node, result):
+        path = self.layout.add(node['project'], node['version'], result)
+        super(Pypi, self)._record(node, result)
+        self._extract(node['project'], node['version'], path)
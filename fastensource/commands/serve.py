@@ -0,0 +1,49 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import sys
+import json
+from fastensource.utils.proxy import CachingProxy, make_server
+
+
+class Serve:
+    """Run the local caching proxy until interrupted.
+
+    Point the download commands to it with the --proxy option.
+    """
+    def __init__(self, args):
+        self.proxy = CachingProxy(args.cache, index_ttl=args.index_ttl)
+        self.server = make_server(self.proxy, args.host, args.port)
+        self.address = '{}:{}'.format(args.host, args.port)
+
+    def run(self):
+        sys.stdout.write('Serving {} on http://{}/\n'.format(
+            self.proxy.cache_dir, self.address))
+        sys.stdout.flush()
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            sys.stdout.write(json.dumps(self.proxy.stats.report()) + '\n')
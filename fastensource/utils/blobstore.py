@@ -0,0 +1,169 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Content-addressed storage of source files.
+
+Consecutive versions of a project share most of their files. A BlobStore
+keeps each unique file once, named by its SHA-256, under `<root>/.blobs/',
+and the tree of each version is a view of hard links to the blobs. The
+manifest of a view (`<root>/.manifests/<view>.json') lists its files with
+their hashes, so views can be materialized again.
+
+Blobs are read-only, because all the views that contain a file share it.
+Executable and plain files are different blobs.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+BLOBS = '.blobs'
+MANIFESTS = '.manifests'
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+
+def link_or_copy(src, dst):
+    """Hard link src to dst, or copy it across file systems (or when src
+    has too many links).
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class BlobStore:
+    """Files stored once by their hash.
+
+    It can be used by many processes at once.
+
+    Args:
+        root (str): directory of the blobs, the manifests, and the views
+
+    """
+    def __init__(self, root):
+        self.root = root
+        self.blobs = os.path.join(root, BLOBS)
+        self.manifests = os.path.join(root, MANIFESTS)
+
+    def blob_path(self, digest, mode=0o644):
+        name = digest + ('x' if mode & 0o111 else '')
+        return os.path.join(self.blobs, digest[:2], name)
+
+    def put(self, src, mode=0o644):
+        """Store the contents of a binary file object.
+
+        Args:
+            src (file): the contents, read to the end
+            mode (int): permissions of the file; only the executable bits
+                are kept
+
+        Returns:
+            digest (str): SHA-256 of the contents
+            size (int): bytes of the contents
+            new (bool): whether the blob was not stored already
+
+        """
+        tmpdir = os.path.join(self.blobs, 'tmp')
+        os.makedirs(tmpdir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=tmpdir)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = digest.hexdigest()
+            path = self.blob_path(digest, mode)
+            if os.path.exists(path):
+                return digest, size, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(tmp, 0o555 if mode & 0o111 else 0o444)
+            try:
+                # Unlike rename, link fails if another process stored the
+                # blob meanwhile, so existing views keep sharing it.
+                os.link(tmp, path)
+            except FileExistsError:
+                return digest, size, False
+            return digest, size, True
+        finally:
+            os.remove(tmp)
+
+    def link(self, digest, mode, target):
+        """Add the blob to a view as target."""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        link_or_copy(self.blob_path(digest, mode), target)
+
+    def manifest_path(self, view):
+        """Return the manifest of the view in the directory view."""
+        relpath = os.path.relpath(view, self.root)
+        return os.path.join(self.manifests, relpath + '.json')
+
+    def write_manifest(self, view, files, links=None):
+        """Save the manifest of a view.
+
+        Args:
+            view (str): directory of the view
+            files (dict): relative paths to [digest, size, mode]
+            links (dict): relative paths of symbolic links to their targets
+
+        """
+        path = self.manifest_path(view)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        manifest = {'version': MANIFEST_VERSION, 'files': files,
+                    'links': links or {}}
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, sort_keys=True)
+        os.replace(tmp, path)
+
+    def read_manifest(self, view):
+        with open(self.manifest_path(view), 'r') as f:
+            return json.load(f)
+
+    def materialize(self, view):
+        """Create (again) the view from its manifest."""
+        manifest = self.read_manifest(view)
+        tmp = tempfile.mkdtemp(prefix='.view-',
+                               dir=os.path.dirname(view))
+        try:
+            for relpath, (digest, _, mode) in manifest['files'].items():
+                self.link(digest, mode, os.path.join(tmp, relpath))
+            for relpath, target in manifest['links'].items():
+                path = os.path.join(tmp, relpath)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.symlink(target, path)
+            os.chmod(tmp, 0o755)
+            if os.path.isdir(view):
+                shutil.rmtree(view)
+            os.rename(tmp, view)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
@@ -0,0 +1,119 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Persistent cache of resolved dependencies.
+
+The dependencies of a released artifact never change, so they are saved in
+a SQLite database keyed by (ecosystem, project, version) and reused by later
+runs instead of running mvn or querying UDD again. Each entry records the
+version of the resolver that produced it (e.g. maven.RESOLVER_VERSION);
+entries of another resolver version are misses, and are replaced when the
+artifact is resolved again.
+"""
+import json
+import sqlite3
+import threading
+from fastensource.utils.metrics import metrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dependencies (
+    ecosystem TEXT NOT NULL,
+    project TEXT NOT NULL,
+    version TEXT NOT NULL,
+    resolver INTEGER NOT NULL,
+    dependencies TEXT NOT NULL,
+    PRIMARY KEY (ecosystem, project, version)
+)
+'''
+
+
+class DependencyCache:
+    """Cache of (ecosystem, project, version) -> dependencies.
+
+    It can be used from many threads.
+
+    Args:
+        path (str): SQLite database, created if it does not exist
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(SCHEMA)
+
+    def get(self, ecosystem, project, version, resolver):
+        """Return the cached dependencies of an artifact.
+
+        Args:
+            ecosystem (str): e.g. maven, debian
+            project (str): project name
+            version (str): project version
+            resolver (int): current version of the resolver
+
+        Returns:
+            dependencies (list): of tuples with project, version, or None
+                if the artifact is not cached by this resolver version
+
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT resolver, dependencies FROM dependencies WHERE '
+                'ecosystem = ? AND project = ? AND version = ?',
+                (ecosystem, project, version)
+            ).fetchone()
+        if row is None or row[0] != resolver:
+            metrics.incr('dependency_cache_total', ecosystem=ecosystem,
+                         result='miss')
+            return None
+        metrics.incr('dependency_cache_total', ecosystem=ecosystem,
+                     result='hit')
+        return [tuple(dep) for dep in json.loads(row[1])]
+
+    def put(self, ecosystem, project, version, resolver, dependencies):
+        """Save the dependencies of an artifact.
+
+        Args:
+            ecosystem (str): e.g. maven, debian
+            project (str): project name
+            version (str): project version
+            resolver (int): version of the resolver that found them
+            dependencies (list): of tuples with project, version
+
+        """
+        data = json.dumps([list(dep) for dep in dependencies])
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO dependencies VALUES (?, ?, ?, ?, ?)',
+                (ecosystem, project, version, resolver, data)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM dependencies').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,339 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Extraction of downloaded artifacts into a normalized source layout.
+
+The package managers leave different things in the output directory:
+sdists (.tar.gz, .zip) from pip, jars from Maven, and unpacked trees from
+apt. An Extractor unpacks them, in a pool of processes and while the
+downloads continue, into `<root>/<ecosystem>/<name>/<version>/'. A single
+top-level directory of an archive (e.g. Django-1.11/) is stripped.
+
+Archives are read in streaming mode, and only regular files and
+directories whose paths stay inside the destination are extracted; links
+and special files are skipped. Each extracted tree has a stamp file with
+the size, mtime and inode of its input, so unchanged inputs are not
+extracted again.
+"""
+import os
+import re
+import sys
+import shutil
+import tarfile
+import zipfile
+import stat
+import tempfile
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from fastensource.utils.metrics import metrics
+from fastensource.utils.blobstore import BlobStore, link_or_copy
+
+# Change it when the extracted layout changes, to extract everything again.
+EXTRACT_VERSION = 1
+STAMP = '.fastensource-extract'
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz',
+                '.txz')
+ZIP_SUFFIXES = ('.zip', '.jar', '.whl', '.egg')
+
+
+class UnsafeArchiveError(Exception):
+    """An archive member would be extracted outside its destination."""
+
+
+def archive_format(path):
+    """Return how to extract path: tar, zip, dir, or None."""
+    if os.path.isdir(path):
+        return 'dir'
+    lower = path.lower()
+    if lower.endswith(TAR_SUFFIXES):
+        return 'tar'
+    if lower.endswith(ZIP_SUFFIXES):
+        return 'zip'
+    return None
+
+
+def safe_path(dest, name):
+    """Return the path of an archive member in dest.
+
+    Raises:
+        UnsafeArchiveError: If the member is absolute or goes up with ..
+
+    """
+    name = name.replace('\\', '/')
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    # Absolute, e.g. /etc/passwd or C:/Windows
+    absolute = name.startswith('/') or re.match(r'[A-Za-z]:', name)
+    if absolute or '..' in parts:
+        raise UnsafeArchiveError('Unsafe path {!r}'.format(name))
+    return os.path.join(dest, *parts)
+
+
+def fingerprint(path):
+    """Return a string that changes when the input path changes."""
+    st = os.stat(path)
+    return '{} {} {} {}'.format(EXTRACT_VERSION, st.st_size, st.st_mtime_ns,
+                                st.st_ino)
+
+
+class _Files:
+    """Writes the extracted files as plain files, and counts them."""
+    def __init__(self):
+        self.files = 0
+        self.skipped = 0
+        self.size = 0
+        self.stored = 0
+
+    def write(self, src, target, mode):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            shutil.copyfileobj(src, f)
+            size = f.tell()
+        # Keep the executable bits, but never setuid or unreadable files
+        os.chmod(target, (mode & 0o755) | 0o600)
+        self.files += 1
+        self.size += size
+        self.stored += size
+
+    def tree(self, path, dest):
+        """Hard link (or copy) an unpacked tree; its symlinks stay links."""
+        shutil.copytree(path, dest, symlinks=True,
+                        copy_function=link_or_copy)
+        for dirpath, _, filenames in os.walk(dest):
+            self.files += len(filenames)
+
+    def finish(self, root, dest):
+        pass
+
+    def result(self):
+        return self.files, self.skipped, self.size, self.stored
+
+
+class _Blobs(_Files):
+    """Writes the extracted files to a BlobStore, and links them."""
+    def __init__(self, store):
+        super(_Blobs, self).__init__()
+        self.store = store
+        self.entries = dict()
+        self.links = dict()
+
+    def write(self, src, target, mode):
+        mode = (mode & 0o755) | 0o600
+        digest, size, new = self.store.put(src, mode)
+        self.store.link(digest, mode, target)
+        self.entries[target] = [digest, size, mode]
+        self.files += 1
+        self.size += size
+        if new:
+            self.stored += size
+
+    def tree(self, path, dest):
+        for dirpath, dirnames, filenames in os.walk(path):
+            target_dir = os.path.join(dest, os.path.relpath(dirpath, path))
+            os.makedirs(target_dir, exist_ok=True)
+            for name in filenames + [d for d in dirnames if
+                                     os.path.islink(os.path.join(dirpath,
+                                                                 d))]:
+                source = os.path.join(dirpath, name)
+                target = os.path.join(target_dir, name)
+                st = os.lstat(source)
+                if stat.S_ISLNK(st.st_mode):
+                    self.links[target] = os.readlink(source)
+                    os.symlink(self.links[target], target)
+                elif stat.S_ISREG(st.st_mode):
+                    with open(source, 'rb') as src:
+                        self.write(src, target, st.st_mode)
+                else:
+                    self.skipped += 1
+
+    def finish(self, root, dest):
+        """Save the manifest of the view."""
+        files = {os.path.relpath(target, root): entry
+                 for target, entry in self.entries.items()}
+        links = {os.path.relpath(target, root): link
+                 for target, link in self.links.items()}
+        self.store.write_manifest(dest, files, links)
+
+
+def _extract_tar(path, dest, out):
+    with tarfile.open(path, 'r|*') as tar:
+        for member in tar:
+            target = safe_path(dest, member.name)
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+            elif member.isfile():
+                out.write(tar.extractfile(member), target, member.mode)
+            else:
+                out.skipped += 1
+
+
+def _extract_zip(path, dest, out):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            target = safe_path(dest, info.filename)
+            mode = info.external_attr >> 16
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+            elif stat.S_IFMT(mode) and not stat.S_ISREG(mode):
+                out.skipped += 1
+            else:
+                with archive.open(info) as src:
+                    out.write(src, target, mode or 0o644)
+
+
+def extract(path, dest, store=None):
+    """Extract the archive or tree path into dest, replacing it.
+
+    Args:
+        path (str): absolute path of the input
+        dest (str): absolute path of the destination directory
+        store (str): root of a BlobStore to deduplicate the files in, and
+            to save the manifest of dest to; dest must be inside it
+
+    Raises:
+        UnsafeArchiveError: If a member is outside dest.
+        ValueError: If path is not an archive.
+
+    Returns:
+        result (tuple): files, skipped members, bytes of the files, and
+            bytes stored (new blobs), or None if dest was already
+            extracted from the same input
+
+    """
+    fmt = archive_format(path)
+    if fmt is None:
+        raise ValueError('Not an archive: {}'.format(path))
+    stamp = fingerprint(path)
+    try:
+        with open(os.path.join(dest, STAMP), 'r') as f:
+            if f.read() == stamp:
+                return None
+    except OSError:
+        pass
+    parent = os.path.dirname(dest)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.extract-', dir=parent)
+    root = os.path.join(tmp, 'tree')
+    out = _Files() if store is None else _Blobs(BlobStore(store))
+    try:
+        if fmt == 'dir':
+            out.tree(path, root)
+        else:
+            os.makedirs(root)
+            if fmt == 'tar':
+                _extract_tar(path, root, out)
+            else:
+                _extract_zip(path, root, out)
+            # Strip a single top-level directory
+            entries = os.listdir(root)
+            if len(entries) == 1 and\
+               os.path.isdir(os.path.join(root, entries[0])):
+                root = os.path.join(root, entries[0])
+        out.finish(root, dest)
+        with open(os.path.join(root, STAMP), 'w') as f:
+            f.write(stamp)
+        if os.path.isdir(dest):
+            shutil.rmtree(dest)
+        os.rename(root, dest)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out.result()
+
+
+def _component(value):
+    """Make a project name or version safe as a path component."""
+    value = value.replace('/', '_').replace('\\', '_').replace('\0', '_')
+    if value in ('', '.', '..'):
+        value = '_' + value
+    return value
+
+
+class Extractor:
+    """Extract artifacts in a pool of processes as they are downloaded.
+
+    Args:
+        root (str): absolute path of the normalized layout
+        jobs (int): processes (default: the number of CPUs)
+        errors (file): where to log the failed extractions
+        dedup (bool): store the files once in a BlobStore at root, and
+            hard link them to the trees
+
+    """
+    def __init__(self, root, jobs=None, errors=sys.stderr, dedup=False):
+        self.root = root
+        self.jobs = jobs
+        self.errors = errors
+        self.dedup = dedup
+        self._executor = None
+
+    def destination(self, ecosystem, name, version):
+        return os.path.join(self.root, _component(ecosystem),
+                            _component(name), _component(version))
+
+    def submit(self, ecosystem, name, version, path):
+        """Schedule the extraction of path, if it is an archive or a tree.
+
+        Returns:
+            submitted (bool)
+
+        """
+        if archive_format(path) is None:
+            return False
+        if self._executor is None:
+            # Forking a process with threads (e.g. the metrics writer) can
+            # deadlock the child, so the workers are started fresh.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        future = self._executor.submit(
+            extract, path, self.destination(ecosystem, name, version),
+            self.root if self.dedup else None
+        )
+        future.add_done_callback(partial(self._done, ecosystem, path))
+        return True
+
+    def _done(self, ecosystem, path, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            metrics.incr('extract_errors_total', ecosystem=ecosystem)
+            self.errors.write('Cannot extract {}: {}\n'.format(path, e))
+            return
+        if result is None:
+            metrics.incr('extract_skipped_total', ecosystem=ecosystem)
+            return
+        metrics.incr('extracted_total', ecosystem=ecosystem)
+        metrics.incr('extracted_files_total', result[0],
+                     ecosystem=ecosystem)
+        if result[1]:
+            metrics.incr('extract_skipped_members_total', result[1],
+                         ecosystem=ecosystem)
+        metrics.incr('extracted_bytes_total', result[2], ecosystem=ecosystem)
+        metrics.incr('extract_stored_bytes_total', result[3], ecosystem=ecosystem)
+
+    def close(self):
+        """Wait for the pending extractions."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,137 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Change feeds of upstream package managers.
+
+A feed returns the releases that happened after a high-water mark, and the
+new high-water mark. The first call (without a high-water mark) only
+returns the current high-water mark.
+"""
+import io
+import re
+import gzip
+import xmlrpc.client
+from fastensource.utils.helpers import requests_get_handler
+from fastensource.utils.mavenindex import MAVEN_INDEX_URL, PROPERTIES,\
+        parse_properties, read_artifacts
+
+PYPI_XMLRPC_URL = 'https://pypi.org/pypi'
+
+
+class FeedResetError(Exception):
+    """Raised when the high-water mark is no longer valid upstream"""
+
+
+def normalize_pypi_name(name):
+    """Normalize a PyPI project name as described in PEP 503."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def pypi_changes(serial, url=PYPI_XMLRPC_URL):
+    """Return the PyPI releases after the given changelog serial.
+
+    Args:
+        serial (int): high-water mark or None
+        url (str): PyPI XML-RPC endpoint
+
+    Returns:
+        changes (list): of tuples with project, version in the order that
+        they were released
+        serial (int): new high-water mark
+
+    """
+    client = xmlrpc.client.ServerProxy(url)
+    if serial is None:
+        return [], client.changelog_last_serial()
+    changes = list()
+    for name, version, _, action, event_serial in \
+            client.changelog_since_serial(serial):
+        serial = max(serial, event_serial)
+        if version and (action == 'new release' or
+                        action.startswith('add source file')):
+            changes.append((name, version))
+    return changes, serial
+
+
+def maven_changes(mark, url=MAVEN_INDEX_URL):
+    """Return the Maven releases in the index chunks after mark.
+
+    Args:
+        mark (dict): high-water mark ({'chain': id, 'chunk': number}) or None
+        url (str): url of the index directory
+
+    Raises:
+        FeedResetError: If upstream started a new chain of chunks.
+
+    Returns:
+        changes (list): of tuples with package, version
+        mark (dict): new high-water mark
+
+    """
+    page = requests_get_handler(url + PROPERTIES)
+    properties = parse_properties(page.text)
+    chain = properties.get('nexus.index.chain-id')
+    last = int(properties.get('nexus.index.last-incremental', 0))
+    new_mark = {'chain': chain, 'chunk': last}
+    if mark is None:
+        return [], new_mark
+    if mark['chain'] != chain:
+        raise FeedResetError('Maven index chain changed')
+    changes = list()
+    for chunk in range(mark['chunk'] + 1, last + 1):
+        page = requests_get_handler(
+            url + 'nexus-maven-repository-index.{}.gz'.format(chunk)
+        )
+        if page.status_code == 404:
+            raise FeedResetError('Maven index chunk {} not found'.format(
+                chunk))
+        with gzip.GzipFile(fileobj=io.BytesIO(page.content)) as stream:
+            for package, version, _ in read_artifacts(stream):
+                changes.append((package, version))
+    return changes, new_mark
+
+
+def filter_changes(changes, versions, normalize=None):
+    """Keep the changes of tracked packages that we do not have.
+
+    Args:
+        changes (list): of tuples with package, version
+        versions (dict): packages from versions.json
+        normalize (function): normalizes package names before matching
+
+    Returns:
+        results (dict): package (as in versions): last changed version
+
+    """
+    if normalize is None:
+        tracked = {key: key for key in versions}
+    else:
+        tracked = {normalize(key): key for key in versions}
+    results = dict()
+    for package, version in changes:
+        if normalize is not None:
+            package = normalize(package)
+        key = tracked.get(package)
+        if key is not None and version not in versions[key]:
+            results[key] = version
+    return results
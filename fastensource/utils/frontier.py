@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Frontier of projects to download that spills to disk.
+
+Crawls append every discovered dependency to the frontier, which can grow
+to tens of millions of entries. Frontier is a LIFO stack of
+(project, version) pairs that keeps at most `capacity' of them in memory:
+when the in-memory head grows larger, its older half moves to a SQLite
+file, and it is loaded back when the head runs empty. The order of the
+stack is kept, and pairs that are already in the frontier are not added
+again.
+"""
+import os
+import sqlite3
+import tempfile
+from fastensource.utils.metrics import metrics
+
+DEFAULT_CAPACITY = 100000
+
+
+class Frontier:
+    """A LIFO stack of (project, version) pairs, partly on disk.
+
+    It supports the list methods that the commands use: append, extend,
+    pop and len.
+
+    Args:
+        capacity (int): maximum pairs in memory
+        directory (str): where to create the spill file (default: the
+            temporary directory)
+
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, directory=None):
+        self.capacity = max(capacity, 2)
+        self.directory = directory
+        self._head = list()
+        self._queued = set()
+        self._spilled = 0
+        self._db = None
+        self._path = None
+
+    def append(self, project):
+        project = tuple(project)
+        if project in self._queued or self._on_disk(project):
+            return
+        self._head.append(project)
+        self._queued.add(project)
+        if len(self._head) > self.capacity:
+            self._spill()
+
+    def extend(self, projects):
+        for project in projects:
+            self.append(project)
+
+    def pop(self):
+        if len(self._head) == 0:
+            if self._spilled == 0:
+                raise IndexError('pop from empty frontier')
+            self._load()
+        project = self._head.pop()
+        self._queued.discard(project)
+        return project
+
+    def __len__(self):
+        return len(self._head) + self._spilled
+
+    def _open(self):
+        fd, self._path = tempfile.mkstemp(prefix='fastensource-frontier-',
+                                          suffix='.sqlite',
+                                          dir=self.directory)
+        os.close(fd)
+        self._db = sqlite3.connect(self._path)
+        # A scratch file: no need to survive crashes.
+        self._db.execute('PRAGMA journal_mode = OFF')
+        self._db.execute('PRAGMA synchronous = OFF')
+        self._db.execute('CREATE TABLE stack (id INTEGER PRIMARY KEY, '
+                         'project TEXT, version TEXT, '
+                         'UNIQUE (project, version))')
+
+    def _on_disk(self, project):
+        if self._spilled == 0:
+            return False
+        return self._db.execute(
+            'SELECT 1 FROM stack WHERE project = ? AND version = ?', project
+        ).fetchone() is not None
+
+    def _spill(self):
+        """Move the older half of the head to disk."""
+        if self._db is None:
+            self._open()
+        count = len(self._head) // 2
+        bottom = self._head[:count]
+        del self._head[:count]
+        self._queued.difference_update(bottom)
+        with self._db:
+            cursor = self._db.executemany(
+                'INSERT OR IGNORE INTO stack (project, version) '
+                'VALUES (?, ?)', bottom
+            )
+        self._spilled += cursor.rowcount
+        metrics.incr('frontier_spilled_total', count)
+
+    def _load(self):
+        """Move the newest pairs on disk to the head."""
+        rows = self._db.execute(
+            'SELECT id, project, version FROM stack ORDER BY id DESC '
+            'LIMIT ?', (self.capacity // 2,)
+        ).fetchall()
+        with self._db:
+            self._db.execute('DELETE FROM stack WHERE id >= ?',
+                             (rows[-1][0],))
+        self._spilled -= len(rows)
+        self._head = [(project, version) for _, project, version
+                      in reversed(rows)]
+        self._queued.update(self._head)
+        metrics.incr('frontier_loaded_total', len(rows))
+
+    def close(self):
+        """Remove the spill file."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            os.remove(self._path)
@@ -21,11 +21,25 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import os
 import sys
-from subprocess import Popen, PIPE
+import time
 from datetime import datetime
 from shutil import which
-import requests
+from urllib.parse import urlsplit
+import threading
+from fastensource.utils.metrics import metrics
+from fastensource.utils.runner import run_command
+from fastensource.utils.throttle import AdaptiveThrottle, CircuitOpenError,\
+        THROTTLE_STATUSES, FAILURE_STATUSES
+
+# Shared HTTP session, so that consecutive requests to the same host reuse
+# their connections. requests' Session is safe to use from many threads for
+# plain get requests.
+_session = None
+_session_lock = threading.Lock()
+# Adaptive concurrency and rate of the requests to each host
+_throttle = AdaptiveThrottle()
 
 def get_libio_datetime(dt):
     dt = dt[:dt.find(',')][:-2] + dt[dt.find(','):]
@@ -45,23 +59,22 @@ def is_program(program):
     return which(program) is not None
 
 
-def execute_command(cmd, mes_logs=sys.stdout, err_logs=sys.stderr):
-    """Execute a command.
+def execute_command(cmd, mes_logs=sys.stdout, err_logs=sys.stderr,
+                    timeout=None, cwd=None):
+    """Execute a command (without a shell, see runner.run_command).
 
-    Log errors in err_logs, and messages to mes_logs.
+    Stream its stdout to mes_logs, and its stderr to err_logs.
+
+    Args:
+        cmd (list): argv (a string is split into arguments)
+        timeout (float): seconds before the command is killed
+        cwd (str): working directory of the command
 
     Returns:
         exit_code (int): command's exit code
     """
-    process = Popen(cmd, shell=True, stdout=PIPE)
-    mes = process.communicate()
-    exit_code = process.wait()
-    mes = mes[0].decode('utf-8')
-    if exit_code == 0:
-        mes_logs.write(mes + '\n')
-    else:
-        err_logs.write(mes + '\n')
-    return exit_code
+    return run_command(cmd, mes_logs, err_logs, timeout=timeout,
+                       cwd=cwd).exit_code
 
 
 def find_name_version_pypi(project):
@@ -125,6 +138,96 @@ def remove_duplicates(names, versions, versions_dict):
     return new_names, new_versions
 
 
+def get_session():
+    """Return the shared requests session.
+
+    Returns:
+        session (requests.Session)
+
+    """
+    import requests
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=16,
+                                                    pool_maxsize=32)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+    return _session
+
+
+def set_throttle(throttle):
+    """Replace the adaptive throttle of all HTTP requests.
+
+    Args:
+        throttle (AdaptiveThrottle)
+
+    """
+    global _throttle
+    _throttle = throttle
+
+
+def get_throttle():
+    return _throttle
+
+
+def send_request(method, url, **kwargs):
+    """Send a request through the adaptive throttle of its host.
+
+    Throttled (429, 503) and failed requests are retried up to the
+    throttle's retries, after the pause that the throttle imposes.
+
+    Args:
+        method (str): e.g. GET, HEAD
+        url (str): url to do the request
+        kwargs: arguments of requests.Session.request
+
+    Raises:
+        ConnectionError: If all the attempts failed, or the circuit
+            breaker of the host is open.
+
+    Returns:
+        response (requests.Response): the last response
+
+    """
+    from requests.exceptions import RequestException
+    host = urlsplit(url).netloc
+    throttle = _throttle
+    for attempt in range(throttle.retries + 1):
+        if attempt > 0:
+            metrics.incr('http_retries_total', host=host)
+        try:
+            throttle.acquire(host)
+        except CircuitOpenError:
+            metrics.incr('http_errors_total', host=host)
+            raise ConnectionError
+        r = None
+        start = time.perf_counter()
+        try:
+            r = get_session().request(method, url, **kwargs)
+        except RequestException:
+            metrics.incr('http_errors_total', host=host)
+        finally:
+            latency = time.perf_counter() - start
+            metrics.observe('http_request_seconds', latency, host=host)
+            if r is None:
+                throttle.release(host)
+            else:
+                throttle.release(host, latency, r.status_code,
+                                 r.headers.get('Retry-After'))
+        if r is None:
+            continue
+        metrics.incr('http_requests_total', host=host, status=r.status_code)
+        retry = (r.status_code in THROTTLE_STATUSES or
+                 r.status_code in FAILURE_STATUSES)
+        if retry and attempt < throttle.retries:
+            r.close()
+            continue
+        return r
+    raise ConnectionError
+
+
 def requests_get(url):
     """Make a get request using requests package.
 
@@ -138,11 +241,69 @@ def requests_get(url):
         response (str): the response from the get request
 
     """
+    host = urlsplit(url).netloc
+    r = send_request('GET', url)
+    metrics.incr('http_response_bytes_total', len(r.content), host=host)
+    return r
+
+
+def content_length(url):
+    """Find the size of a file without downloading it.
+
+    Args:
+        url (str): url of the file
+
+    Returns:
+        size (int): size in bytes, or None if the server does not say
+
+    """
+    try:
+        r = send_request('HEAD', url, allow_redirects=True)
+    except ConnectionError:
+        return None
+    length = r.headers.get('Content-Length')
+    if r.status_code != 200 or length is None or not length.isdigit():
+        return None
+    return int(length)
+
+
+def download_file(url, path, chunk_size=1 << 16):
+    """Stream a file to path.
+
+    The file is written to a temporary name first, so an interrupted
+    download never leaves a truncated file at path.
+
+    Args:
+        url (str): url of the file
+        path (str): where to save it
+
+    Raises:
+        ConnectionError: If a RequestException occurred or the response
+            was not successful.
+
+    Returns:
+        size (int): bytes written
+
+    """
+    from requests.exceptions import RequestException
+    host = urlsplit(url).netloc
+    size = 0
     try:
-        r = requests.get(url)
-    except requests.exceptions.RequestException:
+        with send_request('GET', url, stream=True) as r:
+            if r.status_code != 200:
+                raise ConnectionError
+            with open(path + '.part', 'wb') as f:
+                for chunk in r.iter_content(chunk_size):
+                    f.write(chunk)
+                    size += len(chunk)
+    except (RequestException, ConnectionError):
+        metrics.incr('http_errors_total', host=host)
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
         raise ConnectionError
-    return r
+    os.replace(path + '.part', path)
+    metrics.incr('http_response_bytes_total', size, host=host)
+    return size
 
 
 def requests_get_handler(url):
@@ -151,17 +312,14 @@ def requests_get_handler(url):
     Args:
         url (str): url to do the request
 
+    Raises:
+        ConnectionError: If the request failed; it stops the command.
+
     Returns:
         response (str): the response from the get request
 
     """
-    try:
-        r = requests_get(url)
-    except ConnectionError:
-        print(('A connection error occurred. '
-              'Please check your internet connection!'))
-        sys.exit(1)
-    return r
+    return requests_get(url)
 
 
 def delay(fn):
@@ -179,8 +337,72 @@ def delay(fn):
     return wrapper
 
 
+def memoize(maxsize=1024, ttl=None, key=None):
+    """Decorator to keep the results of a function in memory.
+
+    The cache outlives a command, so a long-running process (see
+    `fastensource daemon') answers repeated requests from memory. None
+    results are not kept, so failures are retried.
+
+    Args:
+        maxsize (int): results to keep; the least recently used are
+            dropped
+        ttl (float): seconds before a result expires, or None to keep it
+            until it is dropped
+        key (function): makes the cache key from the arguments (default:
+            all the arguments)
+
+    """
+    from collections import OrderedDict
+
+    def decorator(fn):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key is not None else\
+                (args, tuple(sorted(kwargs.items())))
+            with lock:
+                if k in cache:
+                    value, expires = cache[k]
+                    if expires is None or expires > time.monotonic():
+                        cache.move_to_end(k)
+                        metrics.incr('memo_total', function=fn.__name__,
+                                     result='hit')
+                        return value
+                    del cache[k]
+            metrics.incr('memo_total', function=fn.__name__, result='miss')
+            value = fn(*args, **kwargs)
+            if value is not None:
+                with lock:
+                    cache[k] = (value, None if ttl is None else
+                                time.monotonic() + ttl)
+                    cache.move_to_end(k)
+                    while len(cache) > maxsize:
+                        cache.popitem(last=False)
+            return value
+        wrapper.cache_clear = cache.clear
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+    return decorator
+
+
 class Error(Exception):
     """Base class for other exceptions"""
 
 class ConnectionError(Error):
     """Raised when a connection error occurred"""
+
+    def __str__(self):
+        return super(ConnectionError, self).__str__() or (
+            'A connection error occurred. '
+            'Please check your internet connection!')
+
+
+class ConfigurationError(Error):
+    """Raised when an option of a command is invalid"""
+
+
+class ToolNotFoundError(Error):
+    """Raised when the package manager of a command is not installed"""
@@ -0,0 +1,272 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Layouts of the output directory.
+
+By default (flat) the artifacts are saved directly in the output
+directory, as the package managers leave them. With hundreds of thousands
+of artifacts, listing and looking up such a directory is slow, so the
+sharded layout saves each artifact to
+
+    <output>/<shard>/<name>/<version>/<file>
+
+where the shard is a prefix of the SHA-1 of the lowercase name, and keeps
+an index (`<output>/index.tsv') of the paths of each name and version.
+The index is appended to as artifacts are added, so finding an artifact
+never scans the directories.
+
+A flat output directory can be converted with
+update_script/migrate_layout.py.
+"""
+import os
+import shutil
+import hashlib
+import threading
+from fastensource.utils.helpers import ConfigurationError,\
+        find_name_version_pypi, find_name_version_debian
+from fastensource.utils.versions import read_versions
+from fastensource.utils.extract import _component
+
+LAYOUTS = ('flat', 'sharded')
+INDEX = 'index.tsv'
+# Hex digits of the shard directories (256 shards)
+SHARD_WIDTH = 2
+
+
+def shard(name):
+    """Return the shard directory of a project name."""
+    digest = hashlib.sha1(name.lower().encode('utf-8')).hexdigest()
+    return digest[:SHARD_WIDTH]
+
+
+class FlatLayout:
+    """All the artifacts directly in root.
+
+    Args:
+        root (str): absolute path of the output directory
+
+    """
+    name = 'flat'
+
+    def __init__(self, root):
+        self.root = root
+
+    def directory(self, name, version):
+        """Return the directory to save an artifact to, and create it."""
+        os.makedirs(self.root, exist_ok=True)
+        return self.root
+
+    def add(self, name, version, path):
+        """Move a downloaded file or tree to the directory of its artifact
+        (unless it is already there), and index it.
+
+        Returns:
+            path (str): its new absolute path
+        """
+        directory = self.directory(name, version)
+        path = os.path.join(self.root, path)
+        target = os.path.join(directory, os.path.basename(path))
+        if path != target:
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            shutil.move(path, target)
+        self._index(name, version, target)
+        return target
+
+    def _index(self, name, version, path):
+        pass
+
+    def find(self, name, version):
+        """Return the absolute paths of an artifact, without listing any
+        directory (only the sharded layout knows them).
+        """
+        return []
+
+    def close(self):
+        pass
+
+
+class ShardedLayout(FlatLayout):
+    """The artifacts in <root>/<shard>/<name>/<version>/, with an index.
+
+    It can be used by many threads at once.
+    """
+    name = 'sharded'
+
+    def __init__(self, root):
+        super(ShardedLayout, self).__init__(root)
+        self.index_path = os.path.join(root, INDEX)
+        self.paths = dict()
+        self._lock = threading.Lock()
+        self._file = None
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    # Skip a line cut by a crash
+                    if len(parts) == 3 and line.endswith('\n'):
+                        self._remember(*parts)
+
+    def _remember(self, name, version, relpath):
+        paths = self.paths.setdefault((name, version), [])
+        if relpath not in paths:
+            paths.append(relpath)
+            return True
+        return False
+
+    def directory(self, name, version):
+        directory = os.path.join(self.root, shard(name), _component(name),
+                                 _component(version))
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def _index(self, name, version, path):
+        relpath = os.path.relpath(path, self.root)
+        with self._lock:
+            if not self._remember(name, version, relpath):
+                return
+            if self._file is None:
+                os.makedirs(self.root, exist_ok=True)
+                self._file = open(self.index_path, 'a', encoding='utf-8')
+            self._file.write('{}\t{}\t{}\n'.format(name, version, relpath))
+            self._file.flush()
+
+    def find(self, name, version):
+        return [os.path.join(self.root, relpath)
+                for relpath in self.paths.get((name, version), [])]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def open_layout(root, layout='flat'):
+    """Return the layout of an output directory.
+
+    Raises:
+        ConfigurationError: If the directory has the other layout.
+
+    """
+    index = os.path.join(root, INDEX)
+    sharded = os.path.isfile(index)
+    if layout == 'sharded':
+        # Shards without an index are left by a run that added nothing
+        if not sharded and os.path.isdir(root) and\
+           any(not entry.startswith('.') and not _is_shard(root, entry)
+               for entry in os.listdir(root)):
+            raise ConfigurationError(
+                '{} has the flat layout; convert it with '
+                'update_script/migrate_layout.py'.format(root))
+        # Mark the directory as sharded before anything is saved to it,
+        # e.g. the versions file.
+        os.makedirs(root, exist_ok=True)
+        open(index, 'a').close()
+        return ShardedLayout(root)
+    if sharded:
+        raise ConfigurationError('{} has the sharded layout; use '
+                                 '--layout sharded'.format(root))
+    return FlatLayout(root)
+
+
+def _is_shard(root, entry):
+    return len(entry) == SHARD_WIDTH and\
+        all(c in '0123456789abcdef' for c in entry) and\
+        os.path.isdir(os.path.join(root, entry))
+
+
+def _artifact_names(ecosystem, versions):
+    """Return a function that maps an entry of a flat output directory to
+    the project and version of the versions file it was saved for, or
+    None.
+    """
+    if ecosystem == 'maven':
+        # e.g. org.slf4j.slf4j-api-1.7.30.jar for org.slf4j:slf4j-api
+        jars = dict()
+        for project, version in versions.pairs():
+            org, artifact = project.split(':')[:2]
+            jars['{}.{}-{}.jar'.format(org, artifact, version)] = \
+                (project, version)
+        return jars.get
+    if ecosystem == 'pypi':
+        parse = find_name_version_pypi
+    elif ecosystem == 'debian':
+        parse = find_name_version_debian
+    else:
+        raise ValueError('Unknown ecosystem {}'.format(ecosystem))
+
+    def name_version(entry):
+        name, version = parse(entry)
+        if name in versions and version in versions[name]:
+            return name, version
+        return None
+    return name_version
+
+
+def migrate(root, ecosystem, versions_filename='versions.json',
+            dry_run=False):
+    """Convert a flat output directory to the sharded layout.
+
+    The artifacts of the versions file are moved and indexed; other
+    entries are left where they are. It can be run again after an
+    interruption.
+
+    Args:
+        root (str): the output directory
+        ecosystem (str): pypi, maven, or debian
+        versions_filename (str): the versions file in root
+        dry_run (bool): only report what would be moved
+
+    Returns:
+        moved (list): of (entry, project, version) tuples
+        skipped (list): entries that are not artifacts of the versions
+            file
+
+    """
+    root = os.path.abspath(root)
+    path = os.path.join(root, versions_filename)
+    if not os.path.isfile(path):
+        raise ConfigurationError('Cannot find {}'.format(path))
+    versions, _ = read_versions(path)
+    name_version = _artifact_names(ecosystem, versions)
+    layout = ShardedLayout(root)
+    moved = list()
+    skipped = list()
+    try:
+        with os.scandir(root) as entries:
+            entries = sorted(entry.name for entry in entries)
+        for entry in entries:
+            if entry in (INDEX, versions_filename) or\
+               entry.startswith('.') or _is_shard(root, entry):
+                continue
+            result = name_version(entry)
+            if result is None:
+                skipped.append(entry)
+                continue
+            moved.append((entry, result[0], result[1]))
+            if not dry_run:
+                layout.add(result[0], result[1], entry)
+    finally:
+        layout.close()
+    return moved, skipped
@@ -22,11 +22,15 @@
 # under the License.
 #
 import os
-import shutil
-import pydot
-from lxml import html
+import tempfile
 from fastensource.utils.helpers import delay, execute_command,\
-        requests_get_handler
+        requests_get_handler, memoize
+from fastensource.utils.metrics import timed
+from fastensource.utils.mirrors import MirrorSet
+
+# Version of find_project_dependencies' results. Bump it when they change, to
+# invalidate the dependency cache.
+RESOLVER_VERSION = 1
 
 
 def get_name(artifact, version, filetype, org=''):
@@ -65,28 +69,66 @@ def find_last_version(url_v, package, delay):
     page = requests_get_handler(url)
     if page.status_code == 404:
         return 'Error'
-    tree = html.fromstring(page.content)
-    element = '//a[@class="vbtn release"]//text()'
-    elements = tree.xpath(element)
+    from lxml import html
+    with timed('parse'):
+        tree = html.fromstring(page.content)
+        element = '//a[@class="vbtn release"]//text()'
+        elements = tree.xpath(element)
     if len(elements) == 0:
         return 'Not Found'
     return elements[0]
 
 
+def fetch(url, path):
+    """GET a file of a repository.
+
+    Args:
+        url (str): base url of the repository, or a MirrorSet
+        path (str): path of the file in the repository
+
+    Returns:
+        response: the response from the get request
+
+    """
+    if isinstance(url, MirrorSet):
+        return url.get(path)
+    return requests_get_handler(url + path)
+
+
 @delay
-def download_maven_jar(url, package, version, delay):
+def download_maven_jar(url, package, version, delay, directory='.'):
     """Download maven project jar.
 
+    Args:
+        directory (str): where to save the jar
+
+    Returns:
+        filename (str): the jar in directory
+
     """
     filename = get_name(package.split(':')[1], version, 'jar',
                         package.split(':')[0] + '.')
-    url = url + get_url(package, version, 'jar')
-    r = requests_get_handler(url)
+    path = get_url(package, version, 'jar')
+    r = fetch(url, path)
     if r.status_code == 404:
         # FIXME
-        print('Error: ' + url + ' Not Found\n')
-    with open(filename, 'wb') as f:
+        print('Error: ' + path + ' Not Found\n')
+    with open(os.path.join(directory, filename), 'wb') as f:
         f.write(r.content)
+    return filename
+
+
+@memoize(maxsize=1024, key=lambda url, path: path)
+def _fetch_pom(url, path):
+    """Return the pom at path, or None if the request failed.
+
+    Released poms never change, so they are kept in memory, whatever
+    the mirror.
+    """
+    r = fetch(url, path)
+    if r.status_code != 200:
+        return None
+    return r.content
 
 
 @delay
@@ -94,55 +136,112 @@ def get_pom_xml(url, project, version, delay):
     """Get the pom of a project.
 
     Args:
-        url (str): URL to make the request
+        url (str): URL of the repository, or a MirrorSet
         project (str): Project name
         version (str): Project version
         delay (str): Second to sleep
 
     Returns:
-        content (str): The contents of pom xml file.
+        content (str): The contents of pom xml file (empty if it cannot
+            be downloaded).
 
     """
-    url = url + get_url(project, version, 'pom')
-    r = requests_get_handler(url)
-    if r.status_code == 404:
+    path = get_url(project, version, 'pom')
+    content = _fetch_pom(url, path)
+    if content is None:
         # FIXME
-        print('Error: ' + url + ' Not Found\n')
-    return r.content
+        print('Error: ' + path + ' Not Found\n')
+        return b''
+    return content
 
 
 @delay
-def find_dependencies(pom_content, delay):
-    """Find the dependencies of a maven project using mvn.
+def _delayed_dependency_tree(pom_content, delay, timeout=None):
+    return dependency_tree(pom_content, timeout)
+
+
+def find_project_dependencies(url, project, version, delay, timeout=None,
+                              cache=None, commands_delay=0):
+    """Find the dependencies of a released maven project.
+
+    The dependency cache is consulted first; on a miss the pom is
+    downloaded and resolved with mvn, and the result is cached if mvn
+    succeeded.
+
+    Args:
+        url (str): URL of the repository, or a MirrorSet
+        project (str): Project name
+        version (str): Project version
+        delay (int): seconds to sleep before the pom request
+        timeout (float): seconds before mvn is killed
+        cache (DependencyCache): or None
+        commands_delay (int): seconds to sleep before mvn runs
+
+    Returns:
+        dependencies (list): of tuples with project, version.
+
+    """
+    if cache is not None:
+        dependencies = cache.get('maven', project, version,
+                                 RESOLVER_VERSION)
+        if dependencies is not None:
+            return dependencies
+    pom = get_pom_xml(url, project, version, delay=delay)
+    dependencies = _delayed_dependency_tree(pom, delay=commands_delay,
+                                            timeout=timeout)
+    if dependencies is None:
+        return []
+    if cache is not None:
+        cache.put('maven', project, version, RESOLVER_VERSION, dependencies)
+    return dependencies
+
+
+def dependency_tree(pom_content, timeout=None):
+    """Run mvn dependency:tree on a pom.
 
     Args:
         pom_content (str): pom xml's content
-        delay (int): seconds to sleep
+        timeout (float): seconds before mvn is killed
+
+    Returns:
+        dependencies (list): of tuples with project, version, or None if
+            mvn failed.
+
+    """
+    dependencies = None
+    # mvn runs in its own directory, so the process' one is not changed
+    with tempfile.TemporaryDirectory(prefix='fastensource-mvn-') as temp:
+        with open(os.path.join(temp, 'pom.xml'), 'wb') as f:
+            f.write(pom_content)
+        cmd = ['mvn',
+               'org.apache.maven.plugins:maven-dependency-plugin:2.4:tree',
+               '-DoutputFile=deps.dot', '-DoutputType=dot']
+        # FIXME
+        exit_code = execute_command(cmd, timeout=timeout, cwd=temp)
+        if exit_code == 0:
+            with open(os.path.join(temp, 'deps.dot'), 'r',
+                      encoding='utf-8') as f:
+                dependencies = parse_dependency_tree(f.read())
+    return dependencies
+
+
+def parse_dependency_tree(dot):
+    """Parse the output of mvn dependency:tree -DoutputType=dot.
+
+    Args:
+        dot (str): e.g. digraph "a:b:jar:1.0" { "a:b:jar:1.0" -> ... }
 
     Returns:
         dependencies (list): of tuples with project, version.
 
     """
+    import pydot
     dependencies = list()
-    # tempfile doesn't work here!!!
-    os.makedirs('temp')
-    os.chdir('temp')
-    with open('pom.xml', 'wb') as f:
-        f.write(pom_content)
-    cmd = ('mvn '
-           'org.apache.maven.plugins:maven-dependency-plugin:2.4:tree '
-           '-DoutputFile=deps.dot -DoutputType=dot'
-           )
-    # FIXME
-    exit_code = execute_command(cmd)
-    if exit_code == 0:
-        graphs = pydot.graph_from_dot_file('deps.dot')
-        graph = graphs[0]
+    with timed('parse'):
+        graph = pydot.graph_from_dot_data(dot)[0]
         for edge in graph.get_edge_list():
             dest = edge.get_destination().replace('"', '')
             package = dest.split(':jar:')[0]
             version = dest.split(':jar:')[1].split(':')[0]
             dependencies.append(tuple([package, version]))
-    os.chdir('..')
-    shutil.rmtree('temp')
     return dependencies
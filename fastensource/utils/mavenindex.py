@@ -0,0 +1,385 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Maven repository index readers, and a compact local index.
+
+Maven Central publishes its index (nexus-maven-repository-index) as a full
+export and as a chain of incremental chunks. Both are gzipped streams of
+documents written with Java's DataOutputStream:
+
+    byte    version
+    long    timestamp
+    document*
+
+where each document is an int with the number of fields, followed by the
+fields. A field is a flags byte, its name (unsigned short length and
+modified UTF-8), and its value (int length and modified UTF-8).
+
+The local index (see build_index and MavenIndex) keeps the versions and
+upload timestamps of each package so that they can be found without any
+network request.
+"""
+import io
+import os
+import re
+import gzip
+import mmap
+import struct
+from datetime import datetime, timezone
+
+MAVEN_INDEX_URL = 'https://repo1.maven.org/maven2/.index/'
+PROPERTIES = 'nexus-maven-repository-index.properties'
+
+
+class IndexFormatError(Exception):
+    """Raised when a stream is not a valid Maven index"""
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError
+    return data
+
+
+def _decode(data):
+    """Decode Java's modified UTF-8."""
+    data = data.replace(b'\xc0\x80', b'\x00')
+    text = data.decode('utf-8', 'surrogatepass')
+    return text.encode('utf-16', 'surrogatepass').decode('utf-16')
+
+
+def read_documents(stream):
+    """Iterate over the documents of an uncompressed index stream.
+
+    Args:
+        stream (file): binary file object
+
+    Yields:
+        document (dict): field name: value
+
+    """
+    header = stream.read(9)
+    if len(header) != 9 or header[0] != 1:
+        raise IndexFormatError('Unsupported index version')
+    while True:
+        raw = stream.read(4)
+        if len(raw) == 0:
+            return
+        if len(raw) != 4:
+            raise IndexFormatError('Truncated document')
+        fields = struct.unpack('>i', raw)[0]
+        document = dict()
+        try:
+            for _ in range(fields):
+                _read_exact(stream, 1)  # flags
+                size = struct.unpack('>H', _read_exact(stream, 2))[0]
+                name = _decode(_read_exact(stream, size))
+                size = struct.unpack('>i', _read_exact(stream, 4))[0]
+                document[name] = _decode(_read_exact(stream, size))
+        except EOFError:
+            raise IndexFormatError('Truncated document')
+        yield document
+
+
+def read_artifacts(stream):
+    """Iterate over the artifacts of an uncompressed index stream.
+
+    Only the main artifact of each version is returned (no classifiers),
+    and deleted artifacts are skipped.
+
+    Yields:
+        artifact (tuple): package (group:artifact), version, last modified
+        timestamp in milliseconds since epoch (0 if unknown)
+
+    """
+    for document in read_documents(stream):
+        if 'u' not in document or 'del' in document:
+            continue
+        parts = document['u'].split('|')
+        if len(parts) < 3 or (len(parts) > 3 and parts[3] != 'NA'):
+            continue
+        modified = document.get('m', '0')
+        try:
+            modified = int(modified)
+        except ValueError:
+            modified = 0
+        yield parts[0] + ':' + parts[1], parts[2], modified
+
+
+def open_index(path):
+    """Open a gzipped (.gz) or plain index file for reading."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def parse_properties(content):
+    """Parse the nexus-maven-repository-index.properties file.
+
+    Args:
+        content (str)
+
+    Returns:
+        properties (dict)
+
+    """
+    properties = dict()
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        properties[key.strip()] = value.strip().replace('\\:', ':')
+    return properties
+
+
+# Compact local index
+#
+# The local index is a single file that can be memory-mapped:
+#
+#     header   magic (8 bytes), number of packages (uint32), reserved
+#     offsets  uint32 offset of each package record, sorted by package
+#     records  package (uint16 length, utf-8), number of versions (uint16),
+#              and for each version its name (uint8 length, utf-8) and
+#              its upload timestamp (uint32 seconds since epoch, 0 if
+#              unknown)
+#
+# The versions of a package are saved with the latest version first.
+MAGIC = b'FSMVNIX1'
+_HEADER = struct.Struct('<8sII')
+_OFFSET = struct.Struct('<I')
+
+
+def _version_key(version):
+    """Sort key that approximates Maven's version ordering."""
+    parts = re.split(r'[.\-]', version)
+    return [(0, int(p), '') if p.isdigit() else (-1, 0, p.lower())
+            for p in parts]
+
+
+def collect_artifacts(artifacts, packages=None):
+    """Group the artifacts of an index stream by package.
+
+    Args:
+        artifacts (iterable): of tuples with package, version, timestamp in
+            milliseconds (as returned by read_artifacts)
+        packages (dict): previous result to update
+
+    Returns:
+        packages (dict): package: dict of version: timestamp in seconds
+
+    """
+    if packages is None:
+        packages = dict()
+    for package, version, modified in artifacts:
+        versions = packages.setdefault(package, dict())
+        versions[version] = max(versions.get(version, 0), modified // 1000)
+    return packages
+
+
+def collect_metadata(path, packages=None, releases=None):
+    """Add the versions of a maven-metadata.xml file.
+
+    maven-metadata.xml has no timestamps per version, so the versions are
+    saved with unknown timestamps and ordered by version; the release
+    version of the metadata is considered the latest one.
+
+    Args:
+        path (str): the maven-metadata.xml file
+        packages (dict): previous result to update
+        releases (dict): package: release version, updated in place
+
+    Returns:
+        packages (dict): package: dict of version: timestamp in seconds
+
+    """
+    from lxml import etree
+    if packages is None:
+        packages = dict()
+    if releases is None:
+        releases = dict()
+    tree = etree.parse(path)
+    group = tree.findtext('groupId')
+    artifact = tree.findtext('artifactId')
+    if not group or not artifact:
+        return packages
+    versions = packages.setdefault(group + ':' + artifact, dict())
+    for version in tree.findall('versioning/versions/version'):
+        versions.setdefault(version.text.strip(), 0)
+    release = tree.findtext('versioning/release')
+    if release:
+        versions.setdefault(release.strip(), 0)
+        releases[group + ':' + artifact] = release.strip()
+    return packages
+
+
+def _order_versions(versions, release=None):
+    """Return the versions of a package ordered with the latest first.
+
+    Snapshots are never considered the latest version, unless they are the
+    release version.
+    """
+    ordered = sorted(versions.items(),
+                     key=lambda item: (not item[0].endswith('-SNAPSHOT'),
+                                       item[1], _version_key(item[0])),
+                     reverse=True)
+    if release is not None:
+        ordered.sort(key=lambda item: item[0] != release)
+    return ordered
+
+
+def build_index(packages, path, releases=None):
+    """Write the local index of packages to path.
+
+    Args:
+        packages (dict): as returned by collect_artifacts, collect_metadata
+        path (str): file to write
+        releases (dict): release versions found by collect_metadata
+
+    """
+    releases = releases or dict()
+    offsets = list()
+    records = io.BytesIO()
+    for package in sorted(packages, key=lambda p: p.encode('utf-8')):
+        versions = list()
+        for version, timestamp in _order_versions(packages[package],
+                                                    releases.get(package)):
+            version = version.encode('utf-8')
+            # Skip versions that do not fit in a record, because a truncated
+            # version would be another version (or invalid UTF-8).
+            if len(version) <= 0xff:
+                versions.append((version, timestamp))
+        versions = versions[:0xffff]
+        offsets.append(records.tell())
+        name = package.encode('utf-8')
+        records.write(struct.pack('<H', len(name)) + name)
+        records.write(struct.pack('<H', len(versions)))
+        for version, timestamp in versions:
+            records.write(struct.pack('<B', len(version)) + version)
+            records.write(struct.pack('<I', min(max(timestamp, 0),
+                                                0xffffffff)))
+    base = _HEADER.size + _OFFSET.size * len(offsets)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(offsets), 0))
+        for offset in offsets:
+            f.write(_OFFSET.pack(base + offset))
+        f.write(records.getvalue())
+    os.replace(tmp, path)
+
+
+class MavenIndex:
+    """Read-only, memory-mapped local index of Maven packages.
+
+    Args:
+        path (str): file created by build_index
+
+    """
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise IndexFormatError('{} is not a Maven index'.format(path))
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _key(self, position):
+        offset = _OFFSET.unpack_from(
+            self._map, _HEADER.size + _OFFSET.size * position
+        )[0]
+        size = struct.unpack_from('<H', self._map, offset)[0]
+        return self._map[offset + 2:offset + 2 + size], offset + 2 + size
+
+    def _find(self, package):
+        """Binary search for the record of package."""
+        key = package.encode('utf-8')
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count:
+            found, offset = self._key(low)
+            if found == key:
+                return offset
+        return None
+
+    def versions(self, package):
+        """Return the versions of a package, latest first.
+
+        Returns:
+            versions (list): of tuples with version, timestamp in seconds
+            since epoch (0 if unknown)
+
+        """
+        offset = self._find(package)
+        if offset is None:
+            return []
+        count = struct.unpack_from('<H', self._map, offset)[0]
+        offset += 2
+        versions = list()
+        for _ in range(count):
+            size = self._map[offset]
+            version = self._map[offset + 1:offset + 1 + size].decode('utf-8')
+            offset += 1 + size
+            timestamp = struct.unpack_from('<I', self._map, offset)[0]
+            offset += 4
+            versions.append((version, timestamp))
+        return versions
+
+    def __contains__(self, package):
+        return self._find(package) is not None
+
+    def __len__(self):
+        return self._count
+
+    def last_version(self, package, delay=0):
+        """Return the last version of a package or empty string.
+
+        Accepts delay to be used instead of find_last_version_maven.
+        """
+        versions = self.versions(package)
+        if len(versions) == 0:
+            return ''
+        return versions[0][0]
+
+    def version_timestamp(self, package, version):
+        """Return the upload timestamp of a version (e.g. Apr 05, 2019).
+
+        In case the version or its timestamp is unknown return empty string.
+        """
+        for name, timestamp in self.versions(package):
+            if name == version:
+                if timestamp == 0:
+                    return ''
+                return datetime.fromtimestamp(
+                    timestamp, timezone.utc
+                ).strftime('%b %d, %Y')
+        return ''
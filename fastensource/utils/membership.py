@@ -0,0 +1,216 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Shared, memory-mapped index of the artifacts that were downloaded.
+
+Building the set of downloaded projects (d_projects) from the versions
+file takes seconds and a lot of memory per process on big corpora. A
+membership file is built once (update_script/build_membership.py) with
+the (ecosystem, project, version) triples of the versions files, and
+each worker maps it read-only, so all the workers of a machine share it
+through the page cache. Entries that a worker adds go to a small set in
+its memory (MembershipSet).
+
+The file is:
+    - a header: MAGIC, the number of entries, the bits of the Bloom
+      filter and its hash functions,
+    - the Bloom filter (which may be empty), that answers most lookups of
+      new entries with a single page,
+    - the sorted 64-bit hashes of the entries, for binary search.
+A 64-bit hash is taken as the entry, as in projects.HashedSet. The
+numbers are in the byte order of the machine that built the file.
+"""
+import os
+import math
+import mmap
+import struct
+import hashlib
+from array import array
+from bisect import bisect_left
+from fastensource.utils.versions import read_versions
+
+MAGIC = b'FSMEMB01'
+# magic, entries, Bloom filter bits, Bloom filter hash functions
+HEADER = struct.Struct('=8sQQQ')
+DEFAULT_BITS_PER_ENTRY = 10
+
+
+def entry_hash(ecosystem, project, version):
+    """Return the 64-bit hash of an entry, the same in every process."""
+    key = '\0'.join((ecosystem, project, version)).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(),
+                          'little')
+
+
+def _probes(h, bits, k):
+    # Double hashing: the k positions come from the two halves of h.
+    h1 = h & 0xffffffff
+    h2 = (h >> 32) | 1
+    return ((h1 + i * h2) % bits for i in range(k))
+
+
+def versions_entries(ecosystem, path):
+    """Yield the entries of a versions file, as the command of the
+    ecosystem puts them in d_projects: the requested packages (p_names)
+    for debian, and the downloaded versions for the others.
+    """
+    versions, p_names = read_versions(path)
+    pairs = p_names.pairs() if ecosystem == 'debian' else versions.pairs()
+    for project, version in pairs:
+        yield ecosystem, project, version
+
+
+def build_membership(path, entries, bits_per_entry=DEFAULT_BITS_PER_ENTRY):
+    """Write a membership file.
+
+    The file is replaced atomically, so running workers keep the file
+    that they mapped.
+
+    Args:
+        path (str): the membership file
+        entries (iterable): of (ecosystem, project, version) tuples
+        bits_per_entry (int): size of the Bloom filter (10 bits: about 1%
+            false positives); 0 for no Bloom filter
+
+    Returns:
+        count (int): distinct entries
+
+    """
+    hashes = array('Q', sorted(set(entry_hash(*entry)
+                                   for entry in entries)))
+    if hashes.itemsize != 8:
+        raise RuntimeError('array Q is not 64-bit on this platform')
+    count = len(hashes)
+    bits = k = 0
+    bloom = bytearray()
+    if bits_per_entry and count:
+        bits = max(64, count * bits_per_entry)
+        # Whole 8-byte words, so the hashes stay aligned
+        bits = (bits + 63) // 64 * 64
+        k = max(1, int(round(bits / count * math.log(2))))
+        bloom = bytearray(bits // 8)
+        for h in hashes:
+            for bit in _probes(h, bits, k):
+                bloom[bit >> 3] |= 1 << (bit & 7)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, count, bits, k))
+        f.write(bloom)
+        hashes.tofile(f)
+    os.replace(tmp, path)
+    return count
+
+
+class MembershipFile:
+    """A membership file, mapped read-only.
+
+    Args:
+        path (str): the membership file
+
+    Raises:
+        ValueError: If path is not a membership file.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.count, self.bits, self.k = \
+                HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = None
+        start = HEADER.size + self.bits // 8 if magic == MAGIC else 0
+        if magic != MAGIC or len(self._map) != start + self.count * 8:
+            self._map.close()
+            raise ValueError('Not a membership file: {}'.format(path))
+        self._view = memoryview(self._map)
+        self._bloom = self._view[HEADER.size:start]
+        self._hashes = self._view[start:].cast('Q')
+
+    def contains_hash(self, h):
+        if self.bits:
+            bloom = self._bloom
+            for bit in _probes(h, self.bits, self.k):
+                if not bloom[bit >> 3] & (1 << (bit & 7)):
+                    return False
+        i = bisect_left(self._hashes, h)
+        return i < self.count and self._hashes[i] == h
+
+    def __contains__(self, entry):
+        return self.contains_hash(entry_hash(*entry))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._hashes.release()
+        self._bloom.release()
+        self._view.release()
+        self._map.close()
+
+
+class MembershipSet:
+    """The (project, version) pairs of an ecosystem: a shared membership
+    file and the pairs that were added in this process.
+
+    It has the interface of projects.HashedSet, so it can be d_projects.
+
+    Args:
+        membership (MembershipFile): the shared file
+        ecosystem (str): e.g. pypi
+
+    """
+    def __init__(self, membership, ecosystem):
+        self.membership = membership
+        self.ecosystem = ecosystem
+        self._delta = set()
+
+    def _hash(self, key):
+        project, version = key
+        return entry_hash(self.ecosystem, project, version)
+
+    def add(self, key):
+        """Add key to the set.
+
+        Returns:
+            added (bool): False if the key was already in the set
+
+        """
+        h = self._hash(key)
+        if h in self._delta or self.membership.contains_hash(h):
+            return False
+        self._delta.add(h)
+        return True
+
+    def __contains__(self, key):
+        h = self._hash(key)
+        return h in self._delta or self.membership.contains_hash(h)
+
+    def copy(self):
+        new = MembershipSet(self.membership, self.ecosystem)
+        new._delta = set(self._delta)
+        return new
+
+    def __len__(self):
+        return len(self.membership) + len(self._delta)
@@ -0,0 +1,262 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Counters and latency histograms of a fastensource run.
+
+All metrics are kept in the module-level registry `metrics` and have a name
+and labels (e.g. host, stage). They can be exported as JSON, or as a
+Prometheus textfile (for node_exporter's textfile collector).
+
+Example:
+    with timed('resolve', ecosystem='maven'):
+        dependencies = dependency_tree(pom)
+    metrics.incr('http_requests_total', host='pypi.org', status='200')
+"""
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager, ExitStack
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+           300)
+PREFIX = 'fastensource_'
+
+
+class Histogram:
+    """Latency histogram with fixed buckets."""
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = dict()
+        for bound, count in zip(BUCKETS + ('+Inf',), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and histograms."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = dict()
+        self.gauges = dict()
+        self.histograms = dict()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def incr(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the seconds spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def total(self, name):
+        """Return the sum of a counter over all its labels."""
+        with self._lock:
+            return sum(v for k, v in self.counters.items() if k[0] == name)
+
+    def by_label(self, name, label):
+        """Return the sums of a counter for each value of label."""
+        totals = dict()
+        with self._lock:
+            for (key, labels), value in self.counters.items():
+                if key != name:
+                    continue
+                labels = dict(labels)
+                if label in labels:
+                    totals[labels[label]] = (totals.get(labels[label], 0) +
+                                             value)
+        return totals
+
+    def reset(self, keep_gauges=False):
+        """Start a new run.
+
+        Args:
+            keep_gauges (bool): keep the gauges, which describe a state
+                (e.g. of the throttle) and not the run
+
+        """
+        with self._lock:
+            self.started = time.time()
+            self.counters.clear()
+            if not keep_gauges:
+                self.gauges.clear()
+            self.histograms.clear()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'elapsed': time.time() - self.started,
+                'counters': [{'name': k[0], 'labels': dict(k[1]),
+                              'value': v}
+                             for k, v in sorted(self.counters.items())],
+                'gauges': [{'name': k[0], 'labels': dict(k[1]), 'value': v}
+                           for k, v in sorted(self.gauges.items())],
+                'histograms': [dict(name=k[0], labels=dict(k[1]),
+                                    **v.to_dict())
+                               for k, v in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self):
+        """Return the metrics in Prometheus' text exposition format."""
+        def labels_text(labels, extra=()):
+            labels = list(labels) + list(extra)
+            if not labels:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(
+                k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                for k, v in labels) + '}'
+
+        lines = list()
+        with self._lock:
+            for kind, items in (('counter', self.counters),
+                                ('gauge', self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(items.items()):
+                    if name not in typed:
+                        lines.append('# TYPE {}{} {}'.format(PREFIX, name,
+                                                             kind))
+                        typed.add(name)
+                    lines.append('{}{}{} {}'.format(
+                        PREFIX, name, labels_text(labels), value))
+            typed = set()
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append('# TYPE {}{} histogram'.format(PREFIX, name))
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), hist.counts):
+                    cumulative += count
+                    lines.append('{}{}_bucket{} {}'.format(
+                        PREFIX, name,
+                        labels_text(labels, [('le', str(bound))]),
+                        cumulative))
+                lines.append('{}{}_sum{} {}'.format(
+                    PREFIX, name, labels_text(labels), hist.sum))
+                lines.append('{}{}_count{} {}'.format(
+                    PREFIX, name, labels_text(labels), hist.count))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+# Functions called with the name of each stage that starts, and return a
+# context manager that wraps the stage (see profiling.Profiler).
+stage_hooks = list()
+
+
+@contextmanager
+def _hooked(stage, labels):
+    with ExitStack() as stack:
+        for hook in list(stage_hooks):
+            stack.enter_context(hook(stage))
+        with metrics.timer('stage_seconds', stage=stage, **labels):
+            yield
+
+
+def timed(stage, **labels):
+    """Observe the duration of a stage (see Metrics.timer)."""
+    if stage_hooks:
+        return _hooked(stage, labels)
+    return metrics.timer('stage_seconds', stage=stage, **labels)
+
+
+def _write_atomic(path, content):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def export(json_path=None, prometheus_path=None):
+    """Write the metrics to the given files."""
+    if json_path:
+        _write_atomic(json_path, json.dumps(metrics.to_dict(), indent=2))
+    if prometheus_path:
+        _write_atomic(prometheus_path, metrics.to_prometheus())
+
+
+class MetricsWriter:
+    """Export the metrics every `interval` seconds, and when stopped.
+
+    Paths must be absolute because the commands change directory.
+    """
+    def __init__(self, json_path=None, prometheus_path=None, interval=60):
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            export(self.json_path, self.prometheus_path)
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        export(self.json_path, self.prometheus_path)
@@ -0,0 +1,232 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Selection of repository mirrors by measured latency and throughput.
+
+A MirrorSet holds the base urls of mirrors of the same repository (e.g.
+Maven Central and its mirrors). Each request goes to the mirror with the
+best score, which is its average latency plus the time to transfer the
+expected bytes at its average throughput. Mirrors that were not measured
+yet are tried first. A request fails over to the next mirror when a mirror
+does not have the file (404) or fails, and long-tail requests can be
+hedged: if the first mirror does not answer within the usual latency, the
+same request is sent to the second mirror too, and the first successful
+response wins.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from fastensource.utils.helpers import requests_get, ConnectionError
+from fastensource.utils.metrics import metrics
+
+MAVEN_MIRRORS = ['https://repo1.maven.org/maven2/']
+# Seconds added to the score of a mirror for each consecutive failure
+FAILURE_PENALTY = 5.0
+# Hedge after this quantile of the latencies of a mirror
+HEDGE_QUANTILE = 0.95
+MIN_HEDGE_DELAY = 0.05
+
+
+class MirrorStats:
+    """Latency and throughput of a mirror."""
+    __slots__ = ('latency', 'throughput', 'failures', 'samples')
+
+    def __init__(self):
+        # Moving averages, None until measured
+        self.latency = None
+        self.throughput = None
+        self.failures = 0
+        # Recent latencies, for the hedge delay
+        self.samples = list()
+
+    def score(self, size=0):
+        if self.latency is None:
+            return -1.0
+        score = self.latency + self.failures * FAILURE_PENALTY
+        if size and self.throughput:
+            score += size / self.throughput
+        return score
+
+
+class MirrorSet:
+    """Mirrors of a repository.
+
+    Args:
+        urls (list): base urls of the mirrors, ending with /
+        hedge (bool): send long-tail requests to a second mirror too
+        workers (int): threads of hedged requests
+
+    """
+    def __init__(self, urls, hedge=False, workers=8):
+        if len(urls) == 0:
+            raise ValueError('No mirrors')
+        self.urls = [url if url.endswith('/') else url + '/' for url in urls]
+        self.hedge = hedge and len(self.urls) > 1
+        self.stats = {url: MirrorStats() for url in self.urls}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._workers = workers
+
+    def ranked(self, size=0):
+        """Return the mirrors from the best to the worst."""
+        with self._lock:
+            return sorted(self.urls,
+                          key=lambda url: self.stats[url].score(size))
+
+    def url(self, path, size=0):
+        """Return the url of path on the best mirror."""
+        return self.ranked(size)[0] + path
+
+    def record(self, mirror, latency=None, size=0, elapsed=None,
+               failed=False):
+        """Update the statistics of a mirror.
+
+        Args:
+            mirror (str): base url of the mirror
+            latency (float): seconds until the response
+            size (int): bytes of the response
+            elapsed (float): seconds until the whole response was read
+            failed (bool): whether the request failed
+
+        """
+        with self._lock:
+            stats = self.stats[mirror]
+            if failed:
+                stats.failures += 1
+                metrics.incr('mirror_failures_total', mirror=mirror)
+                return
+            stats.failures = 0
+            if latency is not None:
+                stats.latency = latency if stats.latency is None else \
+                    0.8 * stats.latency + 0.2 * latency
+                stats.samples = (stats.samples + [latency])[-100:]
+                metrics.set('mirror_latency_seconds', stats.latency,
+                            mirror=mirror)
+            if size and elapsed:
+                rate = size / elapsed
+                stats.throughput = rate if stats.throughput is None else \
+                    0.8 * stats.throughput + 0.2 * rate
+
+    def hedge_delay(self, mirror):
+        """Return the seconds to wait for mirror before hedging."""
+        with self._lock:
+            samples = sorted(self.stats[mirror].samples)
+        if len(samples) < 5:
+            return None
+        index = min(int(len(samples) * HEDGE_QUANTILE), len(samples) - 1)
+        return max(samples[index], MIN_HEDGE_DELAY)
+
+    def _request(self, mirror, path):
+        """GET path from a mirror and measure it.
+
+        Returns:
+            response (requests.Response): or None if the request failed
+
+        """
+        start = time.perf_counter()
+        try:
+            r = requests_get(mirror + path)
+        except ConnectionError:
+            self.record(mirror, failed=True)
+            return None
+        elapsed = time.perf_counter() - start
+        if r.status_code >= 500:
+            self.record(mirror, failed=True)
+        else:
+            self.record(mirror, r.elapsed.total_seconds(), len(r.content),
+                        elapsed)
+        return r
+
+    def _first(self, mirrors, path):
+        """Request path from mirrors[0], hedged with mirrors[1].
+
+        Returns:
+            response: the first successful response, or the response of
+                the first mirror
+            rest (list): mirrors that were not tried
+
+        """
+        if not self.hedge or len(mirrors) < 2:
+            return self._request(mirrors[0], path), mirrors[1:]
+        delay = self.hedge_delay(mirrors[0])
+        if delay is None:
+            return self._request(mirrors[0], path), mirrors[1:]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._workers)
+        primary = self._executor.submit(self._request, mirrors[0], path)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result(), mirrors[1:]
+        metrics.incr('mirror_hedges_total')
+        secondary = self._executor.submit(self._request, mirrors[1], path)
+        pending = {primary, secondary}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                r = future.result()
+                if r is not None and r.status_code == 200:
+                    if future is secondary:
+                        metrics.incr('mirror_hedge_wins_total')
+                    return r, mirrors[2:]
+        return primary.result(), mirrors[2:]
+
+    def get(self, path, size=0):
+        """GET path from the best mirror that has it.
+
+        Args:
+            path (str): path relative to the base urls
+            size (int): expected bytes, to rank the mirrors
+
+        Raises:
+            ConnectionError: If all the mirrors failed.
+
+        Returns:
+            response (requests.Response): the first successful response,
+                or a 404 response if no mirror has path
+
+        """
+        mirrors = self.ranked(size)
+        last = None
+        while mirrors:
+            r, mirrors = self._first(mirrors, path)
+            if r is not None:
+                last = r
+                if r.status_code < 400:
+                    return r
+            if mirrors:
+                metrics.incr('mirror_failovers_total')
+        if last is None:
+            raise ConnectionError
+        return last
+
+    def probe(self, path=''):
+        """Measure the latency of each mirror with a request for path."""
+        for mirror in self.urls:
+            self._request(mirror, path)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
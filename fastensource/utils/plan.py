@@ -0,0 +1,221 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Download plans.
+
+A plan is the transitive closure of (project, version) pairs of a projects
+file, resolved from metadata only, with the files and the estimated size of
+each artifact. It is written with `--plan' and downloaded later with
+`--execute-plan', so the same plan can be used as a dry run to estimate the
+bytes and the time of a run before any artifact is downloaded.
+
+The plan file is JSON:
+    {"version": 1, "ecosystem": "maven", "roots": [[project, version]],
+     "nodes": [{"project": ..., "version": ..., "size": ..., "urls": [...],
+                "depends": [[project, version]], ...}]}
+"""
+import os
+import json
+import heapq
+from collections import OrderedDict
+from fastensource.utils.progress import format_bytes, format_duration
+
+PLAN_VERSION = 1
+ORDERS = ('size', 'topological', 'plan')
+# Assumptions of the time estimate, unless the user gives them.
+DEFAULT_BANDWIDTH = 10 * 1024 * 1024  # bytes per second
+DEFAULT_LATENCY = 0.5  # seconds of overhead of each artifact
+
+
+class PlanError(Exception):
+    """Raised when a plan file cannot be used."""
+
+
+class Plan:
+    """The deduplicated download graph of a run.
+
+    Args:
+        ecosystem (str): the command that made the plan (e.g. maven)
+
+    """
+    def __init__(self, ecosystem):
+        self.ecosystem = ecosystem
+        self.roots = list()
+        self.nodes = OrderedDict()
+
+    def add(self, project, version, size=None, urls=(), depends=(),
+            **info):
+        """Add an artifact to the plan, unless it already exists.
+
+        Args:
+            project (str): project name
+            version (str): resolved version (never Unspecified)
+            size (int): bytes to download, None if unknown
+            urls (list): files of the artifact
+            depends (list): of (project, version) tuples
+            info: extra fields that the command needs to download it
+
+        Returns:
+            node (dict): the node of the artifact
+
+        """
+        key = (project, version)
+        if key not in self.nodes:
+            node = dict(info, project=project, version=version, size=size,
+                        urls=list(urls),
+                        depends=[tuple(dep) for dep in depends])
+            self.nodes[key] = node
+        return self.nodes[key]
+
+    def __contains__(self, key):
+        return tuple(key) in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes.values())
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def total_bytes(self):
+        """Return the sum of the known sizes, and the number of artifacts
+        of unknown size.
+        """
+        sizes = [node['size'] for node in self]
+        return (sum(s for s in sizes if s is not None),
+                sum(1 for s in sizes if s is None))
+
+    def order(self, order='size'):
+        """Return the nodes in download order.
+
+        Args:
+            order (str): size -- largest first, which keeps parallel
+                downloads busy until the end; topological -- dependencies
+                before their dependents; plan -- in resolution order
+
+        Returns:
+            nodes (list)
+
+        """
+        nodes = list(self)
+        if order == 'size':
+            return sorted(nodes, key=lambda n: -(n['size'] or 0))
+        if order == 'topological':
+            return self._topological()
+        return nodes
+
+    def _topological(self):
+        pending = {key: sum(1 for d in node['depends'] if d in self.nodes)
+                   for key, node in self.nodes.items()}
+        dependents = dict()
+        for key, node in self.nodes.items():
+            for dep in node['depends']:
+                if dep in self.nodes:
+                    dependents.setdefault(dep, list()).append(key)
+        ready = [key for key, count in pending.items() if count == 0]
+        ordered = list()
+        while ready:
+            key = ready.pop(0)
+            ordered.append(key)
+            for dependent in dependents.get(key, ()):
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        # Dependency cycles: the rest in resolution order.
+        done = set(ordered)
+        ordered += [key for key in self.nodes if key not in done]
+        return [self.nodes[key] for key in ordered]
+
+    def estimate(self, jobs=1, bandwidth=DEFAULT_BANDWIDTH,
+                 latency=DEFAULT_LATENCY):
+        """Estimate the seconds to download the plan.
+
+        Artifacts are assigned largest first to the least loaded of `jobs'
+        workers, each with an equal share of the bandwidth; artifacts of
+        unknown size count as the average known size.
+
+        Args:
+            jobs (int): parallel downloads
+            bandwidth (float): bytes per second of the whole run
+            latency (float): seconds of overhead of each artifact
+
+        Returns:
+            seconds (float)
+
+        """
+        known = [n['size'] for n in self if n['size'] is not None]
+        average = sum(known) / len(known) if known else 0
+        sizes = sorted((n['size'] if n['size'] is not None else average
+                        for n in self), reverse=True)
+        share = bandwidth / max(jobs, 1)
+        workers = [0.0] * max(min(jobs, len(sizes)), 1)
+        for size in sizes:
+            heapq.heapreplace(workers, workers[0] + latency + size / share)
+        return max(max(workers), sum(sizes) / bandwidth)
+
+    def summary(self, jobs=1, bandwidth=DEFAULT_BANDWIDTH):
+        """Return a one line description of the plan."""
+        size, unknown = self.total_bytes()
+        text = '{} artifacts, {}'.format(len(self), format_bytes(size))
+        if unknown:
+            text += ' ({} of unknown size)'.format(unknown)
+        text += ', about {} with {} jobs at {}/s'.format(
+            format_duration(self.estimate(jobs, bandwidth)), jobs,
+            format_bytes(bandwidth)
+        )
+        return text
+
+    def to_dict(self):
+        return {'version': PLAN_VERSION, 'ecosystem': self.ecosystem,
+                'roots': [list(root) for root in self.roots],
+                'nodes': [dict(node, depends=[list(d)
+                                              for d in node['depends']])
+                          for node in self]}
+
+    def save(self, path):
+        """Write the plan to path atomically."""
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a plan file.
+
+        Raises:
+            PlanError: if the file is not a plan of a known version.
+
+        """
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise PlanError('Cannot read plan {}: {}'.format(path, e))
+        if not isinstance(data, dict) or \
+           data.get('version') != PLAN_VERSION:
+            raise PlanError('{} is not a version {} plan'.format(
+                path, PLAN_VERSION))
+        plan = cls(data['ecosystem'])
+        plan.roots = [tuple(root) for root in data['roots']]
+        for node in data['nodes']:
+            plan.add(**node)
+        return plan
@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Profiling of fastensource runs.
+
+Two profilers are available:
+    cprofile  deterministic profile (cProfile), saved as a .prof file
+              (open it with pstats or snakeviz)
+    sampling  samples the stack of the profiled thread, and saves it as a
+              .collapsed file (render it with flamegraph.pl or speedscope)
+
+Both can be restricted to the stages of the download process (see
+metrics.timed), e.g. to profile only the parsing of pages.
+"""
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from fastensource.utils import metrics
+
+PROFILERS = ('cprofile', 'sampling', 'both')
+# Groups of stages that can be profiled together
+STAGE_GROUPS = {
+    'io': ('download', 'move', 'versions'),
+    'parsing': ('parse',),
+    'resolution': ('resolve', 'version', 'udd'),
+}
+STAGES = ('download', 'move', 'parse', 'resolve', 'timestamp', 'udd',
+          'version', 'versions')
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+
+
+class SamplingProfiler:
+    """Sample the stack of a thread every `interval` seconds."""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.active = False
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            stack = list()
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def write(self, path):
+        """Write the samples in the collapsed stack format."""
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('{} {}\n'.format(stack, count))
+
+
+class Profiler:
+    """Profile a run and write the results to a directory.
+
+    Args:
+        directory (str): directory to save the profiles
+        profiler (str): cprofile, sampling, or both
+        stages (list): profile only these stages or groups of stages
+            (see STAGES, STAGE_GROUPS); None to profile the whole run
+        interval (float): seconds between samples of the sampling profiler
+
+    Example:
+        with Profiler('profiles', stages=['parsing']):
+            Maven(args).run()
+
+    """
+    def __init__(self, directory, profiler='both', stages=None,
+                 interval=0.005):
+        self.directory = os.path.abspath(directory)
+        self.stages = None
+        if stages:
+            self.stages = set()
+            for stage in stages:
+                self.stages.update(STAGE_GROUPS.get(stage, (stage,)))
+        self.cprofile = None
+        self.sampling = None
+        if profiler in ('cprofile', 'both'):
+            import cProfile
+            self.cprofile = cProfile.Profile()
+        if profiler in ('sampling', 'both'):
+            self.sampling = SamplingProfiler(interval)
+        self._depth = 0
+        self._thread_id = None
+        self.paths = list()
+
+    def _enable(self):
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        if self.sampling is not None:
+            self.sampling.active = True
+
+    def _disable(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.sampling is not None:
+            self.sampling.active = False
+
+    @contextmanager
+    def _stage_hook(self, stage):
+        """Profile only while a selected stage runs (stages may nest)."""
+        selected = (stage in self.stages and
+                    threading.get_ident() == self._thread_id)
+        if selected:
+            self._depth += 1
+            if self._depth == 1:
+                self._enable()
+        try:
+            yield
+        finally:
+            if selected:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._disable()
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread_id = threading.get_ident()
+        if self.sampling is not None:
+            self.sampling.start()
+        if self.stages is None:
+            self._enable()
+        else:
+            self._disable()
+            metrics.stage_hooks.append(self._stage_hook)
+        return self
+
+    def __exit__(self, *exc):
+        if self.stages is None:
+            self._disable()
+        else:
+            metrics.stage_hooks.remove(self._stage_hook)
+            if self._depth > 0:
+                self._disable()
+        name = os.path.join(self.directory, 'fastensource-{}-{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(name + '.prof')
+            import pstats
+            with open(name + '.txt', 'w') as f:
+                stats = pstats.Stats(name + '.prof', stream=f)
+                stats.sort_stats('cumulative').print_stats(50)
+            self.paths.extend([name + '.prof', name + '.txt'])
+        if self.sampling is not None:
+            self.sampling.stop()
+            self.sampling.write(name + '.collapsed')
+            self.paths.append(name + '.collapsed')
+        sys.stderr.write('Profiles saved to {}\n'.format(
+            ', '.join(self.paths)))
+        return False
@@ -0,0 +1,150 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Progress reporting of the download frontier.
+
+The reporter is updated every time a project is taken from the frontier,
+and renders at most every `interval` seconds, either as a single TTY line
+or as JSON lines. Rates and byte counts are read from the run metrics.
+"""
+import sys
+import json
+import time
+from fastensource.utils.metrics import metrics
+
+MODES = ('auto', 'tty', 'json', 'none')
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024.0
+    return '{:.1f} TB'.format(size)
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--:--:--'
+    seconds = int(seconds)
+    return '{:02d}:{:02d}:{:02d}'.format(seconds // 3600,
+                                         seconds % 3600 // 60, seconds % 60)
+
+
+class ProgressReporter:
+    """Report processed, pending and discovered projects of a run.
+
+    Pending projects include the rows of the projects file that were not
+    read yet (one project each), so the ETA covers the whole file.
+
+    Args:
+        name (str): name of the run (e.g. maven)
+        mode (str): tty, json, none, or auto (tty if stream is a terminal)
+        interval (float): minimum seconds between two reports
+        stream (file): where to write the reports
+        registry (Metrics): where to read the rates (default: the run
+            metrics)
+
+    """
+    def __init__(self, name, mode='auto', interval=2, stream=None,
+                 registry=None):
+        self.name = name
+        self.metrics = registry or metrics
+        self.stream = stream or sys.stderr
+        if mode == 'auto':
+            mode = 'tty' if self.stream.isatty() else 'none'
+        self.mode = mode
+        self.interval = interval
+        self.started = time.monotonic()
+        self.processed = 0
+        self.pending = 0
+        self._last = 0
+        self._last_requests = dict()
+        self._width = 0
+
+    def update(self, processed, pending):
+        """Record the state of the frontier, and render if it is time."""
+        self.processed = processed
+        self.pending = pending
+        if self.mode == 'none':
+            return
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self.render(now)
+
+    def snapshot(self, now=None):
+        """Return the current progress as a dict."""
+        now = now or time.monotonic()
+        elapsed = now - self.started
+        requests = self.metrics.by_label('http_requests_total', 'host')
+        window = now - self._last if self._last else elapsed
+        host_rates = {
+            host: (count - self._last_requests.get(host, 0)) / window
+            for host, count in requests.items()
+        } if window > 0 else {}
+        self._last_requests = requests
+        artifacts = self.metrics.total('artifacts_total')
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        eta = self.pending / rate if rate > 0 else None
+        return {
+            'run': self.name,
+            'elapsed': round(elapsed, 1),
+            'processed': self.processed,
+            'pending': self.pending,
+            'discovered': self.processed + self.pending,
+            'artifacts': artifacts,
+            'artifacts_per_sec': round(artifacts / elapsed, 3)
+            if elapsed > 0 else 0.0,
+            'bytes': self.metrics.total('http_response_bytes_total'),
+            'host_requests_per_sec': {h: round(r, 2)
+                                      for h, r in host_rates.items()},
+            'eta': round(eta, 1) if eta is not None else None,
+        }
+
+    def render(self, now=None):
+        now = now or time.monotonic()
+        data = self.snapshot(now)
+        self._last = now
+        if self.mode == 'json':
+            self.stream.write(json.dumps(data) + '\n')
+        elif self.mode == 'tty':
+            hosts = ' '.join('{} {:.1f}/s'.format(h, r) for h, r in
+                             sorted(data['host_requests_per_sec'].items()))
+            line = ('[{run}] {processed} done, {pending} pending, '
+                    '{discovered} found | {size} | {artifacts_per_sec:.2f} '
+                    'art/s | {hosts} | ETA {remaining}'.format(
+                        size=format_bytes(data['bytes']), hosts=hosts or '-',
+                        remaining=format_duration(data['eta']), **data))
+            padding = ' ' * max(0, self._width - len(line))
+            self._width = len(line)
+            self.stream.write('\r' + line + padding)
+        self.stream.flush()
+
+    def finish(self):
+        """Render the final state."""
+        if self.mode == 'none':
+            return
+        self.render()
+        if self.mode == 'tty':
+            self.stream.write('\n')
+            self.stream.flush()
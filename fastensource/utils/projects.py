@@ -0,0 +1,161 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Streaming reader of projects files.
+
+Projects files can be dependency exports with millions of rows, where the
+same project appears in many rows. They are read lazily, row by row, and
+each (project, version) pair is yielded once, so the memory that is needed
+depends on the number of distinct pairs and not on the size of the file.
+"""
+import csv
+from itertools import islice
+
+
+class HashedSet:
+    """A set of (project, version) pairs that stores only their hashes.
+
+    A 64-bit hash takes a fraction of the memory of a tuple of two strings.
+    Two pairs with the same hash are taken as the same pair, which is
+    negligible (about 1 in 10^6 for 10^7 pairs) for de-duplication.
+    """
+    __slots__ = ('_hashes',)
+
+    def __init__(self, keys=()):
+        self._hashes = set()
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        """Add key to the set.
+
+        Returns:
+            added (bool): False if the key was already in the set
+
+        """
+        h = hash(tuple(key))
+        if h in self._hashes:
+            return False
+        self._hashes.add(h)
+        return True
+
+    def __contains__(self, key):
+        return hash(tuple(key)) in self._hashes
+
+    def copy(self):
+        new = HashedSet()
+        new._hashes = set(self._hashes)
+        return new
+
+    def __len__(self):
+        return len(self._hashes)
+
+
+def parse_row(row, mode):
+    """Return the (project, version) pairs of a row of a projects file.
+
+    Args:
+        row (list): the fields of the row
+        mode (int): 1, 2, or 3 (see README)
+
+    Returns:
+        projects (list): of tuples with project, version
+
+    """
+    if len(row) == 0:
+        return []
+    if mode == 1:
+        return [(row[0], 'Unspecified')]
+    if mode == 2:
+        return [(row[0], row[1])]
+    # mode 3: project,version;dependency,version
+    return [tuple(field.split(',')[:2]) for field in row[:2]]
+
+
+def read_projects(path, mode, seen=None):
+    """Yield each (project, version) pair of a projects file once.
+
+    Args:
+        path (str): the projects file
+        mode (int): 1, 2, or 3 (see README)
+        seen (HashedSet): pairs to skip; the yielded pairs are added to it
+
+    Returns:
+        projects (ProjectsReader): iterator of tuples with project, version
+
+    """
+    return ProjectsReader(path, mode, seen)
+
+
+class ProjectsReader:
+    """Iterator of the pairs of a projects file (see read_projects) that
+    counts the rows that were read.
+    """
+    def __init__(self, path, mode, seen=None):
+        self.path = path
+        self.mode = mode
+        self.seen = HashedSet() if seen is None else seen
+        self.rows_read = 0
+        self._rows = None
+        self._projects = self._read()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._projects)
+
+    def _read(self):
+        with open(self.path, 'r', newline='') as f:
+            for row in csv.reader(f, delimiter=';'):
+                self.rows_read += 1
+                for project in parse_row(row, self.mode):
+                    if self.seen.add(project):
+                        yield project
+
+    def unread_rows(self):
+        """Return the rows that were not read yet.
+
+        The rows of the file are counted once, on the first call, by
+        reading it in binary.
+        """
+        if self._rows is None:
+            self._rows = count_rows(self.path)
+        return max(self._rows - self.rows_read, 0)
+
+
+def count_rows(path):
+    """Return the lines of a file, without decoding or parsing it."""
+    rows = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            rows += block.count(b'\n')
+            last = block[-1:]
+    # A last line without a newline
+    return rows + (last != b'\n')
+
+
+def take(projects, size):
+    """Return the next `size' projects of an iterator as a list."""
+    return list(islice(projects, size))
@@ -0,0 +1,284 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Local caching proxy for the upstreams of fastensource.
+
+The proxy serves:
+    /maven2/<path>    the Maven repository layout (see maven.get_url)
+    /simple/<name>/   the PyPI simple index, with file links rewritten to
+                      /packages/ so that sdists go through the proxy
+    /packages/<path>  files from files.pythonhosted.org
+    http://<url>      any absolute url, when used as an HTTP proxy
+                      (e.g. apt-get -o Acquire::http::Proxy=...)
+    /_stats           cache statistics in JSON
+
+Artifacts are saved under the cache directory and kept forever. Index
+files (PyPI simple pages, apt dists/ files, maven-metadata.xml) are
+refreshed after index_ttl seconds. URLs that differ only in their query
+are cached as different files. Concurrent requests for the same file
+result in a single upstream request.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from urllib.parse import urlsplit, quote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from fastensource.utils.helpers import get_session
+
+UPSTREAMS = {
+    'maven2': 'https://repo1.maven.org/maven2/',
+    'simple': 'https://pypi.org/simple/',
+    'packages': 'https://files.pythonhosted.org/packages/',
+}
+
+
+class ProxyStats:
+    """Thread-safe counters of the proxy."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0, 'hits': 0, 'misses': 0, 'coalesced': 0,
+            'errors': 0, 'bytes_served': 0, 'bytes_fetched': 0,
+        }
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def report(self):
+        with self._lock:
+            report = dict(self.counters)
+        lookups = report['hits'] + report['misses'] + report['coalesced']
+        report['hit_rate'] = ((report['hits'] + report['coalesced']) /
+                              lookups if lookups else 0.0)
+        return report
+
+
+class CachingProxy:
+    """Fetch upstream files into a cache directory.
+
+    Args:
+        cache_dir (str): directory to save the files
+        upstreams (dict): prefix: upstream url
+        index_ttl (int): seconds before an index file is fetched again
+
+    """
+    def __init__(self, cache_dir, upstreams=None, index_ttl=600):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.upstreams = dict(UPSTREAMS)
+        if upstreams:
+            self.upstreams.update(upstreams)
+        self.index_ttl = index_ttl
+        self.stats = ProxyStats()
+        self._lock = threading.Lock()
+        self._inflight = dict()
+
+    def resolve(self, path):
+        """Map a request path to an upstream url and a cache file.
+
+        Returns:
+            url (str): upstream url, or None if the path is not proxied
+            cache_path (str): file in the cache directory
+
+        """
+        parts = urlsplit(path)
+        if path.startswith('http://') or path.startswith('https://'):
+            url = path
+            relative = 'proxy/' + parts.netloc + parts.path
+        else:
+            path = parts.path.lstrip('/')
+            prefix = path.split('/', 1)[0]
+            if prefix not in self.upstreams:
+                return None, None
+            url = self.upstreams[prefix] + path[len(prefix) + 1:]
+            if parts.query:
+                url += '?' + parts.query
+            relative = path
+        if relative.endswith('/'):
+            relative += 'index.html'
+        relative = os.path.normpath(relative)
+        if relative.startswith('..') or os.path.isabs(relative):
+            return None, None
+        if parts.query:
+            # Each query is another file; paths cannot contain a ? (it
+            # would be percent-encoded), so they do not collide.
+            relative += '?' + hashlib.sha1(
+                parts.query.encode('utf-8')).hexdigest()[:16]
+        return url, os.path.join(self.cache_dir, relative)
+
+    def is_index(self, url):
+        """Check if url is a mutable index file."""
+        path = urlsplit(url).path
+        return (url.startswith(self.upstreams['simple']) or
+                '/dists/' in path or
+                path.endswith('maven-metadata.xml'))
+
+    def _is_fresh(self, url, cache_path):
+        if not os.path.isfile(cache_path):
+            return False
+        if not self.is_index(url):
+            return True
+        return time.time() - os.path.getmtime(cache_path) < self.index_ttl
+
+    def _fetch(self, url, cache_path):
+        """Download url to cache_path.
+
+        Returns:
+            status (int): upstream status code
+
+        """
+        response = get_session().get(url, stream=True)
+        try:
+            if response.status_code != 200:
+                return response.status_code
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+                    self.stats.incr('bytes_fetched', len(chunk))
+            os.replace(tmp, cache_path)
+            return 200
+        finally:
+            response.close()
+
+    def get(self, path):
+        """Make sure that the file of path is in the cache.
+
+        Returns:
+            status (int): 200 if the file is in the cache, otherwise the
+            upstream status code
+            cache_path (str): file in the cache directory
+
+        """
+        self.stats.incr('requests')
+        url, cache_path = self.resolve(path)
+        if url is None:
+            return 404, None
+        if self._is_fresh(url, cache_path):
+            self.stats.incr('hits')
+            return 200, cache_path
+        with self._lock:
+            event = self._inflight.get(cache_path)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[cache_path] = event
+        if not leader:
+            event.wait()
+            if os.path.isfile(cache_path):
+                self.stats.incr('coalesced')
+                return 200, cache_path
+            self.stats.incr('errors')
+            return 502, None
+        try:
+            self.stats.incr('misses')
+            try:
+                status = self._fetch(url, cache_path)
+            except Exception:
+                status = 502
+            if status != 200:
+                self.stats.incr('errors')
+                # Serve a stale index instead of failing.
+                if os.path.isfile(cache_path):
+                    return 200, cache_path
+                return status, None
+            return 200, cache_path
+        finally:
+            with self._lock:
+                del self._inflight[cache_path]
+            event.set()
+
+    def rewrite_simple(self, content, base):
+        """Point the file links of a simple index page to the proxy."""
+        return content.replace(self.upstreams['packages'].encode('utf-8'),
+                               (base + '/packages/').encode('utf-8'))
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    proxy = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_file(self, cache_path, head):
+        with open(cache_path, 'rb') as f:
+            content = None
+            size = os.fstat(f.fileno()).st_size
+            if self.path.startswith('/simple/'):
+                base = 'http://' + self.headers.get(
+                    'Host', '{}:{}'.format(*self.server.server_address)
+                )
+                content = self.proxy.rewrite_simple(f.read(), base)
+                size = len(content)
+            self.send_response(200)
+            self.send_header('Content-Length', str(size))
+            if self.path.startswith('/simple/'):
+                self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            if head:
+                return
+            if content is not None:
+                self.wfile.write(content)
+            else:
+                shutil.copyfileobj(f, self.wfile, 1 << 16)
+            self.proxy.stats.incr('bytes_served', size)
+
+    def _handle(self, head=False):
+        if self.path == '/_stats':
+            content = json.dumps(self.proxy.stats.report()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(content)
+            return
+        status, cache_path = self.proxy.get(quote(self.path, safe=':/?=&%+'))
+        if status != 200:
+            self.send_error(status)
+            return
+        self._send_file(cache_path, head)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_HEAD(self):
+        self._handle(head=True)
+
+
+def make_server(proxy, host='127.0.0.1', port=3142):
+    """Create the HTTP server of a CachingProxy.
+
+    Returns:
+        server (ThreadingHTTPServer)
+
+    """
+    handler = type('Handler', (ProxyHandler,), {'proxy': proxy})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,552 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Resolution of PyPI dependencies from index metadata.
+
+`pip download --no-binary=:all:' may build every candidate sdist to find
+its dependencies. MetadataResolver finds the closure of a project from the
+simple index instead (PEP 691 JSON, or the HTML of PEP 503):
+
+1. The project pages list the sdists of each project; the newest version
+   that satisfies all the requirements on the project is chosen.
+2. The requirements of a sdist come from its PEP 658 metadata file, or
+   else from the sdist itself: static PKG-INFO (PEP 643), the requires.txt
+   of setuptools, pyproject.toml (PEP 621) or setup.cfg.
+3. Each level of the closure is fetched concurrently, and the chosen
+   sdists are downloaded concurrently.
+
+There is no backtracking: conflicting requirements and sdists whose
+requirements are only known by running setup.py raise ResolutionError, so
+that the caller can fall back to pip. It needs the packaging library.
+"""
+import os
+import json
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import platform
+import threading
+import configparser
+from collections import namedtuple
+from email.parser import HeaderParser
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from packaging.markers import default_environment
+from packaging.requirements import Requirement, InvalidRequirement
+from packaging.specifiers import SpecifierSet, InvalidSpecifier
+from packaging.version import Version, InvalidVersion
+from fastensource.utils.helpers import send_request, download_file,\
+        find_name_version_pypi, ConnectionError
+from fastensource.utils.feeds import normalize_pypi_name
+from fastensource.utils.metrics import metrics
+
+DEFAULT_INDEX = 'https://pypi.org/simple/'
+SIMPLE_JSON = 'application/vnd.pypi.simple.v1+json'
+ACCEPT = ', '.join([SIMPLE_JSON, 'application/vnd.pypi.simple.v1+html;q=0.2',
+                    'text/html;q=0.1'])
+SDIST_SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.zip')
+
+# A sdist in a project page
+Candidate = namedtuple('Candidate', ['filename', 'url', 'version',
+                                     'requires_python', 'metadata',
+                                     'yanked'])
+# A resolved sdist; depends are the (name, version) of its dependencies
+Distribution = namedtuple('Distribution', ['name', 'version', 'filename',
+                                           'url', 'depends'])
+
+
+class ResolutionError(Exception):
+    """The dependencies cannot be resolved from the metadata."""
+
+
+class DynamicMetadata(ResolutionError):
+    """The requirements of a sdist are only known by building it."""
+
+
+class _Links(HTMLParser):
+    """Collect the anchors of a PEP 503 page."""
+    def __init__(self):
+        super(_Links, self).__init__()
+        self.anchors = list()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self.anchors.append(dict(attrs))
+
+
+def sdist_version(filename, name):
+    """Return the version of a sdist of project name, or None if filename
+    is not one.
+    """
+    lower = filename.lower()
+    for suffix in SDIST_SUFFIXES:
+        if lower.endswith(suffix):
+            stem = filename[:-len(suffix)]
+            break
+    else:
+        return None
+    if '-' not in stem:
+        return None
+    project, version = stem.rsplit('-', 1)
+    if normalize_pypi_name(project) != normalize_pypi_name(name):
+        return None
+    return version
+
+
+def parse_page(content, content_type, url, name):
+    """Parse a PEP 691 JSON or a PEP 503 HTML project page.
+
+    Returns:
+        candidates (list): of Candidate, for the sdists of the page
+
+    """
+    files = list()
+    if content_type.startswith(SIMPLE_JSON):
+        for f in json.loads(content.decode('utf-8'))['files']:
+            metadata = f.get('core-metadata', f.get('dist-info-metadata'))
+            files.append((f['filename'], urljoin(url, f['url']),
+                          f.get('requires-python'), bool(metadata),
+                          bool(f.get('yanked'))))
+    else:
+        links = _Links()
+        links.feed(content.decode('utf-8', 'replace'))
+        for a in links.anchors:
+            if 'href' not in a:
+                continue
+            href = urljoin(url, a['href'])
+            filename = urlsplit(href).path.rsplit('/', 1)[-1]
+            metadata = a.get('data-core-metadata',
+                             a.get('data-dist-info-metadata'))
+            files.append((filename, href, a.get('data-requires-python'),
+                          metadata not in (None, 'false'),
+                          'data-yanked' in a))
+    candidates = list()
+    for filename, href, requires_python, metadata, yanked in files:
+        version = sdist_version(filename, name)
+        if version is None:
+            continue
+        try:
+            Version(version)
+        except InvalidVersion:
+            continue
+        candidates.append(Candidate(filename, href, version,
+                                    requires_python, metadata, yanked))
+    return candidates
+
+
+def parse_requires_txt(text):
+    """Convert the requires.txt of setuptools to requirement strings."""
+    requirements = list()
+    section = ''
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('['):
+            section = line.strip('[]')
+            continue
+        extra, _, marker = section.partition(':')
+        markers = list()
+        if marker:
+            markers.append('({})'.format(marker))
+        if extra:
+            markers.append('extra == "{}"'.format(extra))
+        if markers:
+            line = '{}; {}'.format(line, ' and '.join(markers))
+        requirements.append(line)
+    return requirements
+
+
+def _setup_cfg_requirements(text):
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_string(text)
+    if not config.has_option('options', 'install_requires'):
+        return None
+    install_requires = config.get('options', 'install_requires')
+    extras_require = list()
+    if config.has_section('options.extras_require'):
+        extras_require = config.items('options.extras_require')
+    # e.g. install_requires = file: requirements.txt
+    for value in [install_requires] + [v for _, v in extras_require]:
+        if value.strip().startswith(('file:', 'attr:')):
+            raise DynamicMetadata('setup.cfg reads {}'.format(
+                value.strip()))
+    requirements = [line.strip() for line in install_requires.splitlines()
+                    if line.strip() and not line.strip().startswith('#')]
+    if extras_require:
+        for extra, value in extras_require:
+            for line in value.splitlines():
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                requirement, _, marker = line.partition(';')
+                marker = 'extra == "{}"'.format(extra) + (
+                    ' and ({})'.format(marker.strip()) if marker else '')
+                requirements.append('{}; {}'.format(requirement, marker))
+    return requirements
+
+
+def _pyproject_requirements(text):
+    try:
+        import tomllib
+    except ImportError:
+        return None
+    project = tomllib.loads(text).get('project')
+    if not project or 'dependencies' in project.get('dynamic', []):
+        return None
+    requirements = list(project.get('dependencies', []))
+    for extra, values in project.get('optional-dependencies', {}).items():
+        for value in values:
+            requirement, _, marker = value.partition(';')
+            marker = 'extra == "{}"'.format(extra) + (
+                ' and ({})'.format(marker.strip()) if marker else '')
+            requirements.append('{}; {}'.format(requirement, marker))
+    return requirements
+
+
+def _static_requires_dist(pkg_info):
+    """Return the Requires-Dist of a metadata file if they are static."""
+    message = HeaderParser().parsestr(pkg_info)
+    requires = message.get_all('Requires-Dist') or []
+    dynamic = [d.lower() for d in message.get_all('Dynamic') or []]
+    try:
+        metadata_version = Version(message.get('Metadata-Version', '1.0'))
+    except InvalidVersion:
+        metadata_version = Version('1.0')
+    # PEP 643: from 2.2, fields not marked as dynamic are final.
+    if metadata_version >= Version('2.2') and 'requires-dist' not in dynamic:
+        return requires
+    # Older setuptools wrote the requirements it computed at build time.
+    return requires or None
+
+
+def read_sdist_requirements(path):
+    """Find the requirements of a sdist without building it.
+
+    Args:
+        path (str): the sdist
+
+    Raises:
+        DynamicMetadata: If only setup.py knows the requirements.
+        ResolutionError: If the sdist or its metadata cannot be parsed.
+
+    Returns:
+        requirements (list): requirement strings
+
+    """
+    try:
+        return _read_sdist_requirements(path)
+    except ResolutionError:
+        raise
+    except (tarfile.TarError, zipfile.BadZipFile, configparser.Error,
+            EOFError, OSError, ValueError) as e:
+        # ValueError includes the TOMLDecodeError of tomllib
+        raise ResolutionError('Cannot read {}: {}'.format(
+            os.path.basename(path), e))
+
+
+def _read_sdist_requirements(path):
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            members = [(info.filename, info) for info in archive.infolist()]
+            read = lambda info: archive.read(info)  # noqa: E731
+            found = _sdist_files(members, read)
+    else:
+        with tarfile.open(path, 'r|*') as tar:
+            members = ((member.name, member) for member in tar
+                       if member.isfile() or member.name.endswith('/'))
+            read = lambda member: tar.extractfile(member).read()  # noqa
+            found = _sdist_files(members, read)
+    wanted, has_setup_py = found
+    text = {key: value.decode('utf-8', 'replace')
+            for key, value in wanted.items()}
+    if 'PKG-INFO' in text:
+        requires = _static_requires_dist(text['PKG-INFO'])
+        if requires is not None:
+            return requires
+    if 'requires.txt' in text:
+        return parse_requires_txt(text['requires.txt'])
+    if 'pyproject.toml' in text:
+        requires = _pyproject_requirements(text['pyproject.toml'])
+        if requires is not None:
+            return requires
+    if 'setup.cfg' in text:
+        requires = _setup_cfg_requirements(text['setup.cfg'])
+        if requires is not None:
+            return requires
+    if has_setup_py:
+        raise DynamicMetadata('{} needs setup.py'.format(
+            os.path.basename(path)))
+    return []
+
+
+def _sdist_files(members, read):
+    """Read the metadata files of a sdist from its members, in one pass.
+
+    Returns:
+        files (dict): PKG-INFO, requires.txt, pyproject.toml, setup.cfg
+        has_setup_py (bool)
+
+    """
+    files = dict()
+    has_setup_py = False
+    for name, member in members:
+        parts = name.strip('/').split('/')
+        if len(parts) == 2 and parts[1] in ('PKG-INFO', 'pyproject.toml',
+                                            'setup.cfg'):
+            files[parts[1]] = read(member)
+        elif len(parts) == 2 and parts[1] == 'setup.py':
+            has_setup_py = True
+        elif len(parts) in (3, 4) and parts[-2].endswith('.egg-info') and\
+                parts[-1] == 'requires.txt':
+            files['requires.txt'] = read(member)
+    return files, has_setup_py
+
+
+class MetadataResolver:
+    """Resolve the sdists of projects and their dependencies from index
+    metadata.
+
+    The project pages, the requirements and the downloaded sdists are
+    cached for the whole run.
+
+    Args:
+        index (str): url of the simple index
+        jobs (int): concurrent requests
+        environment (dict): of markers (default: this interpreter)
+
+    """
+    def __init__(self, index=DEFAULT_INDEX, jobs=8, environment=None):
+        self.index = index if index.endswith('/') else index + '/'
+        self.environment = environment or default_environment()
+        self.python_version = self.environment.get(
+            'python_full_version', platform.python_version())
+        self._pages = dict()
+        self._requirements = dict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+        # sdists downloaded to read their metadata
+        self._cache = tempfile.mkdtemp(prefix='fastensource-sdists-')
+
+    def page(self, name):
+        """Return the candidates of a project from its index page."""
+        key = normalize_pypi_name(name)
+        with self._lock:
+            if key in self._pages:
+                return self._pages[key]
+        url = self.index + key + '/'
+        r = send_request('GET', url, headers={'Accept': ACCEPT})
+        if r.status_code == 404:
+            candidates = list()
+        elif r.status_code != 200:
+            raise ResolutionError('{} returned {}'.format(url,
+                                                          r.status_code))
+        else:
+            candidates = parse_page(r.content,
+                                    r.headers.get('Content-Type', ''),
+                                    r.url, name)
+        with self._lock:
+            self._pages[key] = candidates
+        return candidates
+
+    def _compatible(self, candidate):
+        if not candidate.requires_python:
+            return True
+        try:
+            return SpecifierSet(candidate.requires_python).contains(
+                self.python_version, prereleases=True)
+        except InvalidSpecifier:
+            return True
+
+    def choose(self, name, specifier):
+        """Return the newest candidate that satisfies specifier, or None.
+
+        Yanked sdists are chosen only by exact pins (PEP 592).
+        """
+        pinned = any(spec.operator in ('==', '===') for spec in specifier)
+        candidates = [c for c in self.page(name)
+                      if (pinned or not c.yanked) and self._compatible(c)]
+        versions = {c.version: c for c in candidates}
+        matching = list(specifier.filter(versions.keys()))
+        if not matching:
+            return None
+        return versions[max(matching, key=Version)]
+
+    def requirements(self, candidate):
+        """Return the requirements of a candidate (list of strings)."""
+        with self._lock:
+            if candidate.filename in self._requirements:
+                return self._requirements[candidate.filename]
+        requirements = None
+        if candidate.metadata:
+            r = send_request('GET', candidate.url.split('#')[0] +
+                             '.metadata')
+            if r.status_code == 200:
+                metrics.incr('pypi_metadata_total', source='pep658')
+                requirements = _static_requires_dist(
+                    r.content.decode('utf-8', 'replace'))
+        if requirements is None:
+            path = os.path.join(self._cache, candidate.filename)
+            if not os.path.isfile(path):
+                download_file(candidate.url, path)
+            metrics.incr('pypi_metadata_total', source='sdist')
+            requirements = read_sdist_requirements(path)
+        with self._lock:
+            self._requirements[candidate.filename] = requirements
+        return requirements
+
+    def resolve(self, name, version=None):
+        """Resolve a project and its dependencies.
+
+        Args:
+            name (str): project name
+            version (str): exact version, or None for the newest
+
+        Raises:
+            ResolutionError: If a requirement cannot be satisfied, two
+                requirements conflict, or the requirements of a sdist
+                are dynamic.
+
+        Returns:
+            distributions (list): of Distribution, the project first
+
+        """
+        root = name if version is None else '{}=={}'.format(name, version)
+        try:
+            queue = [(Requirement(root), None)]
+        except InvalidRequirement as e:
+            raise ResolutionError(str(e))
+        chosen = dict()
+        specifiers = dict()
+        extras = dict()
+        order = list()
+        depends = dict()
+        while queue:
+            # Fetch the pages of the level concurrently
+            list(self._executor.map(self._page_or_none,
+                                    [r.name for r, _ in queue]))
+            expand = list()
+            for requirement, parent in queue:
+                key = normalize_pypi_name(requirement.name)
+                if parent is not None and key not in depends[parent]:
+                    depends[parent].append(key)
+                specifiers[key] = specifiers.get(key, SpecifierSet()) &\
+                    requirement.specifier
+                if key in chosen:
+                    if not specifiers[key].contains(chosen[key].version,
+                                                    prereleases=True):
+                        raise ResolutionError('Conflicting requirements {} '
+                                              'on {}'.format(specifiers[key],
+                                                             key))
+                    new = set(requirement.extras) - extras[key]
+                    if new:
+                        extras[key] |= new
+                        expand.append((key, new))
+                    continue
+                candidate = self.choose(requirement.name, specifiers[key])
+                if candidate is None:
+                    raise ResolutionError('No sdist of {} matches {}'.format(
+                        requirement.name, specifiers[key] or 'any version'))
+                chosen[key] = candidate
+                extras[key] = set(requirement.extras)
+                depends[key] = list()
+                order.append(key)
+                expand.append((key, extras[key] | {''}))
+            # Fetch the requirements of the level concurrently
+            requirements = self._executor.map(
+                self.requirements, [chosen[key] for key, _ in expand]
+            )
+            queue = list()
+            for (key, wanted), lines in zip(expand, requirements):
+                for line in lines:
+                    requirement = self._requirement(line, wanted)
+                    if requirement is not None:
+                        queue.append((requirement, key))
+        result = list()
+        for key in order:
+            candidate = chosen[key]
+            project = find_name_version_pypi(candidate.filename)[0]
+            result.append(Distribution(
+                project, candidate.version, candidate.filename,
+                candidate.url,
+                [(find_name_version_pypi(chosen[dep].filename)[0],
+                  chosen[dep].version) for dep in depends[key]]
+            ))
+        return result
+
+    def _page_or_none(self, item):
+        try:
+            return self.page(item)
+        except (ResolutionError, ConnectionError):
+            return None
+
+    def _requirement(self, line, extras):
+        """Parse a requirement of a project installed with extras, and
+        return it without its marker, or None if it does not apply.
+        """
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            return None
+        if requirement.marker is not None:
+            applies = any(requirement.marker.evaluate(
+                dict(self.environment, extra=extra)) for extra in extras)
+            if not applies:
+                return None
+            requirement.marker = None
+        return requirement
+
+    def fetch(self, distributions, directory):
+        """Download sdists to directory concurrently.
+
+        Sdists that were already downloaded, for their metadata or
+        before, are not downloaded again.
+
+        Args:
+            distributions (list): of Distribution
+            directory (str): where to save the sdists, or a function that
+                returns it for the filename of an sdist
+
+        Returns:
+            filenames (list): the sdists in directory
+
+        """
+        def get(distribution):
+            path = os.path.join(directory(distribution.filename)
+                                if callable(directory) else directory,
+                                distribution.filename)
+            if os.path.isfile(path):
+                return distribution.filename
+            cached = os.path.join(self._cache, distribution.filename)
+            if os.path.isfile(cached):
+                shutil.copyfile(cached, path)
+            else:
+                download_file(distribution.url, path)
+            return distribution.filename
+        return list(self._executor.map(get, distributions))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        shutil.rmtree(self._cache, ignore_errors=True)
@@ -0,0 +1,180 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Shell-free subprocess execution.
+
+Commands are argv lists. Their stdout and stderr are streamed line by line
+to the log sinks while they run, they are killed (with their process group)
+when they exceed a timeout, and the resources that they used are recorded
+in the run metrics.
+"""
+import os
+import sys
+import time
+import shlex
+import signal
+import threading
+from subprocess import Popen, PIPE
+from concurrent.futures import ThreadPoolExecutor
+from fastensource.utils.metrics import metrics
+
+# Exit code of commands that cannot be found, as in shells
+NOT_FOUND = 127
+# Serialize the writes of concurrent commands to the same sinks
+_write_lock = threading.Lock()
+
+
+class CommandResult:
+    """The outcome of a command.
+
+    Attributes:
+        argv (list): the command
+        exit_code (int): negative for commands killed by a signal
+        timed_out (bool): whether the command was killed after a timeout
+        wall_time (float): seconds
+        user_time (float): CPU seconds in user mode
+        system_time (float): CPU seconds in kernel mode
+        max_rss (int): peak resident set size in kilobytes
+
+    """
+    __slots__ = ('argv', 'exit_code', 'timed_out', 'wall_time', 'user_time',
+                 'system_time', 'max_rss')
+
+    def __init__(self, argv, exit_code, timed_out=False, wall_time=0.0,
+                 user_time=0.0, system_time=0.0, max_rss=0):
+        self.argv = argv
+        self.exit_code = exit_code
+        self.timed_out = timed_out
+        self.wall_time = wall_time
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss = max_rss
+
+    def __repr__(self):
+        return 'CommandResult({!r}, exit_code={})'.format(self.argv,
+                                                          self.exit_code)
+
+
+def exit_code_of(status):
+    """Decode a wait status as Popen.returncode does: negative for a
+    signal.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _stream(pipe, sink):
+    for line in iter(pipe.readline, b''):
+        text = line.decode('utf-8', 'replace')
+        with _write_lock:
+            sink.write(text)
+    pipe.close()
+
+
+def run_command(cmd, mes_logs=sys.stdout, err_logs=sys.stderr, timeout=None,
+                cwd=None, env=None):
+    """Run a command and stream its output.
+
+    Args:
+        cmd (list): argv (a string is split with shlex, not run in a shell)
+        mes_logs (file): sink for stdout
+        err_logs (file): sink for stderr
+        timeout (float): seconds before the command is killed
+        cwd (str): working directory of the command
+        env (dict): environment of the command
+
+    Returns:
+        result (CommandResult)
+
+    """
+    argv = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+    program = os.path.basename(argv[0]) if argv else ''
+    start = time.perf_counter()
+    try:
+        process = Popen(argv, stdout=PIPE, stderr=PIPE, cwd=cwd, env=env,
+                        start_new_session=True)
+    except OSError as e:
+        with _write_lock:
+            err_logs.write('{}: {}\n'.format(program, e.strerror))
+        metrics.incr('subprocess_total', program=program,
+                     exit_code=NOT_FOUND)
+        return CommandResult(argv, NOT_FOUND)
+    readers = [threading.Thread(target=_stream, args=(process.stdout,
+                                                      mes_logs)),
+               threading.Thread(target=_stream, args=(process.stderr,
+                                                      err_logs))]
+    for reader in readers:
+        reader.start()
+    # Reap the process with wait4 to get its resource usage.
+    waited = dict()
+
+    def reap():
+        _, status, usage = os.wait4(process.pid, 0)
+        waited['status'], waited['usage'] = status, usage
+    reaper = threading.Thread(target=reap)
+    reaper.start()
+    reaper.join(timeout)
+    timed_out = reaper.is_alive()
+    if timed_out:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        reaper.join()
+    for reader in readers:
+        reader.join()
+    status, usage = waited['status'], waited['usage']
+    exit_code = exit_code_of(status)
+    # The process has been reaped, so Popen must not wait for it.
+    process.returncode = exit_code
+    result = CommandResult(argv, exit_code, timed_out,
+                           time.perf_counter() - start, usage.ru_utime,
+                           usage.ru_stime, usage.ru_maxrss)
+    metrics.observe('subprocess_seconds', result.wall_time, program=program)
+    metrics.incr('subprocess_total', program=program, exit_code=exit_code)
+    metrics.incr('subprocess_cpu_seconds_total',
+                 result.user_time + result.system_time, program=program)
+    if timed_out:
+        metrics.incr('subprocess_timeouts_total', program=program)
+        with _write_lock:
+            err_logs.write('{}: killed after {} seconds\n'.format(
+                ' '.join(argv), timeout))
+    return result
+
+
+def run_commands(cmds, workers=4, **kwargs):
+    """Run many commands concurrently.
+
+    Args:
+        cmds (list): of argv lists
+        workers (int): maximum number of commands running at once
+        kwargs: arguments of run_command
+
+    Returns:
+        results (list): of CommandResult, in the order of cmds
+
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda cmd: run_command(cmd, **kwargs),
+                                 cmds))
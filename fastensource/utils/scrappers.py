@@ -21,17 +21,29 @@
 # specific language governing permissions and limitations
 # under the License.
 #
-from lxml import html
-from fastensource.utils.helpers import delay, requests_get_handler
+import os
+from fastensource.utils.helpers import delay, requests_get_handler, memoize
+from fastensource.utils.metrics import timed
+
+# Websites that we scrape. The environment variables point them to mirrors
+# or to local stand-ins (see benchmarks/).
+PYPI_URL = os.environ.get('FASTENSOURCE_PYPI_URL', 'https://pypi.org/')
+LIBIO_URL = os.environ.get('FASTENSOURCE_LIBIO_URL', 'https://libraries.io/')
+MVNREPOSITORY_URL = os.environ.get('FASTENSOURCE_MVNREPOSITORY_URL',
+                                   'https://mvnrepository.com/')
+# Seconds before the release history of a PyPI project is fetched again
+HISTORY_TTL = 600
 
 
 def libio_parser(content):
     """From the page content return a list of tuples with
     version, timestamp.
     """
-    tree = html.fromstring(content)
-    element = '//table[@class="table"]//tr/td//text()'
-    elements = tree.xpath(element)
+    from lxml import html
+    with timed('parse'):
+        tree = html.fromstring(content)
+        element = '//table[@class="table"]//tr/td//text()'
+        elements = tree.xpath(element)
     elements = [e.strip() for e in elements
                 if e.strip() != ''
                 and e.strip().find('Browse source on')
@@ -43,7 +55,7 @@ def libio_parser(content):
 def get_version_timestamp_libio(pkg_mng, package, version):
     """Return version timestamp using libio.
     """
-    url = 'https://libraries.io/{}/{}/versions'.format(pkg_mng, package)
+    url = LIBIO_URL + '{}/{}/versions'.format(pkg_mng, package)
     for i in range(1, 100):
         page = requests_get_handler(url + '?page=' + str(i))
         if page.status_code == 404:
@@ -63,27 +75,41 @@ def pypi_parser(content):
     """From the page content return a list of tuples with
     version, timestamp.
     """
-    tree = html.fromstring(content)
-    releases_element = '//p[@class="release__version"]//text()'
-    timestamps_element = '//p[@class="release__version-date"]//text()'
-    releases = tree.xpath(releases_element)
-    timestamps = tree.xpath(timestamps_element)
+    from lxml import html
+    with timed('parse'):
+        tree = html.fromstring(content)
+        releases_element = '//p[@class="release__version"]//text()'
+        timestamps_element = '//p[@class="release__version-date"]//text()'
+        releases = tree.xpath(releases_element)
+        timestamps = tree.xpath(timestamps_element)
     releases = [e.strip() for e in releases
                 if e.startswith('\n') and e.strip() != '']
     timestamps = [e.strip() for e in timestamps if e.strip() != '']
     return list(zip(releases, timestamps))
 
 
+@memoize(maxsize=4096, ttl=HISTORY_TTL)
+def pypi_release_history(package):
+    """Return the releases of a package with their timestamps, newest
+    first, or None if the package does not exist.
+
+    It is kept in memory, because each version of a package needs it.
+    """
+    url = PYPI_URL + 'project/{}/#history'.format(package)
+    page = requests_get_handler(url)
+    if page.status_code == 404:
+        return None
+    return pypi_parser(page.content)
+
+
 @delay
 def find_version_timestamp_pypi(package, version, delay):
     """Return version timestamp using PyPI's website.
     """
-    url = 'https://pypi.org/project/{}/#history'.format(package)
-    page = requests_get_handler(url)
-    if page.status_code == 404:
+    elements = pypi_release_history(package)
+    if elements is None:
         print('{} not found'.format(package))
         return ""
-    elements = pypi_parser(page.content)
     for versions in elements:
         if version == versions[0]:
             return versions[1]
@@ -95,12 +121,12 @@ def find_version_timestamp_pypi(package, version, delay):
 def find_last_version_pypi(package, delay):
     """Return the last version of a package
     """
-    url = 'https://pypi.org/project/{}/#history'.format(package)
-    page = requests_get_handler(url)
-    if page.status_code == 404:
+    elements = pypi_release_history(package)
+    if elements is None:
         print('{} not found'.format(package))
         return ""
-    elements = pypi_parser(page.content)
+    if len(elements) == 0:
+        return ""
     return elements[0][0]
 
 
@@ -110,20 +136,31 @@ def find_version_timestamp_maven(package, version, delay):
 
     In case of error return empty string
     """
-    url = 'https://mvnrepository.com/artifact/{}/{}/{}'.format(
+    url = MVNREPOSITORY_URL + 'artifact/{}/{}/{}'.format(
          package.split(':')[0], package.split(':')[1], version
     )
     page = requests_get_handler(url)
     if page.status_code == 404:
         print('{} not found'.format(package))
         return ""
-    tree = html.fromstring(page.content)
-    element = '//table[@class="grid"]//text()'
-    elements = tree.xpath(element)
+    timestamp = mvnrepository_parser(page.content)
+    if not timestamp:
+        print('{} of {} not found'.format(version, package))
+    return timestamp
+
+
+def mvnrepository_parser(content):
+    """From the page content of a version return its timestamp, or an
+    empty string.
+    """
+    from lxml import html
+    with timed('parse'):
+        tree = html.fromstring(content)
+        element = '//table[@class="grid"]//text()'
+        elements = tree.xpath(element)
     for i, elem in enumerate(elements):
         if elem == 'Date':
             return elements[i+1].split('(')[1].split(')')[0]
-    print('{} of {} not found'.format(version, package))
     return ""
 
 
@@ -133,14 +170,16 @@ def find_last_version_maven(package, delay):
 
     In case of error return empty string
     """
-    url = 'https://mvnrepository.com/artifact/'
+    url = MVNREPOSITORY_URL + 'artifact/'
     url = url + package.split(':')[0] + '/' + package.split(':')[1]
     page = requests_get_handler(url)
     if page.status_code == 404:
         return ''
-    tree = html.fromstring(page.content)
-    element = '//a[@class="vbtn release"]//text()'
-    elements = tree.xpath(element)
+    from lxml import html
+    with timed('parse'):
+        tree = html.fromstring(page.content)
+        element = '//a[@class="vbtn release"]//text()'
+        elements = tree.xpath(element)
     if len(elements) == 0:
         return ""
     return elements[0]
@@ -0,0 +1,339 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+import time
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from fastensource.utils.metrics import metrics
+
+# Responses that ask the client to slow down
+THROTTLE_STATUSES = (429, 503)
+# Responses that count as failures of the host
+FAILURE_STATUSES = (500, 502, 503, 504)
+
+
+class HostThrottle:
+    """Limit the concurrent requests, and the request rate for each host.
+
+    Each host gets its own semaphore with `concurrency` slots, and two
+    consecutive requests to the same host start at least `delay` seconds
+    apart. Requests to different hosts do not block each other.
+
+    Args:
+        concurrency (int): maximum number of concurrent requests per host
+        delay (float): minimum seconds between two requests to a host
+
+    """
+    def __init__(self, concurrency=4, delay=0):
+        self.concurrency = concurrency
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._semaphores = dict()
+        self._next_request = dict()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(
+                    self.concurrency
+                )
+            return self._semaphores[host]
+
+    def _wait_turn(self, host):
+        """Reserve the next request slot of host and sleep until then."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request.get(host, now))
+            self._next_request[host] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def acquire(self, host):
+        self._semaphore(host).acquire()
+        self._wait_turn(host)
+
+    def release(self, host):
+        self._semaphore(host).release()
+
+    @contextmanager
+    def limit(self, host):
+        """Context manager that holds a request slot of host.
+
+        Example:
+            with throttle.limit('pypi.org'):
+                requests_get(url)
+
+        """
+        self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+
+class CircuitOpenError(Exception):
+    """Raised when requests to a host are refused after sustained
+    failures."""
+
+
+def parse_retry_after(value, now=None):
+    """Return the seconds of a Retry-After header (delay-seconds or
+    HTTP-date), or None if it is missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    now = time.time() if now is None else now
+    return max(when.timestamp() - now, 0.0)
+
+
+class _HostState:
+    __slots__ = ('limit', 'active', 'rate', 'next_request', 'latency',
+                 'best_latency', 'failures', 'open_until', 'cooldown',
+                 'probing')
+
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.active = 0
+        # Requests per second, None while unlimited
+        self.rate = None
+        self.next_request = 0.0
+        # Moving average and best of the latency
+        self.latency = None
+        self.best_latency = None
+        # Consecutive failures, and circuit breaker
+        self.failures = 0
+        self.open_until = None
+        self.cooldown = 0.0
+        self.probing = False
+
+
+class AdaptiveThrottle:
+    """Concurrency and rate of each host driven by its responses (AIMD).
+
+    Each host starts with `initial` concurrent requests and no rate limit.
+    - While the latency stays within `tolerance` times the best latency of
+      the host, every response adds about one request to the concurrency
+      per window of requests, and `increase` requests/sec to the rate.
+    - A 429 or 503 response halves both, and a Retry-After header pauses
+      all the requests to the host for the given seconds.
+    - Errors and 5xx responses also halve the concurrency; after
+      `threshold` consecutive failures the circuit breaker of the host
+      opens, and requests are refused with CircuitOpenError for a cooldown
+      that doubles on each trip (up to `max_cooldown`). Then a single
+      probe request is let through, and closes the breaker if it succeeds.
+
+    The state of each host is exported to the run metrics as the gauges
+    host_concurrency_limit, host_rate_limit (0 for unlimited) and
+    host_circuit_open.
+
+    Args:
+        initial (int): concurrent requests per host at the start
+        max_concurrency (int): upper bound of concurrent requests per host
+        retries (int): times that requests_get retries throttled or failed
+            requests
+        tolerance (float): latency ratio that is still healthy
+        increase (float): requests/sec added to the rate per response
+        max_rate (float): rate above which a host is unlimited again
+        threshold (int): consecutive failures that open the breaker
+        cooldown (float): seconds of the first open state
+        max_cooldown (float): upper bound of the cooldown
+        max_retry_after (float): upper bound of honoured Retry-After
+
+    """
+    def __init__(self, initial=4, max_concurrency=16, retries=3,
+                 tolerance=2.0, increase=0.5, max_rate=50.0, threshold=5,
+                 cooldown=10.0, max_cooldown=300.0, max_retry_after=300.0):
+        self.initial = initial
+        self.max_concurrency = max(max_concurrency, 1)
+        self.retries = retries
+        self.tolerance = tolerance
+        self.increase = increase
+        self.max_rate = max_rate
+        self.threshold = threshold
+        self.initial_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_retry_after = max_retry_after
+        self._condition = threading.Condition()
+        self._hosts = dict()
+
+    def configure(self, max_concurrency=None, retries=None):
+        """Change the bounds, and keep what was learned of each host.
+
+        Args:
+            max_concurrency (int): upper bound of concurrent requests per
+                host; lower limits of the hosts are kept
+            retries (int): times that requests_get retries requests
+
+        """
+        with self._condition:
+            if max_concurrency is not None:
+                self.max_concurrency = max(max_concurrency, 1)
+                for host, state in self._hosts.items():
+                    if state.limit > self.max_concurrency:
+                        state.limit = float(self.max_concurrency)
+                        self._export(host, state)
+                self._condition.notify_all()
+            if retries is not None:
+                self.retries = retries
+
+    def _state(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(min(self.initial,
+                                               self.max_concurrency))
+            self._export(host, self._hosts[host])
+        return self._hosts[host]
+
+    def _export(self, host, state):
+        metrics.set('host_concurrency_limit', int(state.limit), host=host)
+        metrics.set('host_rate_limit', state.rate or 0, host=host)
+        metrics.set('host_circuit_open',
+                    int(state.open_until is not None), host=host)
+
+    def acquire(self, host):
+        """Wait for a request slot of host.
+
+        Raises:
+            CircuitOpenError: if the breaker of the host is open.
+
+        """
+        with self._condition:
+            state = self._state(host)
+            while True:
+                now = time.monotonic()
+                if state.open_until is not None:
+                    if now < state.open_until or state.probing:
+                        raise CircuitOpenError(host)
+                    # Half open: let one probe through.
+                    state.probing = True
+                    break
+                if state.active < int(state.limit):
+                    break
+                self._condition.wait()
+            state.active += 1
+            start = max(now, state.next_request)
+            interval = 1.0 / state.rate if state.rate else 0.0
+            state.next_request = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host, latency=None, status=None, retry_after=None):
+        """Return the slot of host, and adapt to the outcome.
+
+        Args:
+            host (str)
+            latency (float): seconds until the response, None on errors
+            status (int): status code, None if the request failed
+            retry_after (str): the Retry-After header of the response
+
+        """
+        with self._condition:
+            state = self._state(host)
+            state.active -= 1
+            now = time.monotonic()
+            failed = status is None or status in FAILURE_STATUSES
+            if status in THROTTLE_STATUSES:
+                self._decrease(state, latency)
+                metrics.incr('http_throttled_total', host=host)
+                pause = parse_retry_after(retry_after)
+                if pause is not None:
+                    pause = min(pause, self.max_retry_after)
+                    state.next_request = max(state.next_request, now + pause)
+            elif failed:
+                state.limit = max(1.0, state.limit / 2)
+            if failed:
+                state.failures += 1
+                if state.probing or state.failures >= self.threshold:
+                    self._trip(host, state, now)
+            else:
+                state.failures = 0
+                if state.open_until is not None:
+                    state.open_until = None
+                    state.cooldown = 0.0
+                if status not in THROTTLE_STATUSES:
+                    self._increase(state, latency)
+            state.probing = False
+            self._export(host, state)
+            self._condition.notify_all()
+
+    def _decrease(self, state, latency):
+        if state.rate is None:
+            # Start from the throughput that the host just refused.
+            latency = state.latency or latency or 1.0
+            state.rate = state.limit / latency
+        state.rate = max(state.rate / 2, 0.1)
+        state.limit = max(1.0, state.limit / 2)
+
+    def _increase(self, state, latency):
+        if latency is not None:
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency = 0.8 * state.latency + 0.2 * latency
+            if state.best_latency is None or latency < state.best_latency:
+                state.best_latency = latency
+            if state.latency > self.tolerance * state.best_latency:
+                return
+        state.limit = min(float(self.max_concurrency),
+                          state.limit + 1.0 / state.limit)
+        if state.rate is not None:
+            state.rate += self.increase
+            if state.rate >= self.max_rate:
+                state.rate = None
+
+    def _trip(self, host, state, now):
+        state.cooldown = min(max(state.cooldown * 2, self.initial_cooldown),
+                             self.max_cooldown)
+        state.open_until = now + state.cooldown
+        metrics.incr('circuit_trips_total', host=host)
+
+    def snapshot(self, host):
+        """Return the state of host as a dict."""
+        with self._condition:
+            state = self._state(host)
+            return {'limit': int(state.limit), 'rate': state.rate,
+                    'active': state.active, 'failures': state.failures,
+                    'open': state.open_until is not None}
+
+    @contextmanager
+    def limit(self, host):
+        """Context manager that holds a request slot of host, and counts
+        an exception in the block as a failure.
+        """
+        self.acquire(host)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.release(host)
+            raise
+        self.release(host, time.perf_counter() - start, 200)
@@ -21,7 +21,12 @@
 # specific language governing permissions and limitations
 # under the License.
 #
-import psycopg2
+from fastensource.utils.helpers import delay
+from fastensource.utils.metrics import timed
+
+# Version of find_dependencies' results. Bump it when they change, to
+# invalidate the dependency cache.
+RESOLVER_VERSION = 1
 
 def find_version_timestamp_udd(package, version, dbname='udd',
                                uname='schaliasos', passwd='udd'):
@@ -36,22 +41,55 @@ def find_version_timestamp_udd(package, version, dbname='udd',
         (e.g. Apr 17, 2017)
 
     """
-    conn = psycopg2.connect(dbname=dbname, user=uname, password=passwd)
-    cursor = conn.cursor()
-    cursor.execute("SELECT sources.source, upload_history.version, "
-                   "upload_history.date FROM sources INNER JOIN "
-                   "upload_history ON upload_history.source = sources.source "
-                   "WHERE sources.source = '{}' AND upload_history.version "
-                   "= '{}' ORDER BY date DESC LIMIT 1;".format(
-                       package, version)
-                   )
-    rows = cursor.fetchall()
+    import psycopg2
+    with timed('udd'):
+        conn = psycopg2.connect(dbname=dbname, user=uname, password=passwd)
+        cursor = conn.cursor()
+        cursor.execute("SELECT sources.source, upload_history.version, "
+                       "upload_history.date FROM sources INNER JOIN "
+                       "upload_history ON upload_history.source = "
+                       "sources.source WHERE sources.source = '{}' AND "
+                       "upload_history.version = '{}' ORDER BY date DESC "
+                       "LIMIT 1;".format(package, version)
+                       )
+        rows = cursor.fetchall()
     date = ''
     if len(rows) == 1:
         date = rows[0][2].strftime("%b %d, %Y")
     return date
 
 
+@delay
+def find_last_version_udd(package, delay, dbname='udd', uname='schaliasos',
+                          passwd='udd'):
+    """Find the last version of a debian source package.
+
+    Args:
+        package (str): name of source package
+        delay (int): seconds to sleep
+
+    Returns:
+        version (str): the last version or empty string if there is no
+        such source package
+
+    """
+    import psycopg2
+    with timed('udd'):
+        conn = psycopg2.connect(dbname=dbname, user=uname, password=passwd)
+        try:
+            cursor = conn.cursor()
+            # version is a debversion column, so ORDER BY follows Debian's
+            # version comparison rules.
+            cursor.execute("SELECT version FROM sources WHERE source = %s "
+                           "ORDER BY version DESC LIMIT 1;", (package,))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+    if len(rows) == 1:
+        return rows[0][0]
+    return ''
+
+
 def resolve_dependency(dependency):
     """Resolve a dependency to a specific version or Unspecified.
 
@@ -105,25 +143,39 @@ def resolve_dependencies(dependencies):
 
 
 def find_dependencies(project, version, dbname='udd', uname='schaliasos',
-                      passwd='udd'):
+                      passwd='udd', cache=None):
     """Find the dependencies of a project
 
+    The dependency cache is consulted first, and projects found in UDD
+    are cached.
+
     Args:
         project (str): name of project
         version (str): version of project
+        cache (DependencyCache): or None
 
     Returns:
         dependencies (list): of tuples with package names, and version
 
     """
-    conn = psycopg2.connect(dbname=dbname, user=uname, password=passwd)
-    cursor = conn.cursor()
-    cursor.execute("SELECT depends FROM all_packages WHERE "
-                   "source = '{}' AND source_version = '{}' LIMIT 1;".format(
-                       project, version)
-                   )
-    rows = cursor.fetchall()
+    if cache is not None:
+        dependencies = cache.get('debian', project, version,
+                                 RESOLVER_VERSION)
+        if dependencies is not None:
+            return dependencies
+    import psycopg2
+    with timed('udd'):
+        conn = psycopg2.connect(dbname=dbname, user=uname, password=passwd)
+        cursor = conn.cursor()
+        cursor.execute("SELECT depends FROM all_packages WHERE "
+                       "source = '{}' AND source_version = '{}' "
+                       "LIMIT 1;".format(project, version)
+                       )
+        rows = cursor.fetchall()
     if len(rows) > 0 and len(rows[0]) > 0:
         dependencies = resolve_dependencies(rows[0][0])
+        if cache is not None:
+            cache.put('debian', project, version, RESOLVER_VERSION,
+                      dependencies)
         return dependencies
     return []
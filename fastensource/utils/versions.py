@@ -0,0 +1,403 @@
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Compact in-memory store of the versions file.
+
+The versions file maps each project to its downloaded versions and their
+release timestamps (e.g. "Sep 25, 2018"). For a whole ecosystem, dicts of
+dicts of strings take hundreds of bytes per version. VersionStore keeps:
+    - project names and version strings in StringPools, which save each
+      distinct string once as UTF-8 in a shared buffer and refer to it
+      with an integer id,
+    - the versions of all projects in one array of 64-bit integers, that
+      pack the id of the version and the timestamp as a date ordinal; the
+      versions of a project are a contiguous block, sorted by version id,
+and it is read from the versions file with a streaming JSON reader (ijson,
+if it is installed).
+"""
+import os
+import json
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from datetime import date, datetime
+from collections.abc import Mapping
+
+TIMESTAMP_FORMAT = '%b %d, %Y'
+# The low bits of a packed entry hold the timestamp, the high bits the id
+# of the version.
+_TIMESTAMP_BITS = 24
+_TIMESTAMP_MASK = (1 << _TIMESTAMP_BITS) - 1
+# Timestamps that are not dates in TIMESTAMP_FORMAT
+_EMPTY = 0
+_RAW = _TIMESTAMP_MASK
+
+
+class StringPool:
+    """Interned strings with integer ids.
+
+    The strings are saved in one buffer, and found with an open addressing
+    hash table of ids, so a string costs its UTF-8 bytes and about 20 bytes
+    of bookkeeping instead of a str object and a dict entry.
+    """
+    __slots__ = ('_data', '_offsets', '_table')
+
+    def __init__(self):
+        self._data = bytearray()
+        # string i is _data[_offsets[i]:_offsets[i + 1]]
+        self._offsets = array('Q', [0])
+        self._table = array('q', [-1]) * 8
+
+    def _slot(self, encoded):
+        """Return the id of an encoded string (-1 if it is not in the
+        pool) and its slot in the table.
+        """
+        mask = len(self._table) - 1
+        i = hash(encoded) & mask
+        while True:
+            sid = self._table[i]
+            if sid == -1 or self._get(sid) == encoded:
+                return sid, i
+            i = (i + 1) & mask
+
+    def _get(self, sid):
+        return bytes(self._data[self._offsets[sid]:self._offsets[sid + 1]])
+
+    def _grow(self):
+        self._table = array('q', [-1]) * (len(self._table) * 2)
+        mask = len(self._table) - 1
+        for sid in range(len(self)):
+            i = hash(self._get(sid)) & mask
+            while self._table[i] != -1:
+                i = (i + 1) & mask
+            self._table[i] = sid
+
+    def id(self, string):
+        """Return the id of string, adding it to the pool."""
+        encoded = string.encode('utf-8')
+        sid, i = self._slot(encoded)
+        if sid != -1:
+            return sid
+        sid = len(self)
+        self._data += encoded
+        self._offsets.append(len(self._data))
+        self._table[i] = sid
+        # Keep the load factor under 2/3
+        if 3 * len(self) > 2 * len(self._table):
+            self._grow()
+        return sid
+
+    def find(self, string):
+        """Return the id of string, or None if it is not in the pool."""
+        sid, _ = self._slot(string.encode('utf-8'))
+        return None if sid == -1 else sid
+
+    def __getitem__(self, sid):
+        return self._get(sid).decode('utf-8')
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+# Release dates repeat a lot, and parsing them is slow.
+@lru_cache(maxsize=4096)
+def encode_timestamp(timestamp):
+    """Return the date ordinal of a timestamp, _EMPTY for empty timestamps,
+    or _RAW for timestamps that do not round-trip through
+    TIMESTAMP_FORMAT.
+    """
+    if not timestamp:
+        return _EMPTY
+    try:
+        day = datetime.strptime(timestamp, TIMESTAMP_FORMAT).date()
+    except ValueError:
+        return _RAW
+    if day.strftime(TIMESTAMP_FORMAT) != timestamp:
+        return _RAW
+    return day.toordinal()
+
+
+@lru_cache(maxsize=4096)
+def decode_timestamp(ordinal):
+    if ordinal == _EMPTY:
+        return ''
+    return date.fromordinal(ordinal).strftime(TIMESTAMP_FORMAT)
+
+
+class ProjectVersions(Mapping):
+    """Read-only view of the versions of a project: version -> timestamp.
+    """
+    __slots__ = ('_store', '_pid')
+
+    def __init__(self, store, pid):
+        self._store = store
+        self._pid = pid
+
+    def __getitem__(self, version):
+        timestamp = self._store.get_timestamp(self._pid, version)
+        if timestamp is None:
+            raise KeyError(version)
+        return timestamp
+
+    def __contains__(self, version):
+        return self._store.get_timestamp(self._pid, version) is not None
+
+    def __iter__(self):
+        return self._store.iter_versions(self._pid)
+
+    def __len__(self):
+        return self._store.counts[self._pid]
+
+
+class VersionStore(Mapping):
+    """The projects, versions and timestamps of a versions file.
+
+    It is a read-only mapping of project -> {version: timestamp}, like the
+    dicts of the versions file; add changes it.
+    """
+    def __init__(self):
+        self.project_pool = StringPool()
+        self.version_pool = StringPool()
+        # Packed entries; the block of project pid is
+        # entries[starts[pid]:starts[pid] + counts[pid]]
+        self.entries = array('Q')
+        self.starts = array('Q')
+        self.counts = array('L')
+        # Entries left behind by blocks that moved to the end
+        self.garbage = 0
+        # Timestamps that are not in TIMESTAMP_FORMAT: (pid, vid) -> str
+        self.raw = dict()
+
+    def _find(self, pid, vid):
+        """Return the index in entries where vid is, or should be, in the
+        block of pid, and whether it is there.
+        """
+        start = self.starts[pid]
+        end = start + self.counts[pid]
+        i = bisect_left(self.entries, vid << _TIMESTAMP_BITS, start, end)
+        return i, i < end and self.entries[i] >> _TIMESTAMP_BITS == vid
+
+    def add(self, project, version, timestamp=''):
+        """Add a version of a project, unless it already exists.
+
+        Returns:
+            added (bool)
+
+        """
+        pid = self.project_pool.id(project)
+        if pid == len(self.starts):
+            self.starts.append(len(self.entries))
+            self.counts.append(0)
+        vid = self.version_pool.id(version)
+        i, found = self._find(pid, vid)
+        if found:
+            return False
+        start, count = self.starts[pid], self.counts[pid]
+        if start + count != len(self.entries):
+            # Move the block to the end, where it can grow.
+            block = self.entries[start:start + count]
+            self.starts[pid] = len(self.entries)
+            self.entries.extend(block)
+            self.garbage += count
+            i, _ = self._find(pid, vid)
+        ordinal = encode_timestamp(timestamp)
+        if ordinal == _RAW:
+            self.raw[(pid, vid)] = timestamp
+        self.entries.insert(i, (vid << _TIMESTAMP_BITS) | ordinal)
+        self.counts[pid] += 1
+        if self.garbage > len(self.entries) // 2:
+            self._compact()
+        return True
+
+    def _compact(self):
+        entries = array('Q')
+        for pid in range(len(self.starts)):
+            start = self.starts[pid]
+            self.starts[pid] = len(entries)
+            entries.extend(self.entries[start:start + self.counts[pid]])
+        self.entries = entries
+        self.garbage = 0
+
+    def get_timestamp(self, pid, version):
+        vid = self.version_pool.find(version)
+        if vid is None:
+            return None
+        i, found = self._find(pid, vid)
+        if not found:
+            return None
+        ordinal = self.entries[i] & _TIMESTAMP_MASK
+        if ordinal == _RAW:
+            return self.raw[(pid, vid)]
+        return decode_timestamp(ordinal)
+
+    def iter_versions(self, pid):
+        start = self.starts[pid]
+        for i in range(start, start + self.counts[pid]):
+            yield self.version_pool[self.entries[i] >> _TIMESTAMP_BITS]
+
+    def pairs(self):
+        """Yield all (project, version) pairs."""
+        for pid in range(len(self.starts)):
+            project = self.project_pool[pid]
+            for version in self.iter_versions(pid):
+                yield project, version
+
+    def _pid(self, project):
+        pid = self.project_pool.find(project)
+        if pid is None or self.counts[pid] == 0:
+            return None
+        return pid
+
+    def __getitem__(self, project):
+        pid = self._pid(project)
+        if pid is None:
+            raise KeyError(project)
+        return ProjectVersions(self, pid)
+
+    def __contains__(self, project):
+        return self._pid(project) is not None
+
+    def __iter__(self):
+        for pid in range(len(self.starts)):
+            if self.counts[pid] > 0:
+                yield self.project_pool[pid]
+
+    def __len__(self):
+        return sum(1 for count in self.counts if count > 0)
+
+    def to_json(self, f, timestamps=True):
+        """Write the store as a JSON object, one project at a time.
+
+        Args:
+            f (file): text file to write to
+            timestamps (bool): write {version: timestamp} objects, or else
+                lists of versions (as p_names)
+
+        """
+        f.write('{')
+        first = True
+        for project in self:
+            versions = self[project]
+            if timestamps:
+                value = dict(versions.items())
+            else:
+                value = list(versions)
+            f.write('{}{}: {}'.format('' if first else ', ',
+                                      json.dumps(project), json.dumps(value)))
+            first = False
+        f.write('}')
+
+
+def read_versions(path):
+    """Read a versions file.
+
+    Args:
+        path (str): the versions file
+
+    Returns:
+        versions (VersionStore): project -> version -> timestamp
+        p_names (VersionStore): project -> versions (Debian packages)
+
+    """
+    versions = VersionStore()
+    p_names = VersionStore()
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+    with open(path, 'rb') as f:
+        if ijson is None:
+            data = json.load(f)
+            packages = data['packages'].items()
+            names = data['p_names'].items()
+        else:
+            packages = ijson.kvitems(f, 'packages')
+        for project, project_versions in packages:
+            for version, timestamp in project_versions.items():
+                versions.add(project, version, timestamp)
+        if ijson is not None:
+            f.seek(0)
+            names = ijson.kvitems(f, 'p_names')
+        for project, project_versions in names:
+            for version in project_versions:
+                p_names.add(project, version)
+    return versions, p_names
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class VersionsCache:
+    """Versions files kept in memory between commands (see
+    `fastensource daemon').
+
+    A file is read again only if it changed on disk since it was last
+    read or written through the cache. The stores are shared, so the
+    commands that use the same file must run one after the other.
+    """
+    def __init__(self):
+        self._entries = dict()
+
+    def get(self, path):
+        """Return the versions and the p_names of path (empty stores if
+        it does not exist).
+        """
+        stamp = _file_stamp(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1], entry[2]
+        if stamp is None:
+            versions, p_names = VersionStore(), VersionStore()
+        else:
+            versions, p_names = read_versions(path)
+        self._entries[path] = (stamp, versions, p_names)
+        return versions, p_names
+
+    def put(self, path, versions, p_names):
+        """Record that path was written from versions and p_names."""
+        self._entries[path] = (_file_stamp(path), versions, p_names)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def write_versions(path, versions, p_names):
+    """Write a versions file without building it in memory.
+
+    Args:
+        path (str): the versions file
+        versions (VersionStore): project -> version -> timestamp
+        p_names (VersionStore): project -> versions
+
+    """
+    with open(path, 'w') as f:
+        f.write('{"packages": ')
+        versions.to_json(f)
+        f.write(', "p_names": ')
+        p_names.to_json(f, timestamps=False)
+        f.write('}')
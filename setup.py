@@ -17,15 +17,15 @@ setup(
     author_email='',
     classifiers=[
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
     keywords='',
     packages=find_packages(),
-    python_requires='>=3.4, <4',
+    python_requires='>=3.7, <4',
     install_requires=['lxml', 'requests', 'pydot', 'psycopg2-binary'],
+    # Streaming reader of large versions files, and metadata resolver of
+    # PyPI dependencies
+    extras_require={'stream': ['ijson'], 'resolver': ['packaging']},
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     # If there are data files included in your packages that need to be
@@ -0,0 +1,54 @@
+import os
+import json
+import tempfile
+from fastensource import api
+from fastensource.utils.helpers import get_throttle
+
+
+def test_config():
+    config = api.Config('pypi', 2, jobs=8)
+    assert config.language == 'python', 'Should be python'
+    assert config.mode == '2', 'Should be 2'
+    assert config.jobs == 8, 'Should be 8'
+    assert config.output == 'PyPI', 'Should be the default of the CLI'
+    assert not hasattr(config, 'func'), 'Should not have func'
+
+
+def test_config_errors():
+    for language, options in (('ruby', {}), ('python', {'foo': 1}),
+                              ('c', {'resolver': 'metadata'})):
+        try:
+            api.Config(language, **options)
+            assert False, 'Should raise ConfigurationError'
+        except api.ConfigurationError:
+            pass
+
+
+def test_crawl():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as d:
+        projects = os.path.join(d, 'projects.csv')
+        open(projects, 'w').close()
+        output = os.path.join(d, 'out')
+        os.makedirs(output)
+        with open(os.path.join(output, 'versions.json'), 'w') as f:
+            json.dump({'packages': {'Django': {'1.11': '2017-04-04'}},
+                       'p_names': {}}, f)
+        config = api.Config('python', 1, projects=projects, output=output,
+                            progress='none', max_per_host=8)
+        throttle = get_throttle()
+        result = api.crawl(config)
+        assert get_throttle() is throttle and\
+            throttle.max_concurrency == 8, 'Should configure the throttle'
+        throttle.configure(max_concurrency=16)
+        assert os.getcwd() == cwd, 'Should not change directory'
+        assert result.output == output, 'Should be output'
+        assert result.artifacts == [], 'Should be empty'
+        assert '1.11' in result.versions['Django'], \
+            'Should read the versions file of output'
+        config.mode = 4
+        try:
+            api.crawl(config)
+            assert False, 'Should raise ConfigurationError'
+        except api.ConfigurationError:
+            pass
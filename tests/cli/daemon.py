@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import socket
+import tempfile
+import threading
+from argparse import Namespace
+from fastensource.commands.daemon import Daemon
+from fastensource.utils.helpers import get_throttle
+from fastensource.utils.metrics import metrics
+
+
+def start(spool=None, socket_path=None):
+    daemon = Daemon(Namespace(spool=spool, socket=socket_path, poll=0.05),
+                    messages=open(os.devnull, 'w'))
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    return daemon, thread
+
+
+def job(d, name):
+    projects = os.path.join(d, 'projects.csv')
+    open(projects, 'w').close()
+    return dict(id=name, language='python', mode=1, projects=projects,
+                output=os.path.join(d, 'out'))
+
+
+def wait_for(path):
+    for _ in range(200):
+        if os.path.exists(path):
+            return
+        time.sleep(0.05)
+
+
+def test_spool():
+    with tempfile.TemporaryDirectory() as d:
+        spool = os.path.join(d, 'spool')
+        throttle = get_throttle()
+        daemon, thread = start(spool=spool)
+        try:
+            wait_for(os.path.join(spool, 'new'))
+            for name, content in (('a', json.dumps(job(d, 'a'))),
+                                  ('b', '{"language": "ruby"}'),
+                                  ('c', 'not json')):
+                path = os.path.join(spool, 'tmp', name + '.json')
+                with open(path, 'w') as f:
+                    f.write(content)
+                os.rename(path, os.path.join(spool, 'new', name + '.json'))
+            results = dict()
+            for name in ('a', 'b', 'c'):
+                path = os.path.join(spool, 'done', name + '.json')
+                wait_for(path)
+                with open(path, 'r') as f:
+                    results[name] = json.load(f)
+        finally:
+            daemon.stop()
+            thread.join()
+        assert results['a']['status'] == 'ok', 'Should be ok'
+        assert results['a']['artifacts'] == [], 'Should be empty'
+        assert get_throttle() is throttle,\
+            'Should keep the throttle between jobs'
+        jobs = {dict(labels)['status']: value for (name, labels), value
+                in metrics.gauges.items() if name == 'daemon_jobs'}
+        assert jobs == {'ok': 1, 'error': 1},\
+            'Should keep the job counts across the resets of the metrics'
+        assert results['b']['status'] == 'error', 'Should be error'
+        assert results['b']['id'] == 'b', 'Should be the name of the file'
+        assert results['c']['status'] == 'error', 'Should be error'
+        assert os.listdir(os.path.join(spool, 'cur')) == [],\
+            'Should be empty'
+
+
+def test_socket():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'daemon.sock')
+        daemon, thread = start(socket_path=path)
+        try:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(path)
+            stream = client.makefile('rw')
+            results = list()
+            for name in ('a', 'b'):
+                stream.write(json.dumps(job(d, name)) + '\n')
+                stream.flush()
+                results.append(json.loads(stream.readline()))
+            client.close()
+        finally:
+            daemon.stop()
+            thread.join()
+        assert [r['id'] for r in results] == ['a', 'b'], 'Should be a, b'
+        assert all(r['status'] == 'ok' for r in results), 'Should be ok'
+        assert not os.path.exists(path), 'Should remove the socket'
@@ -0,0 +1,33 @@
+import sys
+import subprocess
+from fastensource.cli import get_parser
+
+HEAVY_MODULES = ('lxml', 'pydot', 'psycopg2', 'requests', 'pkg_resources',
+                 'cProfile')
+
+CHECK = '''
+import sys
+from fastensource.cli import get_parser
+get_parser().parse_args({})
+print(','.join(m for m in {} if m in sys.modules))
+'''
+
+
+def imported_heavy_modules(argv):
+    code = CHECK.format(repr(argv), repr(HEAVY_MODULES))
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return [m for m in out.decode().strip().split(',') if m]
+
+
+def test_parser_does_not_import_heavy_modules():
+    for argv in (['python', '1'], ['java', '1'], ['c', '1'], ['serve'],
+                 ['daemon', '--spool', 'spool']):
+        assert imported_heavy_modules(argv) == [],\
+            'Should not import heavy modules for {}'.format(argv)
+
+
+def test_lazy_command():
+    args = get_parser().parse_args(['python', '1'])
+    assert args.func.__name__ == 'Pypi', 'Should be Pypi'
+    args = get_parser().parse_args(['serve'])
+    assert args.func.__name__ == 'Serve', 'Should be Serve'
@@ -0,0 +1,14 @@
+"""Local HTTP servers for the tests."""
+import threading
+from http.server import SimpleHTTPRequestHandler
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_server(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
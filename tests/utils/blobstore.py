@@ -0,0 +1,50 @@
+import io
+import os
+import stat
+import tempfile
+from fastensource.utils.blobstore import BlobStore
+from fastensource.utils.extract import extract
+from tests.utils.extract import write_tar
+
+
+def test_put():
+    with tempfile.TemporaryDirectory() as d:
+        store = BlobStore(d)
+        digest, size, new = store.put(io.BytesIO(b'data'))
+        assert size == 4 and new, 'Should store a new blob'
+        assert store.put(io.BytesIO(b'data')) == (digest, 4, False),\
+            'Should store the same contents once'
+        assert store.put(io.BytesIO(b'data'), 0o755)[2],\
+            'Should store executable files separately'
+        mode = os.stat(store.blob_path(digest)).st_mode
+        assert not mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH),\
+            'Should be read-only'
+        assert os.listdir(os.path.join(d, '.blobs', 'tmp')) == [],\
+            'Should not leave temporary files'
+
+
+def test_deduplicated_versions():
+    with tempfile.TemporaryDirectory() as d:
+        root = os.path.join(d, 'src')
+        views = list()
+        for version in ('2.1.7', '2.2'):
+            path = os.path.join(d, 'Django-{}.tar.gz'.format(version))
+            write_tar(path, [('Django-{}/LICENSE'.format(version), b'BSD'),
+                             ('Django-{}/VERSION'.format(version),
+                              version.encode())])
+            view = os.path.join(root, 'pypi', 'Django', version)
+            views.append(view)
+            result = extract(path, view, root)
+            assert result[2] == 3 + len(version), 'Should be the file bytes'
+        assert result[3] == len('2.2'), 'Should store only the new file'
+        licenses = [os.stat(os.path.join(view, 'LICENSE')) for view in views]
+        assert licenses[0].st_ino == licenses[1].st_ino,\
+            'Should share the blob of the same file'
+        store = BlobStore(root)
+        manifest = store.read_manifest(views[1])
+        assert sorted(manifest['files']) == ['LICENSE', 'VERSION'],\
+            'Should list the files of the version'
+        os.remove(os.path.join(views[1], 'VERSION'))
+        store.materialize(views[1])
+        with open(os.path.join(views[1], 'VERSION')) as f:
+            assert f.read() == '2.2', 'Should materialize the view again'
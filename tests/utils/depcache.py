@@ -0,0 +1,37 @@
+import os
+import tempfile
+from fastensource.utils.depcache import DependencyCache
+
+
+def test_get_put():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'deps.sqlite')
+        cache = DependencyCache(path)
+        assert cache.get('maven', 'a:b', '1', 1) is None, 'Should be a miss'
+        cache.put('maven', 'a:b', '1', 1, [('c:d', '2'), ('e:f', '3')])
+        cache.put('debian', 'glibc', '2.24', 1, [])
+        cache.close()
+        # Persistent across runs
+        cache = DependencyCache(path)
+        assert cache.get('maven', 'a:b', '1', 1) == [('c:d', '2'),
+                                                     ('e:f', '3')],\
+            'Should be the cached dependencies'
+        assert cache.get('debian', 'glibc', '2.24', 1) == [],\
+            'Should be a hit without dependencies'
+        assert cache.get('debian', 'a:b', '1', 1) is None,\
+            'Should be keyed by ecosystem'
+        assert len(cache) == 2, 'Should be 2'
+        cache.close()
+
+
+def test_resolver_version():
+    with tempfile.TemporaryDirectory() as d:
+        cache = DependencyCache(os.path.join(d, 'deps.sqlite'))
+        cache.put('maven', 'a:b', '1', 1, [('c:d', '2')])
+        assert cache.get('maven', 'a:b', '1', 2) is None,\
+            'Should be a miss for another resolver version'
+        cache.put('maven', 'a:b', '1', 2, [('c:d', '3')])
+        assert cache.get('maven', 'a:b', '1', 2) == [('c:d', '3')],\
+            'Should be replaced'
+        assert len(cache) == 1, 'Should be 1'
+        cache.close()
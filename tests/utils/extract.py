@@ -0,0 +1,86 @@
+import io
+import os
+import tarfile
+import zipfile
+import tempfile
+from fastensource.utils.extract import extract, safe_path, Extractor,\
+        UnsafeArchiveError, STAMP
+
+
+def write_tar(path, members):
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def test_extract_tar():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'foo-1.0.tar.gz')
+        write_tar(path, [('foo-1.0/setup.py', b'setup'),
+                         ('foo-1.0/foo/__init__.py', b'')])
+        dest = os.path.join(d, 'out', 'pypi', 'foo', '1.0')
+        assert extract(path, dest)[:2] == (2, 0), 'Should extract 2 files'
+        with open(os.path.join(dest, 'setup.py')) as f:
+            assert f.read() == 'setup', 'Should strip the top-level dir'
+        assert extract(path, dest) is None, 'Should skip unchanged inputs'
+        os.utime(path, ns=(0, 0))
+        assert extract(path, dest)[:2] == (2, 0),\
+            'Should extract changed inputs'
+        assert sorted(os.listdir(os.path.dirname(dest))) == ['1.0'],\
+            'Should not leave temporary directories'
+
+
+def test_extract_zip():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'bar-2.jar')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('META-INF/MANIFEST.MF', 'Manifest')
+            archive.writestr('org/Bar.class', 'class')
+        dest = os.path.join(d, 'maven', 'org:bar', '2')
+        assert extract(path, dest)[:2] == (2, 0), 'Should extract 2 files'
+        assert sorted(os.listdir(dest)) == [STAMP, 'META-INF', 'org'],\
+            'Should keep the layout of the jar'
+
+
+def test_unsafe_paths():
+    assert safe_path('/out', 'a/./b') == '/out/a/b', 'Should be /out/a/b'
+    for name in ('../evil', 'a/../../evil', '/etc/passwd', 'C:/evil'):
+        try:
+            safe_path('/out', name)
+            assert False, 'Should reject {}'.format(name)
+        except UnsafeArchiveError:
+            pass
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'evil-1.tar.gz')
+        write_tar(path, [('evil-1/ok', b''), ('../../evil', b'')])
+        dest = os.path.join(d, 'out', 'evil', '1')
+        try:
+            extract(path, dest)
+            assert False, 'Should raise UnsafeArchiveError'
+        except UnsafeArchiveError:
+            pass
+        assert not os.path.exists(os.path.join(d, 'evil')) and\
+            not os.path.exists(dest), 'Should not extract anything'
+
+
+def test_extractor():
+    with tempfile.TemporaryDirectory() as d:
+        tree = os.path.join(d, 'glibc-2.24')
+        os.makedirs(os.path.join(tree, 'debian'))
+        with open(os.path.join(tree, 'debian', 'control'), 'w') as f:
+            f.write('Source: glibc')
+        errors = io.StringIO()
+        extractor = Extractor(os.path.join(d, 'out'), jobs=2, errors=errors)
+        assert extractor.submit('debian', 'glibc', '2.24', tree),\
+            'Should extract trees'
+        assert not extractor.submit('debian', 'glibc', '2.24',
+                                    tree + '.dsc'),\
+            'Should skip files that are not archives'
+        extractor.submit('pypi', 'broken', '1', os.path.join(d, 'x.zip'))
+        extractor.close()
+        control = os.path.join(d, 'out', 'debian', 'glibc', '2.24', 'debian',
+                               'control')
+        assert os.path.isfile(control), 'Should be in the normalized layout'
+        assert 'Cannot extract' in errors.getvalue(), 'Should log errors'
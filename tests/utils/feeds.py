@@ -0,0 +1,96 @@
+import io
+import os
+import gzip
+import struct
+import tempfile
+from functools import partial
+from http.server import HTTPServer
+from xmlrpc.server import SimpleXMLRPCServer
+from fastensource.utils.feeds import pypi_changes, maven_changes,\
+        filter_changes, normalize_pypi_name
+from fastensource.utils.mavenindex import read_artifacts
+from tests.server import QuietHandler, start_server
+
+
+def write_index(documents):
+    """Write documents in the Maven index format."""
+    out = io.BytesIO()
+    out.write(struct.pack('>bq', 1, 0))
+    for document in documents:
+        out.write(struct.pack('>i', len(document)))
+        for name, value in document.items():
+            name = name.encode('utf-8')
+            value = value.encode('utf-8')
+            out.write(struct.pack('>bH', 0, len(name)) + name)
+            out.write(struct.pack('>i', len(value)) + value)
+    return out.getvalue()
+
+
+def test_read_artifacts():
+    documents = [
+        {'u': 'org.foo|bar|1.0|NA|jar', 'm': '1000'},
+        {'u': 'org.foo|bar|1.0|sources|jar', 'm': '1000'},
+        {'del': 'org.foo|bar|0.9|NA|jar'},
+        {'descriptor': 'NexusIndex'},
+    ]
+    stream = io.BytesIO(write_index(documents))
+    result = [('org.foo:bar', '1.0', 1000)]
+    assert list(read_artifacts(stream)) == result,\
+        'Should be {}'.format(result)
+
+
+def test_filter_changes():
+    versions = {'Django': {'2.2': ''}, 'zope.interface': {}}
+    changes = [('django', '2.2'), ('Zope-Interface', '5.0'), ('flask', '1')]
+    result = {'zope.interface': '5.0'}
+    assert filter_changes(changes, versions, normalize_pypi_name) == result,\
+        'Should be {}'.format(result)
+
+
+def test_pypi_changes():
+    server = SimpleXMLRPCServer(('127.0.0.1', 0), logRequests=False,
+                                allow_none=True)
+    events = [
+        ['Django', '3.0', 1, 'new release', 11],
+        ['Django', '3.0', 1, 'add source file Django-3.0.tar.gz', 12],
+        ['Click', None, 1, 'create', 13],
+    ]
+    server.register_function(lambda: 13, 'changelog_last_serial')
+    server.register_function(
+        lambda serial: [e for e in events if e[4] > serial],
+        'changelog_since_serial'
+    )
+    start_server(server)
+    url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    try:
+        assert pypi_changes(None, url) == ([], 13), 'Should be 13'
+        changes, serial = pypi_changes(11, url)
+        assert changes == [('Django', '3.0')], 'Should be Django 3.0'
+        assert serial == 13, 'Should be 13'
+    finally:
+        server.shutdown()
+
+
+def test_maven_changes():
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory,
+                  'nexus-maven-repository-index.properties'), 'w') as f:
+            f.write('nexus.index.chain-id=42\n'
+                    'nexus.index.last-incremental=2\n')
+        for chunk, version in ((1, '1.0'), (2, '1.1')):
+            name = 'nexus-maven-repository-index.{}.gz'.format(chunk)
+            with gzip.open(os.path.join(directory, name), 'wb') as f:
+                f.write(write_index([
+                    {'u': 'org.foo|bar|{}|NA|jar'.format(version)}
+                ]))
+        handler = partial(QuietHandler, directory=directory)
+        server = start_server(HTTPServer(('127.0.0.1', 0), handler))
+        url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+        try:
+            mark = {'chain': '42', 'chunk': 1}
+            changes, mark = maven_changes(mark, url)
+            assert changes == [('org.foo:bar', '1.1')],\
+                'Should be org.foo:bar 1.1'
+            assert mark == {'chain': '42', 'chunk': 2}, 'Should be chunk 2'
+        finally:
+            server.shutdown()
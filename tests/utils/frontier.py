@@ -0,0 +1,33 @@
+import os
+import tempfile
+from fastensource.utils.frontier import Frontier
+
+
+def test_lifo_with_spills():
+    with tempfile.TemporaryDirectory() as d:
+        frontier = Frontier(capacity=4, directory=d)
+        projects = [('p{}'.format(i), '1') for i in range(20)]
+        frontier.extend(projects)
+        assert len(frontier) == 20, 'Should be 20'
+        assert len(os.listdir(d)) == 1, 'Should spill to disk'
+        popped = [frontier.pop() for _ in range(5)]
+        frontier.append(('q', '1'))
+        popped += [frontier.pop() for _ in range(len(frontier))]
+        expected = projects[::-1]
+        expected.insert(5, ('q', '1'))
+        assert popped == expected, 'Should keep the order of a stack'
+        frontier.close()
+        assert os.listdir(d) == [], 'Should remove the spill file'
+
+
+def test_deduplication():
+    frontier = Frontier(capacity=2)
+    frontier.extend([('a', '1'), ('b', '1'), ('c', '1'), ('a', '1')])
+    frontier.append(('c', '1'))
+    assert len(frontier) == 3, 'Should not add queued projects again'
+    assert [frontier.pop() for _ in range(3)] == [('c', '1'), ('b', '1'),
+                                                  ('a', '1')],\
+        'Should be c, b, a'
+    frontier.append(('a', '1'))
+    assert len(frontier) == 1, 'Should add popped projects again'
+    frontier.close()
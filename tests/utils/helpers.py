@@ -1,7 +1,8 @@
+from io import StringIO
 from time import time
 from fastensource.utils.helpers import is_program, execute_command,\
         find_name_version_pypi, find_name_version_debian, remove_duplicates,\
-        delay
+        delay, memoize
 
 
 @delay
@@ -67,3 +68,36 @@ def test_delay():
     use_delay(delay=1)
     elapsed_time = time() - start_time
     assert elapsed_time > 1, 'Should be greater that 1'
+
+
+def test_execute_command_streams():
+    mes, err = StringIO(), StringIO()
+    assert execute_command(['sh', '-c', 'echo out; echo err >&2'],
+                           mes, err) == 0, 'Should be 0'
+    assert mes.getvalue() == 'out\n', 'Should be out'
+    assert err.getvalue() == 'err\n', 'Should be err'
+
+
+def test_execute_command_timeout():
+    start_time = time()
+    assert execute_command(['sleep', '10'], timeout=0.5) != 0,\
+        'Should not be 0'
+    assert time() - start_time < 5, 'Should be less than 5'
+
+
+def test_memoize():
+    calls = []
+
+    @memoize(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return x * x if x >= 0 else None
+
+    assert [square(2), square(2), square(3)] == [4, 4, 9], 'Should be 4, 4, 9'
+    assert calls == [2, 3], 'Should compute each value once'
+    square(4)
+    square(2)
+    assert calls == [2, 3, 4, 2], 'Should drop the least recently used'
+    square(-1)
+    square(-1)
+    assert calls[-2:] == [-1, -1], 'Should not keep None'
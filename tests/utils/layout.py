@@ -0,0 +1,81 @@
+import os
+import tempfile
+from fastensource.utils.layout import open_layout, migrate, shard, INDEX,\
+        FlatLayout, ShardedLayout
+from fastensource.utils.helpers import ConfigurationError
+from fastensource.utils.versions import VersionStore, write_versions
+
+
+def touch(path):
+    open(path, 'w').close()
+
+
+def test_sharded_layout():
+    with tempfile.TemporaryDirectory() as d:
+        layout = open_layout(d, 'sharded')
+        path = os.path.join(layout.directory('Django', '1.11'),
+                            'Django-1.11.tar.gz')
+        touch(path)
+        assert layout.add('Django', '1.11', path) == path,\
+            'Should not move files that are in place'
+        assert path == os.path.join(d, shard('Django'), 'Django', '1.11',
+                                    'Django-1.11.tar.gz'), \
+            'Should be in <shard>/<name>/<version>'
+        touch(os.path.join(d, 'six-1.0.tar.gz'))
+        moved = layout.add('six', '1.0', 'six-1.0.tar.gz')
+        layout.close()
+        assert os.path.isfile(moved), 'Should move the file'
+        layout = open_layout(d, 'sharded')
+        assert layout.find('Django', '1.11') == [path],\
+            'Should read the index'
+        assert layout.find('six', '1.0') == [moved], 'Should read the index'
+        assert layout.find('six', '2.0') == [], 'Should be empty'
+        try:
+            open_layout(d, 'flat')
+            assert False, 'Should raise ConfigurationError'
+        except ConfigurationError:
+            pass
+
+
+def test_open_layout():
+    with tempfile.TemporaryDirectory() as d:
+        assert isinstance(open_layout(d), FlatLayout), 'Should be flat'
+        touch(os.path.join(d, 'Django-1.11.tar.gz'))
+        try:
+            open_layout(d, 'sharded')
+            assert False, 'Should raise ConfigurationError'
+        except ConfigurationError:
+            pass
+    with tempfile.TemporaryDirectory() as d:
+        layout = open_layout(d, 'sharded')
+        assert isinstance(layout, ShardedLayout),\
+            'Should be sharded for empty directories'
+        # A run that added nothing
+        layout.directory('Django', '2.2')
+        touch(os.path.join(d, 'versions.json'))
+        layout.close()
+        assert isinstance(open_layout(d, 'sharded'), ShardedLayout),\
+            'Should reopen it'
+
+
+def test_migrate():
+    with tempfile.TemporaryDirectory() as d:
+        versions = VersionStore()
+        versions.add('Django', '1.11', 'Apr 04, 2017')
+        versions.add('six', '1.0', 'Apr 04, 2017')
+        write_versions(os.path.join(d, 'versions.json'), versions,
+                       VersionStore())
+        for name in ('Django-1.11.tar.gz', 'six-1.0.zip', 'notes.txt'):
+            touch(os.path.join(d, name))
+        moved, skipped = migrate(d, 'pypi', dry_run=True)
+        assert len(moved) == 2, 'Should find 2 artifacts'
+        assert skipped == ['notes.txt'], 'Should skip notes.txt'
+        assert not os.path.exists(os.path.join(d, INDEX)),\
+            'Should not change anything'
+        migrate(d, 'pypi')
+        assert sorted(os.listdir(d)) == sorted(
+            [INDEX, 'notes.txt', 'versions.json', shard('Django'),
+             shard('six')]), 'Should move the artifacts'
+        assert len(open_layout(d, 'sharded').find('six', '1.0')) == 1,\
+            'Should index the artifacts'
+        assert migrate(d, 'pypi')[0] == [], 'Should be done'
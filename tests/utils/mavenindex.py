@@ -0,0 +1,61 @@
+import os
+import tempfile
+from fastensource.utils.mavenindex import collect_artifacts,\
+        collect_metadata, build_index, MavenIndex
+
+
+METADATA = b'''<?xml version="1.0" encoding="UTF-8"?>
+<metadata>
+  <groupId>org.mockito</groupId>
+  <artifactId>mockito-core</artifactId>
+  <versioning>
+    <release>2.10.0</release>
+    <versions>
+      <version>2.9.0</version>
+      <version>2.10.0</version>
+      <version>2.28.2</version>
+      <version>3.0.0-SNAPSHOT</version>
+    </versions>
+  </versioning>
+</metadata>
+'''
+
+
+def test_maven_index():
+    artifacts = [
+        ('org.foo:bar', '1.0', 1554422400000),
+        ('org.foo:bar', '1.1', 1556409600000),
+        ('org.foo:bar', '1.2-SNAPSHOT', 1557409600000),
+        ('com.baz:qux', '2.0', 0),
+        ('com.baz:qux', '1.0-' + '\u00e9' * 200, 0),
+    ]
+    packages = collect_artifacts(artifacts)
+    with tempfile.TemporaryDirectory() as directory:
+        metadata = os.path.join(directory, 'maven-metadata.xml')
+        with open(metadata, 'wb') as f:
+            f.write(METADATA)
+        releases = dict()
+        collect_metadata(metadata, packages, releases)
+        assert releases == {'org.mockito:mockito-core': '2.10.0'},\
+            'Should be the release version'
+        assert len(packages['org.mockito:mockito-core']) == 4,\
+            'Should have only the versions'
+        path = os.path.join(directory, 'maven.idx')
+        build_index(packages, path, releases)
+        index = MavenIndex(path)
+        try:
+            assert len(index) == 3, 'Should be 3'
+            assert index.last_version('org.foo:bar') == '1.1',\
+                'Should be 1.1'
+            assert index.last_version('org.mockito:mockito-core') ==\
+                '2.10.0', 'Should be the release version'
+            assert index.last_version('org.foo:missing') == '',\
+                'Should be empty'
+            assert index.version_timestamp('org.foo:bar', '1.0') ==\
+                'Apr 05, 2019', 'Should be Apr 05, 2019'
+            assert index.version_timestamp('com.baz:qux', '2.0') == '',\
+                'Should be empty'
+            assert [v for v, _ in index.versions('com.baz:qux')] ==\
+                ['2.0'], 'Should skip versions that are too long'
+        finally:
+            index.close()
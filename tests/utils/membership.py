@@ -0,0 +1,69 @@
+import os
+import tempfile
+from fastensource.utils.membership import build_membership, MembershipFile,\
+        MembershipSet, versions_entries
+from fastensource.utils.versions import VersionStore, write_versions
+
+ENTRIES = [('pypi', 'p{}'.format(i), '1.{}'.format(j))
+           for i in range(100) for j in range(3)]
+
+
+def test_membership_file():
+    with tempfile.TemporaryDirectory() as d:
+        for bits in (10, 0):
+            path = os.path.join(d, 'membership')
+            assert build_membership(path, ENTRIES + ENTRIES[:5], bits) == \
+                300, 'Should count distinct entries'
+            membership = MembershipFile(path)
+            try:
+                assert all(entry in membership for entry in ENTRIES),\
+                    'Should contain the entries'
+                assert ('maven', 'p1', '1.0') not in membership,\
+                    'Should not mix ecosystems'
+                assert not any(('pypi', 'p{}'.format(i), '2.0') in membership
+                               for i in range(100)),\
+                    'Should not contain other entries'
+            finally:
+                membership.close()
+
+
+def test_empty_and_invalid():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'membership')
+        build_membership(path, [])
+        membership = MembershipFile(path)
+        assert ('pypi', 'a', '1') not in membership, 'Should be empty'
+        membership.close()
+        with open(path, 'wb') as f:
+            f.write(b'versions')
+        try:
+            MembershipFile(path)
+            assert False, 'Should raise ValueError'
+        except ValueError:
+            pass
+
+
+def test_membership_set():
+    with tempfile.TemporaryDirectory() as d:
+        versions = VersionStore()
+        versions.add('django', '1.11')
+        p_names = VersionStore()
+        p_names.add('libc6', '2.24')
+        write_versions(os.path.join(d, 'versions.json'), versions, p_names)
+        path = os.path.join(d, 'membership')
+        build_membership(path, list(versions_entries(
+            'pypi', os.path.join(d, 'versions.json'))) + list(
+            versions_entries('debian', os.path.join(d, 'versions.json'))))
+        membership = MembershipFile(path)
+        pypi = MembershipSet(membership, 'pypi')
+        assert ('django', '1.11') in pypi, 'Should be in the file'
+        assert ('libc6', '2.24') not in pypi, 'Should be debian'
+        assert not pypi.add(('django', '1.11')), 'Should not add it again'
+        assert pypi.add(('six', '1.0')), 'Should add six'
+        copy = pypi.copy()
+        copy.add(('flask', '1.0'))
+        assert ('six', '1.0') in copy, 'Should copy the delta'
+        assert ('flask', '1.0') not in pypi, 'Should not share the delta'
+        assert ('libc6', '2.24') in MembershipSet(membership, 'debian'),\
+            'Should have the p_names of debian'
+        membership.close()
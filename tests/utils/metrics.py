@@ -0,0 +1,26 @@
+from fastensource.utils.metrics import Metrics
+
+
+def test_metrics():
+    metrics = Metrics()
+    metrics.incr('http_requests_total', host='pypi.org', status=200)
+    metrics.incr('http_requests_total', host='pypi.org', status=200)
+    metrics.observe('stage_seconds', 0.2, stage='download')
+    metrics.observe('stage_seconds', 7, stage='download')
+    data = metrics.to_dict()
+    assert data['counters'][0]['value'] == 2, 'Should be 2'
+    histogram = data['histograms'][0]
+    assert histogram['count'] == 2, 'Should be 2'
+    assert histogram['buckets']['0.25'] == 1, 'Should be 1'
+    assert histogram['buckets']['+Inf'] == 2, 'Should be 2'
+    text = metrics.to_prometheus()
+    assert ('fastensource_http_requests_total'
+            '{host="pypi.org",status="200"} 2') in text, 'Should be 2'
+    assert ('fastensource_stage_seconds_bucket'
+            '{stage="download",le="10"} 2') in text, 'Should be 2'
+    metrics.set('host_concurrency_limit', 4, host='pypi.org')
+    metrics.reset(keep_gauges=True)
+    data = metrics.to_dict()
+    assert data['counters'] == [] and data['histograms'] == [],\
+        'Should reset the counters and histograms'
+    assert len(data['gauges']) == 1, 'Should keep the gauges'
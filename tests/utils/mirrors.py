@@ -0,0 +1,82 @@
+import time
+import socket
+from http.server import HTTPServer
+from fastensource.utils.mirrors import MirrorSet
+from tests.server import QuietHandler, start_server
+
+
+def mirror(files, delay=0):
+    """Start a mirror serving files ({path: bytes}) after delay seconds."""
+    class Handler(QuietHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = files.get(self.path.lstrip('/'))
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    server = start_server(HTTPServer(('127.0.0.1', 0), Handler))
+    return server, 'http://127.0.0.1:{}/'.format(server.server_port)
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_ranked():
+    mirrors = MirrorSet(['http://a', 'http://b/', 'http://c/'])
+    mirrors.record('http://a/', latency=0.5)
+    mirrors.record('http://b/', latency=0.1)
+    assert mirrors.ranked() == ['http://c/', 'http://b/', 'http://a/'],\
+        'Should try unmeasured mirrors first, then the fastest'
+    mirrors.record('http://a/', latency=0.5, size=1000, elapsed=10)
+    mirrors.record('http://c/', latency=0.2, size=1000, elapsed=10)
+    mirrors.record('http://b/', latency=0.1, size=1000, elapsed=1)
+    assert mirrors.url('f', size=10 ** 6) == 'http://b/f',\
+        'Should rank by latency and throughput'
+    mirrors.record('http://b/', failed=True)
+    assert mirrors.ranked()[-1] == 'http://b/',\
+        'Should penalize failing mirrors'
+
+
+def test_failover():
+    server1, url1 = mirror({})
+    server2, url2 = mirror({'a.jar': b'jar'})
+    down = 'http://127.0.0.1:{}/'.format(closed_port())
+    try:
+        mirrors = MirrorSet([down, url1, url2])
+        r = mirrors.get('a.jar')
+        assert r.status_code == 200 and r.content == b'jar',\
+            'Should fail over to the mirror that has the file'
+        assert mirrors.stats[down].failures == 1,\
+            'Should record the failure of the unreachable mirror'
+        assert mirrors.get('b.jar').status_code == 404,\
+            'Should be 404 if no mirror has the file'
+    finally:
+        server1.shutdown()
+        server2.shutdown()
+
+
+def test_hedge():
+    files = {'a.jar': b'jar'}
+    server1, slow = mirror(files, delay=1)
+    server2, fast = mirror(files)
+    try:
+        mirrors = MirrorSet([slow, fast], hedge=True)
+        for _ in range(5):
+            mirrors.record(slow, latency=0.01)
+        mirrors.record(fast, latency=0.02)
+        start = time.perf_counter()
+        r = mirrors.get('a.jar')
+        elapsed = time.perf_counter() - start
+        assert r.content == b'jar', 'Should be the hedged response'
+        assert elapsed < 0.9, 'Should not wait for the slow mirror'
+        mirrors.close()
+    finally:
+        server1.shutdown()
+        server2.shutdown()
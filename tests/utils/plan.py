@@ -0,0 +1,58 @@
+import os
+import tempfile
+from fastensource.utils.plan import Plan, PlanError
+
+
+def make_plan():
+    plan = Plan('maven')
+    plan.add('a', '1', size=100, depends=[('b', '1'), ('c', '1')])
+    plan.add('b', '1', size=300, depends=[('c', '1')])
+    plan.add('c', '1', size=None)
+    plan.add('a', '1', size=1)
+    return plan
+
+
+def test_add():
+    plan = make_plan()
+    assert len(plan) == 3, 'Should deduplicate nodes'
+    assert ('a', '1') in plan, 'Should be in plan'
+    assert plan.total_bytes() == (400, 1), 'Should be (400, 1)'
+
+
+def test_order():
+    plan = make_plan()
+    keys = [(n['project'], n['version']) for n in plan.order('size')]
+    assert keys[0] == ('b', '1'), 'Should be largest first'
+    keys = [n['project'] for n in plan.order('topological')]
+    assert keys == ['c', 'b', 'a'], 'Should be dependencies first'
+    keys = [n['project'] for n in plan.order('plan')]
+    assert keys == ['a', 'b', 'c'], 'Should be resolution order'
+
+
+def test_estimate():
+    plan = make_plan()
+    # 600 bytes (c counts as the average 200), one job, no latency
+    assert plan.estimate(1, bandwidth=100, latency=0) == 6,\
+        'Should be 6 seconds'
+    assert plan.estimate(3, bandwidth=300, latency=0) == 3,\
+        'Should be bound by the largest artifact'
+
+
+def test_save_load():
+    plan = make_plan()
+    plan.roots = [('a', 'Unspecified')]
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'plan.json')
+        plan.save(path)
+        loaded = Plan.load(path)
+        with open(path, 'w') as f:
+            f.write('{}')
+        try:
+            Plan.load(path)
+            raised = False
+        except PlanError:
+            raised = True
+    assert loaded.to_dict() == plan.to_dict(), 'Should be the same plan'
+    assert loaded.nodes[('a', '1')]['depends'][0] == ('b', '1'),\
+        'Should be tuples'
+    assert raised, 'Should raise PlanError'
@@ -0,0 +1,47 @@
+import os
+import time
+import pstats
+import tempfile
+from fastensource.utils import metrics
+from fastensource.utils.profiling import Profiler
+
+
+def busy_parsing():
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        pass
+
+
+def busy_download():
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profiler_stages():
+    with tempfile.TemporaryDirectory() as d:
+        with Profiler(d, 'both', ['parsing'], interval=0.001) as profiler:
+            assert profiler._stage_hook in metrics.stage_hooks,\
+                'Should install the stage hook'
+            with metrics.timed('parse'):
+                busy_parsing()
+            with metrics.timed('download'):
+                busy_download()
+        assert profiler._stage_hook not in metrics.stage_hooks,\
+            'Should remove the stage hook'
+        suffixes = sorted(os.path.splitext(path)[1]
+                          for path in profiler.paths)
+        assert suffixes == ['.collapsed', '.prof', '.txt'],\
+            'Should write the three profiles'
+        assert all(os.path.isfile(path) for path in profiler.paths),\
+            'Should write the files'
+        prof = [p for p in profiler.paths if p.endswith('.prof')][0]
+        functions = [name for _, _, name in pstats.Stats(prof).stats]
+        assert 'busy_parsing' in functions, 'Should profile parse'
+        assert 'busy_download' not in functions,\
+            'Should not profile download'
+        collapsed = [p for p in profiler.paths if p.endswith('.collapsed')]
+        with open(collapsed[0]) as f:
+            samples = f.read()
+        assert 'busy_parsing' in samples, 'Should sample parse'
+        assert 'busy_download' not in samples, 'Should not sample download'
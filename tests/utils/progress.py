@@ -0,0 +1,46 @@
+import json
+from io import StringIO
+from fastensource.utils.metrics import Metrics
+from fastensource.utils.progress import ProgressReporter
+
+
+def reporter(mode, registry=None):
+    stream = StringIO()
+    progress = ProgressReporter('pypi', mode, interval=0, stream=stream,
+                                registry=registry or Metrics())
+    return progress, stream
+
+
+def test_snapshot():
+    registry = Metrics()
+    registry.incr('artifacts_total', 5, ecosystem='pypi')
+    registry.incr('http_requests_total', 20, host='pypi.org')
+    progress, _ = reporter('none', registry)
+    progress.update(20, 30)
+    data = progress.snapshot(progress.started + 10)
+    assert data['discovered'] == 50, 'Should be processed + pending'
+    assert data['eta'] == 15, 'Should be pending / rate'
+    assert data['artifacts'] == 5, 'Should be 5'
+    assert data['artifacts_per_sec'] == 0.5, 'Should be 0.5'
+    assert data['host_requests_per_sec'] == {'pypi.org': 2},\
+        'Should be 2 per second'
+    progress.update(0, 30)
+    assert progress.snapshot()['eta'] is None, 'Should be unknown'
+
+
+def test_render():
+    progress, stream = reporter('json')
+    progress.update(1, 2)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1, 'Should write one line'
+    assert json.loads(lines[0])['pending'] == 2, 'Should be 2'
+    progress, stream = reporter('tty')
+    progress.update(1, 2)
+    line = stream.getvalue()
+    assert line.startswith('\r') and line.count('\r') == 1 and\
+        '\n' not in line, 'Should write a single line in place'
+    assert '1 done, 2 pending' in line, 'Should show the counts'
+    progress, stream = reporter('none')
+    progress.update(1, 2)
+    progress.finish()
+    assert stream.getvalue() == '', 'Should write nothing'
@@ -0,0 +1,40 @@
+import os
+import tempfile
+from fastensource.utils.projects import HashedSet, parse_row, read_projects,\
+        take, count_rows
+
+
+def test_hashed_set():
+    seen = HashedSet([('a', '1')])
+    assert seen.add(('a', '2')) is True, 'Should be added'
+    assert seen.add(('a', '1')) is False, 'Should exist'
+    assert ('a', '2') in seen, 'Should be in set'
+    assert ('b', '1') not in seen, 'Should not be in set'
+    assert len(seen) == 2, 'Should be 2'
+
+
+def test_parse_row():
+    assert parse_row(['Django'], 1) == [('Django', 'Unspecified')],\
+        'Should be Unspecified'
+    assert parse_row(['Django', '2.2'], 2) == [('Django', '2.2')],\
+        'Should be (Django, 2.2)'
+    assert parse_row(['a,1', 'b,2'], 3) == [('a', '1'), ('b', '2')],\
+        'Should be both sides'
+    assert parse_row([], 3) == [], 'Should skip empty rows'
+
+
+def test_read_projects():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'projects.csv')
+        with open(path, 'w') as f:
+            f.write('a,1;b,1\na,1;b,2\n\na,1;c,1\n')
+        projects = read_projects(path, 3, seen=HashedSet([('c', '1')]))
+        assert take(projects, 2) == [('a', '1'), ('b', '1')],\
+            'Should be the first chunk'
+        assert projects.unread_rows() == 3, 'Should be 3'
+        assert list(projects) == [('b', '2')],\
+            'Should skip duplicates and seen projects'
+        assert projects.unread_rows() == 0, 'Should be 0'
+        with open(path, 'a') as f:
+            f.write('d,1;e,1')
+        assert count_rows(path) == 5, 'Should count a last partial line'
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import threading
+from functools import partial
+from http.server import HTTPServer
+from urllib.request import urlopen
+from fastensource.utils.proxy import CachingProxy, make_server
+from tests.server import QuietHandler, start_server
+
+
+def test_caching_proxy():
+    with tempfile.TemporaryDirectory() as upstream_dir,\
+            tempfile.TemporaryDirectory() as cache_dir:
+        os.makedirs(os.path.join(upstream_dir, 'org/foo/bar/1.0'))
+        with open(os.path.join(upstream_dir,
+                  'org/foo/bar/1.0/bar-1.0.jar'), 'wb') as f:
+            f.write(b'jar' * 1000)
+        upstream = start_server(HTTPServer(
+            ('127.0.0.1', 0), partial(QuietHandler, directory=upstream_dir)
+        ))
+        proxy = CachingProxy(cache_dir, upstreams={
+            'maven2': 'http://127.0.0.1:{}/'.format(
+                upstream.server_address[1])
+        })
+        server = start_server(make_server(proxy, port=0))
+        url = 'http://127.0.0.1:{}/maven2/'.format(server.server_address[1])
+        results = list()
+
+        def fetch():
+            with urlopen(url + 'org/foo/bar/1.0/bar-1.0.jar') as r:
+                results.append(r.read())
+        try:
+            threads = [threading.Thread(target=fetch) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            fetch()
+            upstream.shutdown()
+            fetch()
+        finally:
+            server.shutdown()
+            upstream.shutdown()
+        assert results == [b'jar' * 1000] * 6, 'Should be the jar'
+        stats = proxy.stats.report()
+        assert stats['misses'] == 1, 'Should be 1'
+        assert stats['hits'] + stats['coalesced'] == 5, 'Should be 5'
+
+
+def test_cache_keys():
+    proxy = CachingProxy('/cache')
+    url, path = proxy.resolve('http://deb.debian.org/a?x=1')
+    assert url == 'http://deb.debian.org/a?x=1', 'Should keep the query'
+    assert path != proxy.resolve('http://deb.debian.org/a?x=2')[1] and\
+        path != proxy.resolve('http://deb.debian.org/a')[1],\
+        'Should cache each query apart'
+    url, path = proxy.resolve('/simple/six/?format=json')
+    assert url == 'https://pypi.org/simple/six/?format=json',\
+        'Should forward the query'
+    assert path.startswith('/cache/simple/six/index.html?'),\
+        'Should be in the directory of the page'
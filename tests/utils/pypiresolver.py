@@ -0,0 +1,165 @@
+import io
+import os
+import json
+import tarfile
+import tempfile
+from http.server import HTTPServer
+from fastensource.utils.pypiresolver import MetadataResolver, parse_page,\
+        parse_requires_txt, read_sdist_requirements, sdist_version,\
+        ResolutionError, DynamicMetadata, SIMPLE_JSON
+from tests.server import QuietHandler, start_server
+
+
+def sdist(name, version, files):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode='w:gz') as tar:
+        for path, content in files.items():
+            info = tarfile.TarInfo('{}-{}/{}'.format(name, version, path))
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content.encode('utf-8')))
+    return out.getvalue()
+
+
+def pkg_info(name, version, requires=()):
+    return 'Metadata-Version: 2.2\nName: {}\nVersion: {}\n{}'.format(
+        name, version, ''.join('Requires-Dist: {}\n'.format(r)
+                               for r in requires))
+
+
+def index(projects):
+    """Serve a PEP 691 index of {name: {version: [requirements]}}."""
+    files = dict()
+    for name, versions in projects.items():
+        for version, requires in versions.items():
+            filename = '{}-{}.tar.gz'.format(name, version)
+            files['/files/' + filename] = sdist(name, version, {
+                'PKG-INFO': pkg_info(name, version, requires)
+            })
+
+    class Handler(QuietHandler):
+        def do_GET(self):
+            parts = self.path.strip('/').split('/')
+            content_type = 'application/octet-stream'
+            if self.path in files:
+                body = files[self.path]
+            elif parts[0] == 'simple' and parts[1] in projects:
+                body = json.dumps({'files': [
+                    {'filename': '{}-{}.tar.gz'.format(parts[1], v),
+                     'url': '/files/{}-{}.tar.gz'.format(parts[1], v),
+                     'hashes': {}}
+                    for v in projects[parts[1]]
+                ]}).encode('utf-8')
+                content_type = SIMPLE_JSON
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    server = start_server(HTTPServer(('127.0.0.1', 0), Handler))
+    return server, 'http://127.0.0.1:{}/simple/'.format(server.server_port)
+
+
+def test_parse_page():
+    assert sdist_version('zope.interface-5.0.tar.gz', 'Zope-Interface') ==\
+        '5.0', 'Should be 5.0'
+    assert sdist_version('foo-1.0-py3-none-any.whl', 'foo') is None,\
+        'Should skip wheels'
+    html = (b'<a href="../../f/foo-1.0.tar.gz#sha256=0">foo-1.0.tar.gz</a>'
+            b'<a href="/f/foo-2.0.zip" data-yanked="">foo-2.0.zip</a>'
+            b'<a href="/f/foo-3.0.tar.gz" data-requires-python="&gt;=4"'
+            b' data-core-metadata="sha256=1">foo-3.0.tar.gz</a>')
+    candidates = parse_page(html, 'text/html', 'http://i/simple/foo/', 'foo')
+    assert [c.version for c in candidates] == ['1.0', '2.0', '3.0'],\
+        'Should be 1.0, 2.0, 3.0'
+    assert candidates[0].url == 'http://i/f/foo-1.0.tar.gz#sha256=0',\
+        'Should resolve relative urls'
+    assert candidates[1].yanked and not candidates[0].yanked,\
+        'Should find yanked files'
+    assert candidates[2].requires_python == '>=4' and\
+        candidates[2].metadata, 'Should read the data attributes'
+
+
+def test_sdist_requirements():
+    text = '\n[test]\npytest\n\n[:python_version < "3"]\nmock\n'
+    assert parse_requires_txt('six>=1\n' + text) == [
+        'six>=1', 'pytest; extra == "test"',
+        'mock; (python_version < "3")'], 'Should convert sections'
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'foo-1.0.tar.gz')
+        cases = [
+            ({'PKG-INFO': pkg_info('foo', '1.0', ['six']),
+              'setup.py': ''}, ['six']),
+            ({'PKG-INFO': 'Metadata-Version: 2.1\n', 'setup.py': '',
+              'foo.egg-info/requires.txt': 'six\n'}, ['six']),
+            ({'setup.cfg': '[options]\ninstall_requires =\n    six\n',
+              'setup.py': ''}, ['six']),
+        ]
+        for files, requirements in cases:
+            with open(path, 'wb') as f:
+                f.write(sdist('foo', '1.0', files))
+            assert read_sdist_requirements(path) == requirements,\
+                'Should be {}'.format(requirements)
+        with open(path, 'wb') as f:
+            f.write(sdist('foo', '1.0', {'PKG-INFO': 'Metadata-Version: 2.1',
+                                         'setup.py': ''}))
+        try:
+            read_sdist_requirements(path)
+            assert False, 'Should raise DynamicMetadata'
+        except DynamicMetadata:
+            pass
+        with open(path, 'wb') as f:
+            f.write(sdist('foo', '1.0', {
+                'setup.cfg': '[options]\ninstall_requires = file: r.txt\n'
+            }))
+        try:
+            read_sdist_requirements(path)
+            assert False, 'Should raise DynamicMetadata for file:'
+        except DynamicMetadata:
+            pass
+        invalid = [sdist('foo', '1.0', {'setup.cfg': '[options]\na = 1\n'
+                                                     'a = 2\n'}),
+                   b'not a tar']
+        for content in invalid:
+            with open(path, 'wb') as f:
+                f.write(content)
+            try:
+                read_sdist_requirements(path)
+                assert False, 'Should raise ResolutionError'
+            except ResolutionError:
+                pass
+
+
+def test_resolve():
+    server, url = index({
+        'app': {'1.0': ['lib>=1', 'extra[fast]',
+                        'win; sys_platform == "win32"']},
+        'lib': {'1.0': [], '1.5': [], '2.0rc1': []},
+        'extra': {'1.0': ['speedup; extra == "fast"', 'lib<2']},
+        'speedup': {'0.1': []},
+        'conflict': {'1.0': ['lib<1']},
+    })
+    resolver = MetadataResolver(url, jobs=4)
+    try:
+        distributions = resolver.resolve('app')
+        versions = {d.name: d.version for d in distributions}
+        assert versions == {'app': '1.0', 'lib': '1.5', 'extra': '1.0',
+                            'speedup': '0.1'}, 'Should be {}'.format(versions)
+        assert distributions[0].depends == [('lib', '1.5'), ('extra', '1.0')],\
+            'Should list the dependencies of app'
+        assert resolver.resolve('lib', '2.0rc1')[0].version == '2.0rc1',\
+            'Should resolve pinned pre-releases'
+        try:
+            resolver.resolve('conflict')
+            assert False, 'Should raise ResolutionError'
+        except ResolutionError:
+            pass
+        with tempfile.TemporaryDirectory() as d:
+            filenames = resolver.fetch(distributions, d)
+            assert sorted(os.listdir(d)) == sorted(filenames),\
+                'Should download the sdists'
+    finally:
+        resolver.close()
+        server.shutdown()
@@ -0,0 +1,16 @@
+import sys
+from io import StringIO
+from fastensource.utils.runner import run_command
+
+
+def test_exit_codes():
+    out, err = StringIO(), StringIO()
+    result = run_command([sys.executable, '-c', 'print(1); exit(3)'],
+                         out, err)
+    assert result.exit_code == 3, 'Should be the exit status'
+    assert out.getvalue() == '1\n', 'Should stream stdout'
+    result = run_command([sys.executable, '-c',
+                          'import os; os.kill(os.getpid(), 9)'], out, err)
+    assert result.exit_code == -9, 'Should be minus the signal'
+    result = run_command(['fastensource-missing-program'], out, err)
+    assert result.exit_code == 127, 'Should be the shell code for not found'
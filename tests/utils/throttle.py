@@ -0,0 +1,120 @@
+from time import time
+from threading import Thread
+from http.server import HTTPServer
+from fastensource.utils.throttle import HostThrottle, AdaptiveThrottle,\
+        CircuitOpenError, parse_retry_after
+from fastensource.utils.helpers import send_request, set_throttle,\
+        get_throttle
+from tests.server import QuietHandler, start_server
+
+
+def test_host_throttle_delay():
+    throttle = HostThrottle(concurrency=2, delay=0.2)
+    start_time = time()
+    for _ in range(3):
+        with throttle.limit('example.com'):
+            pass
+    elapsed_time = time() - start_time
+    assert elapsed_time >= 0.4, 'Should be greater than 0.4'
+
+
+def test_host_throttle_concurrency():
+    throttle = HostThrottle(concurrency=2)
+    active = []
+    peak = []
+
+    def work():
+        with throttle.limit('example.com'):
+            active.append(1)
+            peak.append(len(active))
+            start_time = time()
+            while time() - start_time < 0.05:
+                pass
+            active.pop()
+
+    threads = [Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) <= 2, 'Should be at most 2'
+
+
+def test_adaptive_throttle_aimd():
+    throttle = AdaptiveThrottle(initial=4, max_concurrency=8)
+    for _ in range(20):
+        throttle.acquire('example.com')
+        throttle.release('example.com', 0.01, 200)
+    assert throttle.snapshot('example.com')['limit'] > 4,\
+        'Should increase while latency is healthy'
+    throttle.acquire('example.com')
+    throttle.release('example.com', 0.01, 429)
+    state = throttle.snapshot('example.com')
+    assert state['limit'] <= 4, 'Should halve on 429'
+    assert state['rate'] is not None, 'Should limit the rate on 429'
+    throttle.configure(max_concurrency=2, retries=1)
+    state = throttle.snapshot('example.com')
+    assert state['limit'] == 2 and state['rate'] is not None,\
+        'Should keep the state of the host within the new bounds'
+    assert throttle.retries == 1, 'Should be 1'
+
+
+def test_adaptive_throttle_circuit_breaker():
+    throttle = AdaptiveThrottle(threshold=2, cooldown=0.1)
+    for _ in range(2):
+        throttle.acquire('example.com')
+        throttle.release('example.com')
+    try:
+        throttle.acquire('example.com')
+        raised = False
+    except CircuitOpenError:
+        raised = True
+    assert raised, 'Should open after 2 failures'
+    start_time = time()
+    while True:
+        try:
+            throttle.acquire('example.com')
+            break
+        except CircuitOpenError:
+            assert time() - start_time < 2, 'Should let a probe through'
+    throttle.release('example.com', 0.01, 200)
+    assert throttle.snapshot('example.com')['open'] is False,\
+        'Should close after a successful probe'
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120, 'Should be 120'
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT',
+                             now=1445412470) == 10, 'Should be 10'
+    assert parse_retry_after('soon') is None, 'Should be None'
+
+
+class FlakyHandler(QuietHandler):
+    # Status codes of the responses, one per request
+    statuses = []
+
+    def do_GET(self):
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+
+def test_send_request_retries():
+    server = start_server(HTTPServer(('127.0.0.1', 0), FlakyHandler))
+    previous = get_throttle()
+    set_throttle(AdaptiveThrottle(retries=2))
+    try:
+        url = 'http://127.0.0.1:{}/'.format(server.server_port)
+        FlakyHandler.statuses = [429, 503]
+        assert send_request('GET', url).status_code == 200,\
+            'Should retry 429 and 503'
+        FlakyHandler.statuses = [503, 503, 503]
+        assert send_request('GET', url).status_code == 503,\
+            'Should return the last response'
+    finally:
+        set_throttle(previous)
+        server.shutdown()
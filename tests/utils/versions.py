@@ -0,0 +1,76 @@
+import os
+import json
+import tempfile
+from fastensource.utils.versions import VersionStore, read_versions,\
+        write_versions, encode_timestamp, decode_timestamp, VersionsCache
+
+
+def test_timestamps():
+    ordinal = encode_timestamp('Sep 25, 2018')
+    assert decode_timestamp(ordinal) == 'Sep 25, 2018',\
+        'Should be Sep 25, 2018'
+    assert decode_timestamp(encode_timestamp('')) == '', 'Should be empty'
+
+
+def test_version_store():
+    store = VersionStore()
+    assert store.add('Django', '2.2', 'Apr 01, 2019') is True,\
+        'Should be added'
+    assert store.add('Django', '1.11', '') is True, 'Should be added'
+    assert store.add('Django', '2.2', 'May 01, 2019') is False,\
+        'Should exist'
+    store.add('pytz', '2.2', 'yesterday')
+    assert 'Django' in store and 'flask' not in store, 'Should be Django'
+    assert store['Django']['2.2'] == 'Apr 01, 2019',\
+        'Should be Apr 01, 2019'
+    assert store['Django']['1.11'] == '', 'Should be empty'
+    assert store['pytz']['2.2'] == 'yesterday', 'Should keep raw timestamps'
+    assert '3.0' not in store['Django'], 'Should not be in versions'
+    assert dict(store['Django']) == {'2.2': 'Apr 01, 2019', '1.11': ''},\
+        'Should be a mapping'
+    assert sorted(store.pairs()) == [('Django', '1.11'), ('Django', '2.2'),
+                                     ('pytz', '2.2')], 'Should be 3 pairs'
+
+
+def test_read_write_versions():
+    data = {'packages': {'glibc': {'2.24': 'Apr 17, 2017'},
+                         'zlib': {'1.2.8': '', '1.2.11': 'Jan 15, 2017'}},
+            'p_names': {'libc6': ['2.24-11', '2.24-12']}}
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'versions.json')
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        versions, p_names = read_versions(path)
+        write_versions(path, versions, p_names)
+        with open(path) as f:
+            written = json.load(f)
+    assert written['packages'] == data['packages'], 'Should be the same'
+    assert sorted(written['p_names']['libc6']) == ['2.24-11', '2.24-12'],\
+        'Should be the same'
+
+
+def test_interleaved_adds():
+    store = VersionStore()
+    expected = dict()
+    for i in range(200):
+        project, version = 'p{}'.format(i % 7), '1.{}'.format(i)
+        store.add(project, version, 'Jan 01, 2000')
+        expected.setdefault(project, set()).add(version)
+    assert {p: set(store[p]) for p in store} == expected,\
+        'Should keep the versions of each project'
+
+
+def test_versions_cache():
+    cache = VersionsCache()
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'versions.json')
+        versions, p_names = cache.get(path)
+        assert len(versions) == 0, 'Should be empty'
+        versions.add('a', '1.0', 'Sep 25, 2018')
+        write_versions(path, versions, p_names)
+        cache.put(path, versions, p_names)
+        assert cache.get(path)[0] is versions, 'Should be kept in memory'
+        other = VersionStore()
+        other.add('bb', '2.0')
+        write_versions(path, other, p_names)
+        assert 'bb' in cache.get(path)[0], 'Should read the changed file'
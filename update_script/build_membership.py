@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+"""Build the shared membership file of the downloaded artifacts (see
+fastensource/utils/membership.py) from versions files, for --membership.
+"""
+
+
+import argparse
+from itertools import chain
+from fastensource.utils.membership import build_membership,\
+        versions_entries, DEFAULT_BITS_PER_ENTRY
+
+ECOSYSTEMS = ('pypi', 'maven', 'debian')
+
+
+def parse_source(source):
+    """Parse ECOSYSTEM=VERSIONS_FILE."""
+    ecosystem, _, path = source.partition('=')
+    if ecosystem not in ECOSYSTEMS or not path:
+        raise argparse.ArgumentTypeError(
+            'expected ECOSYSTEM=FILE with ECOSYSTEM one of {}'.format(
+                ', '.join(ECOSYSTEMS)))
+    return ecosystem, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(
+                                     'Build a memory-mappable membership '
+                                     'file of the (ecosystem, project, '
+                                     'version) entries of versions files.'))
+    parser.add_argument('output', help='File to save the membership file')
+    parser.add_argument('sources', nargs='+', type=parse_source,
+                        metavar='ECOSYSTEM=FILE',
+                        help='e.g. pypi=PyPI/versions.json')
+    parser.add_argument('-b', '--bits-per-entry', type=int,
+                        default=DEFAULT_BITS_PER_ENTRY,
+                        help=('Size of the Bloom filter (0: no Bloom '
+                              'filter).'))
+    args = parser.parse_args()
+
+    entries = chain.from_iterable(versions_entries(ecosystem, path)
+                                  for ecosystem, path in args.sources)
+    count = build_membership(args.output, entries, args.bits_per_entry)
+    print('Saved {} entries to {}'.format(count, args.output))
+
+
+if __name__ == '__main__':
+    main()
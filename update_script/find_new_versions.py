@@ -29,12 +29,37 @@ using versions.json
 
 
 import sys
+import os
+import time
 import argparse
 import json
 import csv
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from fastensource.utils.scrappers import find_last_version_maven,\
         find_last_version_pypi
+from fastensource.utils.udd import find_last_version_udd
+from fastensource.utils.throttle import HostThrottle
+from fastensource.utils.feeds import pypi_changes, maven_changes,\
+        filter_changes, normalize_pypi_name, FeedResetError, PYPI_XMLRPC_URL
+from fastensource.utils.mavenindex import MAVEN_INDEX_URL, MavenIndex
+from fastensource.utils.helpers import ConnectionError
+
+
+# For each language, the function to find the last version of a package
+# and the host that this function queries.
+LAST_VERSION_SOURCES = {
+    'java': (find_last_version_maven, 'mvnrepository.com'),
+    'python': (find_last_version_pypi, 'pypi.org'),
+    'c': (find_last_version_udd, 'udd'),
+}
+
+# For each language, the change feed, its default url, and the function to
+# normalize package names before matching them with versions.json.
+FEEDS = {
+    'java': (maven_changes, MAVEN_INDEX_URL, None),
+    'python': (pypi_changes, PYPI_XMLRPC_URL, normalize_pypi_name),
+}
 
 
 def check_if_package_exists(package, packages):
@@ -54,24 +79,167 @@ def check_if_package_exists(package, packages):
     return False
 
 
+def parse_timestamp(timestamp):
+    """Parse a versions.json timestamp (e.g. Sep 25, 2018).
+
+    Timestamps that we failed to find are saved as empty strings; they are
+    considered older than any other timestamp.
+    """
+    try:
+        return datetime.strptime(timestamp, '%b %d, %Y')
+    except ValueError:
+        return datetime.min
+
+
 def find_youngest_version(versions):
-    versions_datetimes = [datetime.strptime(timestamp, '%b %d, %Y')
-                          for timestamp in versions.values()]
-    # Youngest timestamp
-    youngest = min(versions_datetimes).strftime('%b %-d, %Y')
-    # Return the version of youngest timestamp
-    return list(versions.keys())[list(versions.values()).index(youngest)]
+    """Return the version with the most recent release timestamp.
 
+    Args:
+        versions (dict): version: timestamp
 
-def find_new_versions(versions, packages, find_last_version, delay):
-    # keys are the packages and values are dicts with version: timestamp
-    results = set()
+    """
+    return max(versions.items(), key=lambda item: parse_timestamp(item[1]))[0]
+
+
+def read_state(path):
+    """Read the state file of previous runs.
+
+    The state contains for each package the youngest version that we have
+    (current), the number of versions that current was computed from
+    (count), the last version found upstream (latest), and when the package
+    was checked (checked, seconds since epoch).
+
+    Returns:
+        state (dict)
+
+    """
+    if path and os.path.isfile(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {'packages': {}}
+
+
+def write_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def update_current_versions(versions, state):
+    """Update the precomputed youngest version of each package.
+
+    Only packages with new versions since the last run are rescanned.
+    """
+    packages = state['packages']
     for key, value in versions.items():
+        entry = packages.setdefault(key, {})
+        if entry.get('count') != len(value) or 'current' not in entry:
+            entry['current'] = find_youngest_version(value)
+            entry['count'] = len(value)
+
+
+def find_new_versions(versions, packages, find_last_version, delay,
+                      state=None, window=0, workers=16, throttle=None,
+                      host='', find_local_version=None):
+    """Find the packages whose last version differs from the youngest
+    version we have.
+
+    Args:
+        versions (dict): packages from versions.json
+        packages (list): packages to check, or False for all packages
+        find_last_version (function): returns the last version of a package
+        delay (float): minimum seconds between two requests to host
+        state (dict): state of previous runs, updated in place
+        window (float): skip packages checked in the last window seconds
+        workers (int): number of concurrent checks
+        throttle (HostThrottle): per host limits
+        host (str): host that find_last_version queries
+        find_local_version (function): returns the last version of a
+            package without a request (e.g. from a local Maven index), or
+            an empty string to query host
+
+    Returns:
+        results (set): of tuples with package, last version
+
+    """
+    if state is None:
+        state = {'packages': {}}
+    if throttle is None:
+        throttle = HostThrottle(delay=delay)
+    update_current_versions(versions, state)
+    now = time.time()
+    to_check = list()
+    for key in versions:
+        if not check_if_package_exists(key, packages):
+            continue
+        entry = state['packages'][key]
+        if window and 'latest' in entry and \
+           now - entry.get('checked', 0) < window:
+            continue
+        to_check.append(key)
+
+    def check(key):
+        if find_local_version is not None:
+            version = find_local_version(key)
+            if version:
+                return key, version
+        with throttle.limit(host):
+            return key, find_last_version(key, delay=0)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, last_version in executor.map(check, to_check):
+            entry = state['packages'][key]
+            entry['checked'] = now
+            if last_version:
+                entry['latest'] = last_version
+
+    results = set()
+    for key in versions:
+        if not check_if_package_exists(key, packages):
+            continue
+        entry = state['packages'][key]
+        latest = entry.get('latest')
+        if latest and latest != entry['current'] and \
+           latest not in versions[key]:
+            results.add((key, latest))
+    return results
+
+
+def find_feed_versions(versions, packages, language, state, url=None):
+    """Find new versions using the change feed of a language.
+
+    The high-water mark of the feed is kept in the state. In the first run,
+    or when the upstream feed was reset, only the high-water mark is saved
+    and no new versions are returned.
+
+    Returns:
+        results (set): of tuples with package, last version
+
+    """
+    feed, default_url, normalize = FEEDS[language]
+    url = url or default_url
+    marks = state.setdefault('feeds', {})
+    mark = marks.get(language)
+    try:
+        changes, mark = feed(mark, url)
+    except FeedResetError as e:
+        print('{}: run without --feed to check all packages'.format(e),
+              file=sys.stderr)
+        changes, mark = feed(None, url)
+    if language not in marks:
+        print('Feed high-water mark saved; run without --feed to check '
+              'all packages', file=sys.stderr)
+    marks[language] = mark
+    update_current_versions(versions, state)
+    now = time.time()
+    results = set()
+    for key, version in filter_changes(changes, versions, normalize).items():
+        entry = state['packages'][key]
+        entry['checked'] = now
+        entry['latest'] = version
         if check_if_package_exists(key, packages):
-            youngest_version = find_youngest_version(value)
-            last_version = find_last_version(key, delay=delay)
-            if youngest_version != last_version:
-                results.add((key, last_version))
+            results.add((key, version))
     return results
 
 
@@ -85,9 +253,27 @@ def main():
                         help='List of packages to check for new versions')
     parser.add_argument('-o', '--output',
                         help='Filename to save new versions')
-    parser.add_argument('-d', '--delay',
-                        help='Seconds to wait before each request',
-                        default=5)
+    parser.add_argument('-d', '--delay', type=float,
+                        help='Minimum seconds between two requests to a host',
+                        default=0)
+    parser.add_argument('-w', '--workers', type=int, default=16,
+                        help='Number of packages to check concurrently')
+    parser.add_argument('-c', '--per-host', type=int, default=8,
+                        help='Maximum concurrent requests to a host')
+    parser.add_argument('-s', '--state',
+                        help=('File to save the state between runs '
+                              '(default: <versions>.state)'))
+    parser.add_argument('-W', '--skip-window', type=float, default=24,
+                        help=('Hours after a check during which a package '
+                              'is not checked again'))
+    parser.add_argument('-f', '--feed', action='store_true',
+                        help=('Find new versions from the upstream change '
+                              'feed since the last run (python, java)'))
+    parser.add_argument('--feed-url',
+                        help='Url of the change feed (for mirrors and tests)')
+    parser.add_argument('-i', '--maven-index',
+                        help=('Local Maven index to find the last versions '
+                              'without network requests (java)'))
     args = parser.parse_args()
 
     if args.language not in ('java', 'python', 'c'):
@@ -107,16 +293,29 @@ def main():
     else:
         packages = False
 
-    # We could use attr here
-    if language == 'java':
-        find_last_version = find_last_version_maven
-    elif language == 'python':
-        find_last_version = find_last_version_pypi
+    state_path = args.state or args.versions + '.state'
+    state = read_state(state_path)
+    if args.feed:
+        if language not in FEEDS:
+            print('Feed mode supports only java, and python')
+            sys.exit(1)
+        new_versions = find_feed_versions(versions, packages, language,
+                                          state, args.feed_url)
     else:
-        raise NotImplementedError
-
-    new_versions = find_new_versions(versions, packages, find_last_version,
-                                     args.delay)
+        find_last_version, host = LAST_VERSION_SOURCES[language]
+        find_local_version = None
+        if language == 'java' and args.maven_index:
+            find_local_version = MavenIndex(args.maven_index).last_version
+        throttle = HostThrottle(concurrency=args.per_host, delay=args.delay)
+        new_versions = find_new_versions(versions, packages,
+                                         find_last_version, args.delay,
+                                         state=state,
+                                         window=args.skip_window * 3600,
+                                         workers=args.workers,
+                                         throttle=throttle, host=host,
+                                         find_local_version=(
+                                             find_local_version))
+    write_state(state_path, state)
 
     if args.output:
         with open(args.output, 'w') as f:
@@ -129,4 +328,8 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    try:
+        main()
+    except ConnectionError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+"""Build a local Maven index for fastensource from the Maven Central
+indexer export (nexus-maven-repository-index.gz) or maven-metadata.xml files.
+"""
+
+
+import os
+import argparse
+from fastensource.utils.mavenindex import open_index, read_artifacts,\
+        collect_artifacts, collect_metadata, build_index
+
+
+def find_metadata_files(directory):
+    """Find the maven-metadata.xml files under a directory."""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name == 'maven-metadata.xml':
+                yield os.path.join(root, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(
+                                     'Build a local Maven index with the '
+                                     'versions and upload timestamps of '
+                                     'packages.'))
+    parser.add_argument('output', help='File to save the index')
+    parser.add_argument('sources', nargs='+',
+                        help=('Maven indexer exports (.gz), or directories '
+                              'with maven-metadata.xml files'))
+    args = parser.parse_args()
+
+    packages = dict()
+    releases = dict()
+    for source in args.sources:
+        if os.path.isdir(source):
+            for path in find_metadata_files(source):
+                collect_metadata(path, packages, releases)
+        else:
+            with open_index(source) as stream:
+                collect_artifacts(read_artifacts(stream), packages)
+    build_index(packages, args.output, releases)
+    print('Saved {} packages to {}'.format(len(packages), args.output))
+
+
+if __name__ == '__main__':
+    main()
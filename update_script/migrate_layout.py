@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+#
+# Copyright (c) 2018-2020 FASTEN.
+#
+# This file is part of FASTEN
+# (see https://www.fasten-project.eu/).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+"""Convert a flat fastensource output directory to the sharded layout
+(see fastensource/utils/layout.py), to use it with --layout sharded.
+"""
+
+
+import argparse
+from fastensource.utils.layout import migrate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(
+                                     'Move the artifacts of a flat output '
+                                     'directory to <shard>/<name>/<version>/ '
+                                     'and index them.'))
+    parser.add_argument('ecosystem', choices=['pypi', 'maven', 'debian'])
+    parser.add_argument('output', help='The output directory')
+    parser.add_argument('-v', '--versions', default='versions.json',
+                        help='The versions file in the output directory')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='Only print what would be moved')
+    args = parser.parse_args()
+
+    moved, skipped = migrate(args.output, args.ecosystem, args.versions,
+                             args.dry_run)
+    for entry, project, version in moved:
+        print('{} -> {} {}'.format(entry, project, version))
+    for entry in skipped:
+        print('Skipped {} (not in {})'.format(entry, args.versions))
+    print('{} {} artifacts, skipped {} entries'.format(
+        'Would move' if args.dry_run else 'Moved', len(moved), len(skipped)))
+
+
+if __name__ == '__main__':
+    main()